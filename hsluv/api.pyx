@@ -2,37 +2,1351 @@
 cimport cython
 from cython.operator cimport address
 from cython cimport view
+from cython.parallel cimport prange
+from libc.math cimport floor, fmin, fmax, isfinite, NAN
+from libc.stdint cimport int32_t, int64_t, uint64_t
+from libc.stdlib cimport malloc, free
+from libc.string cimport memcpy, memset
+
+import os
+import threading
+import numpy
+cimport numpy as cnp
 
 from hsluv cimport funcs
+from hsluv import cache
+
+cnp.import_array()
+cnp.import_ufunc()
+
+ctypedef void (*triple_fn)(double, double, double,
+                           double*, double*, double*) noexcept nogil
+ctypedef void (*triple_fnf)(float, float, float,
+                            float*, float*, float*) noexcept nogil
+ctypedef void (*batch_fn)(const double*, double*, size_t) noexcept nogil
+ctypedef void (*batch_fnf)(const float*, float*, size_t) noexcept nogil
+ctypedef void (*pixels_fn)(const funcs.hsluv_pixels*, const funcs.hsluv_pixels*,
+                           size_t) noexcept nogil
+
+ctypedef struct Converter:
+    triple_fn convert
+    triple_fnf convertf
+    batch_fn batch
+    batch_fnf batchf
+    pixels_fn pixels
+    bint from_rgb
+    bint to_rgb
+
+ctypedef fused real:
+    float
+    double
+
+cdef Converter hsluv_to_rgb_converter = Converter(funcs.hsluv2rgb, funcs.hsluv2rgbf,
+                                                  funcs.hsluv2rgb_batch, funcs.hsluv2rgbf_batch,
+                                                  funcs.hsluv2rgb_pixels, False, True)
+cdef Converter rgb_to_hsluv_converter = Converter(funcs.rgb2hsluv, funcs.rgb2hsluvf,
+                                                  funcs.rgb2hsluv_batch, funcs.rgb2hsluvf_batch,
+                                                  funcs.rgb2hsluv_pixels, True, False)
+cdef Converter hpluv_to_rgb_converter = Converter(funcs.hpluv2rgb, funcs.hpluv2rgbf,
+                                                  funcs.hpluv2rgb_batch, funcs.hpluv2rgbf_batch,
+                                                  funcs.hpluv2rgb_pixels, False, True)
+cdef Converter rgb_to_hpluv_converter = Converter(funcs.rgb2hpluv, funcs.rgb2hpluvf,
+                                                  funcs.rgb2hpluv_batch, funcs.rgb2hpluvf_batch,
+                                                  funcs.rgb2hpluv_pixels, True, False)
+
+# The stages of these, one by one, only as typed batch conversions:
+cdef Converter rgb_to_xyz_converter = Converter(NULL, NULL, NULL, NULL, funcs.rgb2xyz_pixels,
+                                                True, False)
+cdef Converter xyz_to_rgb_converter = Converter(NULL, NULL, NULL, NULL, funcs.xyz2rgb_pixels,
+                                                False, True)
+cdef Converter xyz_to_luv_converter = Converter(NULL, NULL, NULL, NULL, funcs.xyz2luv_pixels,
+                                                False, False)
+cdef Converter luv_to_xyz_converter = Converter(NULL, NULL, NULL, NULL, funcs.luv2xyz_pixels,
+                                                False, False)
+cdef Converter luv_to_lch_converter = Converter(NULL, NULL, NULL, NULL, funcs.luv2lch_pixels,
+                                                False, False)
+cdef Converter lch_to_luv_converter = Converter(NULL, NULL, NULL, NULL, funcs.lch2luv_pixels,
+                                                False, False)
+cdef Converter lch_to_hsluv_converter = Converter(NULL, NULL, NULL, NULL, funcs.lch2hsluv_pixels,
+                                                  False, False)
+cdef Converter hsluv_to_lch_converter = Converter(NULL, NULL, NULL, NULL, funcs.hsluv2lch_pixels,
+                                                  False, False)
+cdef Converter lch_to_hpluv_converter = Converter(NULL, NULL, NULL, NULL, funcs.lch2hpluv_pixels,
+                                                  False, False)
+cdef Converter hpluv_to_lch_converter = Converter(NULL, NULL, NULL, NULL, funcs.hpluv2lch_pixels,
+                                                  False, False)
+# And the shortcut between HSLuv and HPLuv, through LCh:
+cdef Converter hsluv_to_hpluv_converter = Converter(NULL, NULL, NULL, NULL, funcs.hsluv2hpluv_pixels,
+                                                    False, False)
+cdef Converter hpluv_to_hsluv_converter = Converter(NULL, NULL, NULL, NULL, funcs.hpluv2hsluv_pixels,
+                                                    False, False)
+
+cdef extern from *:
+    """
+    #ifdef _OPENMP
+    #define HSLUV_OPENMP 1
+    #else
+    #define HSLUV_OPENMP 0
+    #endif
+    """
+    const int HSLUV_OPENMP
+
+cdef extern from *:
+    """
+    #define HSLUV_STRINGIFY(token) #token
+    #define HSLUV_VERSION_STRING(token) HSLUV_STRINGIFY(token)
+    """
+    const char* VERSION_STRING "HSLUV_VERSION_STRING(VERSION)"
+
+__version__ = VERSION_STRING.decode('UTF-8')
+
+# Batches smaller than this many pixels are converted on the calling thread:
+cdef Py_ssize_t PARALLEL_THRESHOLD = 16384
+# Threads take the pixels of larger batches in chunks of this many:
+cdef Py_ssize_t CHUNK_SIZE = 4096
+cdef int num_threads = 1
+
+def get_num_threads():
+    """ Return the number of threads used for batch conversions """
+    return num_threads
+
+def set_num_threads(count=None):
+    """ Set the number of threads used for batch conversions. Passing `None` (or
+        anything less than one) restores the default: the value of the environment
+        variable HSLUV_NUM_THREADS if it is set, or the number of CPUs otherwise.
+        Without OpenMP support compiled in, the thread count is always one.
+    """
+    global num_threads
+    if count is None or count < 1:
+        count = int(os.environ.get('HSLUV_NUM_THREADS', 0) or os.cpu_count() or 1)
+    num_threads = max(int(count), 1) if HSLUV_OPENMP else 1
+    return num_threads
+
+set_num_threads()
+
+def get_batch_isa():
+    """ Return the name of the instruction set the batch kernels run on: 'avx512',
+        'avx2' or 'baseline' (see `set_batch_isa()`)
+    """
+    return funcs.hsluv_batch_isa().decode('UTF-8')
+
+def set_batch_isa(isa=None):
+    """ Select the instruction set the batch kernels run on. On x86 they are built
+        for 'avx512', 'avx2' and 'baseline' alike, and passing `None` restores the
+        default: the value of the environment variable HSLUV_BATCH_ISA if it is set,
+        or the best one the CPU supports otherwise. Raises ValueError for an
+        instruction set the CPU (or the build) does not support.
+    """
+    cdef const char* name = NULL
+    if isa is None:
+        isa = os.environ.get('HSLUV_BATCH_ISA') or None
+    if isa is not None:
+        encoded = str(isa).encode('UTF-8')
+        name = encoded
+    if not funcs.hsluv_batch_set_isa(name):
+        raise ValueError(f"unsupported instruction set: {isa}")
+    return get_batch_isa()
+
+set_batch_isa()
+
+CACHE_BOUNDS = funcs.HSLUV_CACHE_BOUNDS
+SAFE_CHROMA_TABLE = funcs.HSLUV_SAFE_CHROMA_TABLE
+
+def get_flags():
+    """ Return the flags tuning the C conversions (see `set_flags()`) """
+    return funcs.hsluv_get_flags()
+
+def set_flags(unsigned flags):
+    """ Set the flags tuning the C conversions, process-wide, for every function in
+        this module -- a bitwise OR of:
+
+        CACHE_BOUNDS:      memoize the per-lightness gamut bounds (and the maximal
+                           safe chroma of HPLuv) in a small per-thread cache; results
+                           are bit-identical to the uncached computation
+        SAFE_CHROMA_TABLE: interpolate the maximal safe chroma of HPLuv in a 4096-step
+                           table over lightness; RGB is off by at most 0.000005
+
+        Zero, the default, selects the reference computation. The vectorized kernels
+        behind the batch functions and the gufuncs always compute the gamut bounds
+        directly, and ignore these flags.
+    """
+    funcs.hsluv_set_flags(flags)
+
+cdef int check_triples(Py_ssize_t source, Py_ssize_t target) except -1 nogil:
+    """ Raise ValueError unless the `source` and `target` lengths both make a triple,
+        which the single-triple conversions read and write without bounds checks
+    """
+    if source < 3 or target < 3:
+        with gil:
+            raise ValueError(f"expected triples, got {source} and {target} values")
+    return 0
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
-cpdef double[:] hsluv_to_rgb(double[:] hsl_triple) nogil:
+cpdef double[:] hsluv_to_rgb(double[:] hsl_triple, double[:] out=None) nogil:
+    """ Convert an HSLuv triple to RGB, writing the result into `out` -- or, if `out`
+        is omitted, back into `hsl_triple` itself -- and return it
+    """
     cdef double[:] rgb_triple = hsl_triple
+    if out is not None:
+        rgb_triple = out
+    check_triples(hsl_triple.shape[0], rgb_triple.shape[0])
     funcs.hsluv2rgb(        hsl_triple[0],          hsl_triple[1],          hsl_triple[2],
                     address(rgb_triple[0]), address(rgb_triple[1]), address(rgb_triple[2]))
     return rgb_triple
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
-cpdef double[:] rgb_to_hsluv(double[:] rgb_triple) nogil:
+cpdef double[:] rgb_to_hsluv(double[:] rgb_triple, double[:] out=None) nogil:
+    """ Convert an RGB triple to HSLuv, writing the result into `out` -- or, if `out`
+        is omitted, back into `rgb_triple` itself -- and return it
+    """
     cdef double[:] hsl_triple = rgb_triple
+    if out is not None:
+        hsl_triple = out
+    check_triples(rgb_triple.shape[0], hsl_triple.shape[0])
     funcs.rgb2hsluv(        rgb_triple[0],          rgb_triple[1],          rgb_triple[2],
                     address(hsl_triple[0]), address(hsl_triple[1]), address(hsl_triple[2]))
     return hsl_triple
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
-cpdef double[:] hpluv_to_rgb(double[:] hpl_triple) nogil:
+cpdef double[:] hpluv_to_rgb(double[:] hpl_triple, double[:] out=None) nogil:
+    """ Convert an HPLuv triple to RGB, writing the result into `out` -- or, if `out`
+        is omitted, back into `hpl_triple` itself -- and return it
+    """
     cdef double[:] rgb_triple = hpl_triple
+    if out is not None:
+        rgb_triple = out
+    check_triples(hpl_triple.shape[0], rgb_triple.shape[0])
     funcs.hpluv2rgb(        hpl_triple[0],          hpl_triple[1],          hpl_triple[2],
                     address(rgb_triple[0]), address(rgb_triple[1]), address(rgb_triple[2]))
     return rgb_triple
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
-cpdef double[:] rgb_to_hpluv(double[:] rgb_triple) nogil:
+cpdef double[:] rgb_to_hpluv(double[:] rgb_triple, double[:] out=None) nogil:
+    """ Convert an RGB triple to HPLuv, writing the result into `out` -- or, if `out`
+        is omitted, back into `rgb_triple` itself -- and return it
+    """
     cdef double[:] hpl_triple = rgb_triple
+    if out is not None:
+        hpl_triple = out
+    check_triples(rgb_triple.shape[0], hpl_triple.shape[0])
     funcs.rgb2hpluv(        rgb_triple[0],          rgb_triple[1],          rgb_triple[2],
                     address(hpl_triple[0]), address(hpl_triple[1]), address(hpl_triple[2]))
     return hpl_triple
+
+# The element types the batch kernels read and write directly:
+pixel_types = {
+    numpy.dtype(numpy.float64): funcs.HSLUV_FLOAT64,
+    numpy.dtype(numpy.float32): funcs.HSLUV_FLOAT32,
+    numpy.dtype(numpy.uint8):   funcs.HSLUV_UINT8,
+    numpy.dtype(numpy.uint16):  funcs.HSLUV_UINT16,
+}
+
+# The layouts they read and write RGB in, each with its C code:
+pixel_layouts = {
+    'rgb':  funcs.HSLUV_RGB,
+    'bgr':  funcs.HSLUV_BGR,
+    'rgba': funcs.HSLUV_RGBA,
+    'bgra': funcs.HSLUV_BGRA,
+    'argb': funcs.HSLUV_ARGB,
+    'abgr': funcs.HSLUV_ABGR,
+}
+
+cdef int pixel_layout(object layout, bint premultiplied) except -1:
+    """ Return the C code of the RGB layout named `layout`, marked premultiplied by
+        alpha if `premultiplied` is set
+    """
+    if layout not in pixel_layouts:
+        raise ValueError(f"unknown layout {layout!r} (expected one of {', '.join(map(repr, pixel_layouts))})")
+    if not premultiplied:
+        return pixel_layouts[layout]
+    if 'a' not in layout:
+        raise ValueError(f"premultiplied=True requires a layout with alpha, not {layout!r}")
+    return pixel_layouts[layout] | funcs.HSLUV_PREMULTIPLIED
+
+# The components conversions from RGB can be restricted to, each with its C flag:
+pixel_channels = {
+    'h': funcs.HSLUV_SELECT_H,
+    's': funcs.HSLUV_SELECT_S,
+    'l': funcs.HSLUV_SELECT_L,
+}
+
+cdef int channel_selection(object channels) except -1:
+    """ Return the C flags selecting `channels`, a string of some of 'h', 's' and 'l'
+        in that order, or 0 if `channels` is None
+    """
+    if channels is None:
+        return 0
+    if not isinstance(channels, str) or not channels \
+                                     or ''.join(c for c in 'hsl' if c in channels) != channels:
+        raise ValueError(f"channels= must be some of 'h', 's' and 'l', in that order, not {channels!r}")
+    return sum(pixel_channels[c] for c in channels)
+
+cdef enum:
+    MAX_DIMS = 64
+
+ctypedef struct PixelRuns:
+    # The pixels of a batch as `runs` runs of `length` pixels each, the runs laid
+    # out over `ndim` axes of the given shape and byte strides (for the source and
+    # destination alike), and the pixels of each run `pixel_stride` bytes apart
+    int ndim
+    Py_ssize_t shape[MAX_DIMS]
+    Py_ssize_t src_strides[MAX_DIMS]
+    Py_ssize_t dst_strides[MAX_DIMS]
+    Py_ssize_t runs
+    Py_ssize_t length
+
+cdef void describe_pixels(funcs.hsluv_pixels* px, object array, int layout, int channel_axis):
+    """ Point `px` at the first pixel of `array` in `layout`, with its channels along
+        `channel_axis` -- leaving the pixel stride to `describe_runs()`
+    """
+    px.data = cnp.PyArray_DATA(array)
+    px.type = pixel_types[array.dtype]
+    px.layout = layout
+    px.pixel_stride = 0
+    px.channel_stride = array.strides[channel_axis]
+
+cdef void describe_runs(PixelRuns* grid, funcs.hsluv_pixels* src, funcs.hsluv_pixels* dst,
+                        object source, object output, int channel_axis):
+    """ Lay the pixels of `source` and `output` out as runs of a single stride each,
+        merging every pair of pixel axes the two arrays can step through as one: any
+        C-contiguous pair of arrays, planar or not, makes a single run
+    """
+    axes = [axis for axis in range(source.ndim)
+            if axis != channel_axis and source.shape[axis] != 1]
+    shape = [source.shape[axis] for axis in axes]
+    src_strides = [source.strides[axis] for axis in axes]
+    dst_strides = [output.strides[axis] for axis in axes]
+    for axis in reversed(range(len(axes) - 1)):
+        if src_strides[axis] == shape[axis + 1] * src_strides[axis + 1] \
+                and dst_strides[axis] == shape[axis + 1] * dst_strides[axis + 1]:
+            shape[axis] *= shape.pop(axis + 1)
+            src_strides[axis] = src_strides.pop(axis + 1)
+            dst_strides[axis] = dst_strides.pop(axis + 1)
+    grid.length = shape.pop() if shape else 1
+    src.pixel_stride = src_strides.pop() if src_strides else 0
+    dst.pixel_stride = dst_strides.pop() if dst_strides else 0
+    grid.ndim = len(shape)
+    grid.runs = 1
+    for axis in range(grid.ndim):
+        grid.shape[axis] = shape[axis]
+        grid.src_strides[axis] = src_strides[axis]
+        grid.dst_strides[axis] = dst_strides[axis]
+        grid.runs *= shape[axis]
+
+cdef inline void convert_chunk(Converter conv, funcs.hsluv_pixels src, funcs.hsluv_pixels dst,
+                               const PixelRuns* grid, Py_ssize_t run,
+                               Py_ssize_t start, Py_ssize_t count) noexcept nogil:
+    """ Convert `count` pixels from pixel `start` on in run number `run` """
+    cdef int axis
+    cdef Py_ssize_t index
+    for axis in reversed(range(grid.ndim)):
+        index = run % grid.shape[axis]
+        run = run // grid.shape[axis]
+        src.data = <char*>src.data + index * grid.src_strides[axis]
+        dst.data = <char*>dst.data + index * grid.dst_strides[axis]
+    src.data = <char*>src.data + start * src.pixel_stride
+    dst.data = <char*>dst.data + start * dst.pixel_stride
+    conv.pixels(&src, &dst, count)
+
+cdef void convert_pixels(Converter conv, funcs.hsluv_pixels src, funcs.hsluv_pixels dst,
+                         const PixelRuns* grid) noexcept nogil:
+    cdef Py_ssize_t item, run, start
+    cdef Py_ssize_t chunks = (grid.length + CHUNK_SIZE - 1) // CHUNK_SIZE
+    cdef int threads = num_threads if grid.runs * grid.length >= PARALLEL_THRESHOLD else 1
+    for item in prange(grid.runs * chunks, num_threads=threads, schedule='static'):
+        run = item // chunks
+        start = (item % chunks) * CHUNK_SIZE
+        convert_chunk(conv, src, dst, grid, run, start, min(CHUNK_SIZE, grid.length - start))
+
+cdef object prepare_output(object source, object out, bint inplace,
+                           object dtype=numpy.float64, bint strided=False, object shape=None):
+    """ Return the array a batch conversion of `source` should write into: a new array
+        of `dtype` and `shape` (by default that of `source`), the preallocated `out`
+        (which may have any strides if `strided` is set), or (when `inplace` is set)
+        `source` itself
+    """
+    if shape is None:
+        shape = source.shape
+    if inplace:
+        if out is not None and out is not source:
+            raise ValueError("pass either out= or inplace=True, not both")
+        return source
+    if out is None:
+        return numpy.empty(shape, dtype=dtype)
+    if strided:
+        if not isinstance(out, numpy.ndarray) or out.dtype != dtype \
+                                              or not out.flags.aligned \
+                                              or not out.flags.writeable:
+            raise ValueError(f"out= must be a writable {numpy.dtype(dtype).name} array")
+    elif not isinstance(out, numpy.ndarray) or out.dtype != dtype \
+                                            or not out.flags.c_contiguous \
+                                            or not out.flags.writeable:
+        raise ValueError(f"out= must be a writable C-contiguous {numpy.dtype(dtype).name} array")
+    if out.shape != tuple(shape):
+        raise ValueError(f"out= has shape {out.shape}, expected {tuple(shape)}")
+    return out
+
+cdef object working_dtype(object pixels):
+    """ Return the dtype a batch of `pixels` is converted in: float32 arrays stay
+        float32, and everything else is converted as float64
+    """
+    if getattr(pixels, 'dtype', None) == numpy.float32:
+        return numpy.dtype(numpy.float32)
+    return numpy.dtype(numpy.float64)
+
+cdef object output_dtype(object source, object out, object dtype):
+    """ Return the dtype a batch conversion of `source` yields: `dtype` if given, that
+        of `out` otherwise, or else float32 for float32 input and float64 for the rest
+    """
+    if dtype is None:
+        dtype = getattr(out, 'dtype', None)
+    if dtype is None:
+        dtype = working_dtype(source)
+    dtype = numpy.dtype(dtype)
+    if dtype not in pixel_types:
+        raise ValueError(f"batch conversions yield float64, float32, uint8 or uint16, not {dtype.name}")
+    return dtype
+
+cdef bint has_broadcast_axes(object array):
+    """ Tell whether `array` repeats values along an axis with a zero stride, which
+        the C conversions would take for packed pixels
+    """
+    return any(stride == 0 and size > 1 for stride, size in zip(array.strides, array.shape))
+
+# Deduplication first counts the distinct colors among this many evenly spaced
+# pixels, and goes on only if at most half of them are distinct:
+cdef Py_ssize_t UNIQUE_SAMPLE = 1024
+# It then gives up as soon as more than this fraction of all pixels are distinct:
+cdef double UNIQUE_MAX_FRACTION = 0.25
+
+cdef inline Py_ssize_t hash_slot(uint64_t key, int bits) noexcept nogil:
+    return <Py_ssize_t>((key * <uint64_t>0x9E3779B97F4A7C15) >> (64 - bits))
+
+cdef int32_t* grow_table(int32_t* table, int bits, const uint64_t* keys,
+                         Py_ssize_t count) noexcept nogil:
+    """ Free `table` and return a new one of 2**`bits` slots holding the numbers of the
+        `count` distinct `keys` -- or NULL if it cannot be allocated
+    """
+    cdef Py_ssize_t mask = (<Py_ssize_t>1 << bits) - 1, number, slot
+    free(table)
+    table = <int32_t*>malloc((mask + 1) * sizeof(int32_t))
+    if table == NULL:
+        return NULL
+    memset(table, 0xFF, (mask + 1) * sizeof(int32_t))  # -1: empty slot
+    for number in range(count):
+        slot = hash_slot(keys[number], bits)
+        while table[slot] >= 0:
+            slot = (slot + 1) & mask
+        table[slot] = <int32_t>number
+    return table
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef Py_ssize_t index_colors(const unsigned char[:, ::1] rows, Py_ssize_t step, Py_ssize_t limit,
+                             int64_t* first, int32_t* inverse) noexcept nogil:
+    """ Number the distinct values among every `step`-th row of `rows` (of at most 8
+        bytes each) in order of appearance, in a hash table kept under half full:
+        store where each first appears in `first` and, unless `inverse` is NULL, the
+        number of each row in `inverse`. Return how many there are, or -1 as soon as
+        there are more than `limit` (or if memory runs out).
+    """
+    cdef Py_ssize_t width = rows.shape[1], count = 0, idx, row, slot, k
+    cdef int bits = 10
+    cdef uint64_t key
+    cdef uint64_t* keys = <uint64_t*>malloc(max(limit, 1) * sizeof(uint64_t))
+    cdef int32_t* table = grow_table(NULL, bits, keys, 0)
+    if keys == NULL or table == NULL:
+        free(keys)
+        free(table)
+        return -1
+    for idx in range((rows.shape[0] + step - 1) // step):
+        row = idx * step
+        key = 0
+        for k in range(width):
+            key |= <uint64_t>rows[row, k] << (8 * k)
+        slot = hash_slot(key, bits)
+        while table[slot] >= 0 and keys[table[slot]] != key:
+            slot = (slot + 1) & ((<Py_ssize_t>1 << bits) - 1)
+        if table[slot] < 0:
+            if count == limit:
+                count = -1
+                break
+            keys[count] = key
+            table[slot] = <int32_t>count
+            first[count] = row
+            count += 1
+            if 2 * count > (<Py_ssize_t>1 << bits):
+                bits += 1
+                table = grow_table(table, bits, keys, count)
+                if table == NULL:
+                    count = -1
+                    break
+                slot = hash_slot(key, bits)
+                while keys[table[slot]] != key:
+                    slot = (slot + 1) & ((<Py_ssize_t>1 << bits) - 1)
+        if inverse != NULL:
+            inverse[row] = table[slot]
+    free(keys)
+    free(table)
+    return count
+
+ctypedef fused pixel_t:
+    double
+    float
+    unsigned char
+    unsigned short
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void scatter_colors(const pixel_t[:, ::1] colors, const int32_t[::1] inverse,
+                         pixel_t[:, ::1] dst) noexcept nogil:
+    """ Copy row `inverse[idx]` of `colors` into row `idx` of `dst`, for every `idx` """
+    cdef Py_ssize_t idx, k
+    cdef int threads = num_threads if dst.shape[0] >= PARALLEL_THRESHOLD else 1
+    for idx in prange(dst.shape[0], num_threads=threads, schedule='static'):
+        for k in range(dst.shape[1]):
+            dst[idx, k] = colors[inverse[idx], k]
+
+cdef bint convert_unique(Converter conv, object source, object output, int channel_axis,
+                         object layout, bint premultiplied, object selected) except -1:
+    """ Convert `source` into `output` by converting each distinct pixel value once and
+        scattering the results. Return False, having done nothing useful, if the
+        pixels do not pack into 8 bytes (only integer ones do) or turn out to be
+        too varied for this to pay off.
+    """
+    cdef Py_ssize_t channels = source.shape[channel_axis]
+    cdef Py_ssize_t count = source.size // channels
+    cdef Py_ssize_t step, found
+    if channels * source.itemsize > 8 or count >= 2**31 or count == 0:
+        return False
+    pixels = numpy.ascontiguousarray(numpy.moveaxis(source, channel_axis, -1)).reshape(count, channels)
+    cdef const unsigned char[:, ::1] rows = pixels.view(numpy.uint8)
+    first = numpy.empty(max(int(count * UNIQUE_MAX_FRACTION), 1), dtype=numpy.int64)
+    inverse = numpy.empty(count, dtype=numpy.int32)
+    cdef int64_t[::1] first_view = first
+    cdef int32_t[::1] inverse_view = inverse
+    step = max(count // UNIQUE_SAMPLE, 1)
+    with nogil:
+        found = index_colors(rows, step, min((count + step - 1) // step // 2, first_view.shape[0]),
+                             &first_view[0], NULL)
+        if found >= 0:
+            found = index_colors(rows, 1, first_view.shape[0], &first_view[0], &inverse_view[0])
+    if found < 0:
+        return False
+    converted = convert_batch(conv, pixels[first[:found]], None, False, output.dtype,
+                              layout, premultiplied, False, False, selected)
+    target = numpy.moveaxis(output, channel_axis, -1)
+    if not target.flags.c_contiguous:
+        target[...] = numpy.take(converted, inverse, axis=0).reshape(target.shape)
+        return True
+    scatter_typed(converted, inverse, target.reshape(count, target.shape[-1]))
+    return True
+
+cdef void scatter_typed(object colors, object inverse, object dst) except *:
+    """ Run `scatter_colors()` on arrays of any of the pixel dtypes """
+    cdef const int32_t[::1] numbers = inverse
+    cdef double[:, ::1] d_colors, d_dst
+    cdef float[:, ::1] f_colors, f_dst
+    cdef unsigned char[:, ::1] b_colors, b_dst
+    cdef unsigned short[:, ::1] w_colors, w_dst
+    if dst.dtype == numpy.float64:
+        d_colors, d_dst = colors, dst
+        with nogil:
+            scatter_colors(d_colors, numbers, d_dst)
+    elif dst.dtype == numpy.float32:
+        f_colors, f_dst = colors, dst
+        with nogil:
+            scatter_colors(f_colors, numbers, f_dst)
+    elif dst.dtype == numpy.uint8:
+        b_colors, b_dst = colors, dst
+        with nogil:
+            scatter_colors(b_colors, numbers, b_dst)
+    else:
+        w_colors, w_dst = colors, dst
+        with nogil:
+            scatter_colors(w_colors, numbers, w_dst)
+
+cdef bint overlaps(object source, object output) except -1:
+    """ Tell whether `output` shares memory with `source` other than as the very same
+        pixels: the C conversions read and write a block at a time, which converts in
+        place but clobbers input not yet read when the two are offset or reordered
+    """
+    if cnp.PyArray_DATA(source) == cnp.PyArray_DATA(output) and source.dtype == output.dtype \
+                                                            and source.shape == output.shape \
+                                                            and source.strides == output.strides:
+        return False
+    return numpy.shares_memory(source, output)
+
+cdef object convert_batch(Converter conv, object pixels, object out, bint inplace, object dtype,
+                          object layout, bint premultiplied, bint planar, bint unique,
+                          object selected=None):
+    """ Convert an array of shape (..., 3) -- or (..., 4) for RGB `layout`s with alpha,
+        which the other color space gets as a fourth component; or, if `planar` is
+        set, (3, ...) or (4, ...) -- with the C conversion functions in `conv`. The
+        result, in the same layout, goes into a new array of `dtype`,
+        into `out` if one is given (through a temporary if it overlaps the input other
+        than exactly), or over the input itself if `inplace` is set.
+        Float64, float32, uint8 and uint16 arrays are read as they are, with any
+        strides, and anything else as float64. The pixel loop runs without the GIL,
+        split across `get_num_threads()` threads for large batches. With `unique` set,
+        integer pixels are deduplicated first if that pays off (see `convert_unique()`).
+        Conversions from RGB output only the components in `selected` if given, in
+        place of all three and any alpha (see `channel_selection()`).
+    """
+    cdef int rgb_layout = pixel_layout(layout, premultiplied)
+    cdef int selection = channel_selection(selected)
+    cdef int channels = len(layout)
+    cdef int plain_layout = funcs.HSLUV_RGBA if channels == 4 else funcs.HSLUV_RGB
+    source = numpy.asarray(pixels)
+    if inplace:
+        if source.dtype not in pixel_types or not source.flags.aligned \
+                                           or not source.flags.writeable:
+            raise ValueError("inplace=True requires a writable float64, float32, uint8 or uint16 array")
+        if dtype is not None and numpy.dtype(dtype) != source.dtype:
+            raise ValueError(f"inplace=True yields {source.dtype.name}, not {numpy.dtype(dtype).name}")
+    elif source.dtype not in pixel_types:
+        source = source.astype(numpy.float64)
+    elif not source.flags.aligned or has_broadcast_axes(source):
+        source = numpy.ascontiguousarray(source)
+    if source.ndim < 1 or source.shape[0 if planar else source.ndim - 1] != channels:
+        expected = f"({channels}, ...)" if planar else f"(..., {channels})"
+        raise ValueError(f"expected an array of shape {expected}, got {source.shape}")
+    if inplace and has_broadcast_axes(source):
+        raise ValueError("inplace=True requires an array without broadcast axes")
+    if inplace and selection:
+        raise ValueError("inplace=True yields all the channels")
+    cdef int channel_axis = 0 if planar else source.ndim - 1
+    shape = list(source.shape)
+    if selection:
+        shape[channel_axis] = len(selected)
+    dtype = source.dtype if inplace else output_dtype(source, out, dtype)
+    if dtype.kind == 'u' and not conv.to_rgb:
+        raise ValueError(f"only conversions to RGB yield integers, not {dtype.name}")
+    target = prepare_output(source, out, inplace, dtype, strided=True, shape=tuple(shape))
+    output = numpy.empty(target.shape, dtype=dtype) if overlaps(source, target) else target
+    cdef funcs.hsluv_pixels src, dst
+    cdef PixelRuns grid
+    describe_pixels(&src, source, rgb_layout if conv.from_rgb else plain_layout, channel_axis)
+    describe_pixels(&dst, output, (plain_layout | selection) if conv.from_rgb else rgb_layout,
+                    channel_axis)
+    describe_runs(&grid, &src, &dst, source, output, channel_axis)
+    if source.size == 0:
+        return target
+    if not (unique and convert_unique(conv, source, output, channel_axis, layout, premultiplied,
+                                      selected)):
+        with nogil:
+            convert_pixels(conv, src, dst, &grid)
+    if output is not target:
+        target[...] = output
+    return target
+
+def hsluv_to_rgb_batch(pixels, out=None, inplace=False, dtype=None, layout='rgb', premultiplied=False,
+                       planar=False):
+    """ Convert an array of HSLuv triples, shaped (..., 3), to RGB. The input is left
+        untouched unless `inplace` is set; pass `out` to reuse a preallocated array.
+        The result is float64 (float32 for float32 input) unless `dtype` says
+        otherwise: uint8 and uint16 RGB are rounded, clamped and scaled to 255 or
+        65535 within the conversion loop, without float temporaries. The RGB comes
+        out in `layout` -- 'rgb', 'bgr', 'rgba', 'bgra', 'argb' or 'abgr' -- with a
+        fourth input component as its alpha, premultiplied if `premultiplied` is set.
+        With `planar` set, the channels are along the first axis instead of the last,
+        as in (3, H, W) arrays: the fastest layout, needing no (de)interleaving.
+        Views of any strides -- crops, flips, subsamples -- are read and written as
+        they are, without copies.
+    """
+    return convert_batch(hsluv_to_rgb_converter, pixels, out, inplace, dtype, layout, premultiplied,
+                         planar, False)
+
+def rgb_to_hsluv_batch(pixels, out=None, inplace=False, dtype=None, layout='rgb', premultiplied=False,
+                       planar=False, unique=False, channels=None):
+    """ Convert an array of RGB triples, shaped (..., 3), to HSLuv. The input is left
+        untouched unless `inplace` is set; pass `out` to reuse a preallocated array.
+        Float32 arrays are converted in single precision, without copies, and uint8
+        and uint16 arrays are read as 8- or 16-bit RGB (255 or 65535 being 1.0). The
+        result is float64 (float32 for float32 input) unless `dtype` says otherwise,
+        and never integers, which only RGB fits -- so neither is `inplace` output.
+        The RGB is read in `layout` -- 'rgb', 'bgr', 'rgba', 'bgra', 'argb' or 'abgr'
+        -- with any alpha (premultiplied if `premultiplied` is set) carried over as a
+        fourth output component. With `planar` set, the channels are along the first
+        axis instead of the last, as in (3, H, W) arrays: the fastest layout, needing
+        no (de)interleaving. Views of any strides -- crops, flips, subsamples -- are
+        read and written as they are, without copies. With `unique` set, uint8 and
+        uint16 images with few distinct colors (screenshots, charts, illustrations)
+        convert each color once and scatter the results, unless a first look shows
+        too many colors for that to pay off. With `channels` -- some of 'h', 's' and
+        'l', in that order -- only these components come out, shaped (..., k) for k
+        of them and without alpha, and the conversion skips what only the others
+        need: the hue without 'h', the gamut bounds without 's'.
+    """
+    return convert_batch(rgb_to_hsluv_converter, pixels, out, inplace, dtype, layout, premultiplied,
+                         planar, unique, channels)
+
+def hpluv_to_rgb_batch(pixels, out=None, inplace=False, dtype=None, layout='rgb', premultiplied=False,
+                       planar=False):
+    """ Convert an array of HPLuv triples, shaped (..., 3), to RGB. The input is left
+        untouched unless `inplace` is set; pass `out` to reuse a preallocated array.
+        The result is float64 (float32 for float32 input) unless `dtype` says
+        otherwise: uint8 and uint16 RGB are rounded, clamped and scaled to 255 or
+        65535 within the conversion loop, without float temporaries. The RGB comes
+        out in `layout` -- 'rgb', 'bgr', 'rgba', 'bgra', 'argb' or 'abgr' -- with a
+        fourth input component as its alpha, premultiplied if `premultiplied` is set.
+        With `planar` set, the channels are along the first axis instead of the last,
+        as in (3, H, W) arrays: the fastest layout, needing no (de)interleaving.
+        Views of any strides -- crops, flips, subsamples -- are read and written as
+        they are, without copies.
+    """
+    return convert_batch(hpluv_to_rgb_converter, pixels, out, inplace, dtype, layout, premultiplied,
+                         planar, False)
+
+def rgb_to_hpluv_batch(pixels, out=None, inplace=False, dtype=None, layout='rgb', premultiplied=False,
+                       planar=False, unique=False, channels=None):
+    """ Convert an array of RGB triples, shaped (..., 3), to HPLuv. The input is left
+        untouched unless `inplace` is set; pass `out` to reuse a preallocated array.
+        Float32 arrays are converted in single precision, without copies, and uint8
+        and uint16 arrays are read as 8- or 16-bit RGB (255 or 65535 being 1.0). The
+        result is float64 (float32 for float32 input) unless `dtype` says otherwise,
+        and never integers, which only RGB fits -- so neither is `inplace` output.
+        The RGB is read in `layout` -- 'rgb', 'bgr', 'rgba', 'bgra', 'argb' or 'abgr'
+        -- with any alpha (premultiplied if `premultiplied` is set) carried over as a
+        fourth output component. With `planar` set, the channels are along the first
+        axis instead of the last, as in (3, H, W) arrays: the fastest layout, needing
+        no (de)interleaving. Views of any strides -- crops, flips, subsamples -- are
+        read and written as they are, without copies. With `unique` set, uint8 and
+        uint16 images with few distinct colors (screenshots, charts, illustrations)
+        convert each color once and scatter the results, unless a first look shows
+        too many colors for that to pay off. With `channels` -- some of 'h', 's' and
+        'l', in that order -- only these components come out, shaped (..., k) for k
+        of them and without alpha, and the conversion skips what only the others
+        need: the hue without 'h', the gamut bounds without 's'.
+    """
+    return convert_batch(rgb_to_hpluv_converter, pixels, out, inplace, dtype, layout, premultiplied,
+                         planar, unique, channels)
+
+cdef object convert_lightness(object pixels, object out, object dtype, object layout,
+                              bint premultiplied, bint planar):
+    """ Compute the lightness of an array of RGB pixels in `layout`, shaped (..., 3) or
+        (..., 4) -- or, if `planar` is set, (3, ...) or (4, ...) -- into an array of
+        the same shape without the channel axis, as `convert_batch()` selecting 'l'
+    """
+    cdef int channel_axis = 0 if planar else -1
+    # A channel axis of one, so the output lines up with the input axis for axis:
+    values = numpy.expand_dims(out, channel_axis) if isinstance(out, numpy.ndarray) else out
+    output = convert_batch(rgb_to_hsluv_converter, pixels, values, False, dtype, layout,
+                           premultiplied, planar, False, 'l')
+    if out is not None:
+        return out
+    return output[0] if planar else output[..., 0]
+
+def rgb_to_lightness_batch(pixels, out=None, dtype=None, layout='rgb', premultiplied=False,
+                           planar=False):
+    """ Compute the lightness of an array of RGB triples, shaped (..., 3): the L of
+        HSLuv and HPLuv alike, shaped (...), without the hue and saturation that cost
+        most of a full conversion. The RGB is read as by `rgb_to_hsluv_batch()`, in
+        `layout`, `premultiplied` and `planar` as given, and any alpha is ignored.
+        The result is float64 (float32 for float32 input) unless `dtype` says
+        otherwise; pass `out` to reuse a preallocated array.
+    """
+    return convert_lightness(pixels, out, dtype, layout, premultiplied, planar)
+
+def rgb8_to_lightness_batch(pixels, out=None, dtype=None, layout='rgb', premultiplied=False,
+                            planar=False):
+    """ An alias of `rgb_to_lightness_batch()`, with the same arguments and defaults,
+        that only accepts uint8 arrays -- which it reads as 8-bit sRGB, like any uint8
+        input, made linear by lookup in a table of 256 values
+    """
+    source = numpy.asarray(pixels)
+    if source.dtype != numpy.uint8:
+        raise TypeError(f"expected a uint8 array, got {source.dtype.name}")
+    return convert_lightness(source, out, dtype, layout, premultiplied, planar)
+
+def rgb_to_xyz_batch(pixels, out=None, inplace=False, dtype=None, layout='rgb', premultiplied=False,
+                     planar=False):
+    """ Convert an array of RGB triples, shaped (..., 3), to CIE XYZ: the first stage
+        of `rgb_to_hsluv_batch()`, which reads the RGB the same way and takes the
+        same arguments
+    """
+    return convert_batch(rgb_to_xyz_converter, pixels, out, inplace, dtype, layout, premultiplied,
+                         planar, False)
+
+def xyz_to_rgb_batch(pixels, out=None, inplace=False, dtype=None, layout='rgb', premultiplied=False,
+                     planar=False):
+    """ Convert an array of CIE XYZ triples, shaped (..., 3), to RGB: the last stage
+        of `hsluv_to_rgb_batch()`, which writes the RGB the same way and takes the
+        same arguments
+    """
+    return convert_batch(xyz_to_rgb_converter, pixels, out, inplace, dtype, layout, premultiplied,
+                         planar, False)
+
+def xyz_to_luv_batch(pixels, out=None, inplace=False, dtype=None, planar=False):
+    """ Convert an array of CIE XYZ triples, shaped (..., 3), to CIELUV (L, u, v).
+        The arrays are read and written as by the other batch functions, with the
+        same arguments.
+    """
+    return convert_batch(xyz_to_luv_converter, pixels, out, inplace, dtype, 'rgb', False, planar,
+                         False)
+
+def luv_to_xyz_batch(pixels, out=None, inplace=False, dtype=None, planar=False):
+    """ Convert an array of CIELUV triples (L, u, v), shaped (..., 3), to CIE XYZ.
+        The arrays are read and written as by the other batch functions, with the
+        same arguments.
+    """
+    return convert_batch(luv_to_xyz_converter, pixels, out, inplace, dtype, 'rgb', False, planar,
+                         False)
+
+def luv_to_lch_batch(pixels, out=None, inplace=False, dtype=None, planar=False):
+    """ Convert an array of CIELUV triples (L, u, v), shaped (..., 3), to LCh (L,
+        chroma, hue in degrees), with hue 0 for grays. The arrays are read and written
+        as by the other batch functions, with the same arguments.
+    """
+    return convert_batch(luv_to_lch_converter, pixels, out, inplace, dtype, 'rgb', False, planar,
+                         False)
+
+def lch_to_luv_batch(pixels, out=None, inplace=False, dtype=None, planar=False):
+    """ Convert an array of LCh triples (L, chroma, hue in degrees), shaped (..., 3),
+        to CIELUV (L, u, v). The arrays are read and written as by the other batch
+        functions, with the same arguments.
+    """
+    return convert_batch(lch_to_luv_converter, pixels, out, inplace, dtype, 'rgb', False, planar,
+                         False)
+
+def lch_to_hsluv_batch(pixels, out=None, inplace=False, dtype=None, planar=False):
+    """ Convert an array of LCh triples (L, chroma, hue in degrees), shaped (..., 3),
+        to HSLuv. The arrays are read and written as by the other batch functions,
+        with the same arguments.
+    """
+    return convert_batch(lch_to_hsluv_converter, pixels, out, inplace, dtype, 'rgb', False, planar,
+                         False)
+
+def hsluv_to_lch_batch(pixels, out=None, inplace=False, dtype=None, planar=False):
+    """ Convert an array of HSLuv triples, shaped (..., 3), to LCh (L, chroma, hue in
+        degrees). The arrays are read and written as by the other batch functions,
+        with the same arguments.
+    """
+    return convert_batch(hsluv_to_lch_converter, pixels, out, inplace, dtype, 'rgb', False, planar,
+                         False)
+
+def lch_to_hpluv_batch(pixels, out=None, inplace=False, dtype=None, planar=False):
+    """ Convert an array of LCh triples (L, chroma, hue in degrees), shaped (..., 3),
+        to HPLuv. The arrays are read and written as by the other batch functions,
+        with the same arguments.
+    """
+    return convert_batch(lch_to_hpluv_converter, pixels, out, inplace, dtype, 'rgb', False, planar,
+                         False)
+
+def hpluv_to_lch_batch(pixels, out=None, inplace=False, dtype=None, planar=False):
+    """ Convert an array of HPLuv triples, shaped (..., 3), to LCh (L, chroma, hue in
+        degrees). The arrays are read and written as by the other batch functions,
+        with the same arguments.
+    """
+    return convert_batch(hpluv_to_lch_converter, pixels, out, inplace, dtype, 'rgb', False, planar,
+                         False)
+
+def hsluv_to_hpluv_batch(pixels, out=None, inplace=False, dtype=None, planar=False):
+    """ Convert an array of HSLuv triples, shaped (..., 3), to HPLuv directly through
+        LCh: the hue and lightness are kept, and only the saturation is rescaled,
+        without the round trip through RGB. HPLuv saturations above 100 stand for
+        colors beyond the pastel range it covers. The arrays are read and written as
+        by the other batch functions, with the same arguments.
+    """
+    return convert_batch(hsluv_to_hpluv_converter, pixels, out, inplace, dtype, 'rgb', False,
+                         planar, False)
+
+def hpluv_to_hsluv_batch(pixels, out=None, inplace=False, dtype=None, planar=False):
+    """ Convert an array of HPLuv triples, shaped (..., 3), to HSLuv directly through
+        LCh: the hue and lightness are kept, and only the saturation is rescaled,
+        without the round trip through RGB. The arrays are read and written as by
+        the other batch functions, with the same arguments.
+    """
+    return convert_batch(hpluv_to_hsluv_converter, pixels, out, inplace, dtype, 'rgb', False,
+                         planar, False)
+
+cdef tuple convert_indexed(Converter conv, object palette, object indices, object out,
+                           object dtype, object layout, bint premultiplied):
+    """ Convert the `palette` of an indexed image with the batch kernels, then expand
+        it through `indices` (if given) with one gather pass
+    """
+    dtype = output_dtype(palette, out, dtype)
+    colors = convert_batch(conv, palette, None, False, dtype, layout, premultiplied, False, False)
+    if colors.ndim != 2:
+        raise ValueError(f"expected a palette of shape (P, {len(layout)}), got {colors.shape}")
+    if indices is None:
+        return colors, None
+    numbers = numpy.asarray(indices)
+    if numbers.dtype.kind not in 'iu':
+        raise ValueError(f"indices must be integers, not {numbers.dtype.name}")
+    if numbers.dtype.kind == 'u' and numpy.iinfo(numbers.dtype).max < colors.shape[0]:
+        pass  # every value is in range: no need to look
+    elif numbers.size and (numbers.min() < 0 or numbers.max() >= colors.shape[0]):
+        raise ValueError(f"indices must be between 0 and {colors.shape[0] - 1}")
+    shape = numbers.shape + (colors.shape[1],)
+    if out is None:
+        output = numpy.empty(shape, dtype=colors.dtype)
+    elif not isinstance(out, numpy.ndarray) or out.dtype != colors.dtype \
+                                            or out.shape != shape \
+                                            or not out.flags.writeable:
+        raise ValueError(f"out= must be a writable {colors.dtype.name} array of shape {shape}")
+    else:
+        output = out
+    if output.flags.c_contiguous and numbers.size:
+        scatter_typed(colors, numpy.ascontiguousarray(numbers, dtype=numpy.int32).reshape(-1),
+                      output.reshape(-1, colors.shape[1]))
+    else:
+        output[...] = colors[numbers]
+    return colors, output
+
+def hsluv_to_rgb_indexed(palette, indices=None, out=None, dtype=None, layout='rgb',
+                         premultiplied=False):
+    """ Convert an indexed image to RGB: a `palette` of HSLuv colors, shaped (P, 3), and
+        an array of `indices` into it. Only the palette is converted, as by
+        `hsluv_to_rgb_batch()` with the same `dtype`, `layout` and `premultiplied`.
+        Return the converted palette and, if `indices` is given, the image it expands
+        to, shaped indices.shape + (3,), or + (4,) with alpha `layout`s -- written into
+        `out` if one is given, which also sets the dtype if `dtype` does not.
+    """
+    return convert_indexed(hsluv_to_rgb_converter, palette, indices, out, dtype, layout,
+                           premultiplied)
+
+def rgb_to_hsluv_indexed(palette, indices=None, out=None, dtype=None, layout='rgb',
+                         premultiplied=False):
+    """ Convert an indexed image to HSLuv: a `palette` of RGB colors, shaped (P, 3), and
+        an array of `indices` into it. Only the palette is converted, as by
+        `rgb_to_hsluv_batch()` with the same `dtype`, `layout` and `premultiplied`.
+        Return the converted palette and, if `indices` is given, the image it expands
+        to, shaped indices.shape + (3,), or + (4,) with alpha `layout`s -- written into
+        `out` if one is given, which also sets the dtype if `dtype` does not.
+    """
+    return convert_indexed(rgb_to_hsluv_converter, palette, indices, out, dtype, layout,
+                           premultiplied)
+
+def hpluv_to_rgb_indexed(palette, indices=None, out=None, dtype=None, layout='rgb',
+                         premultiplied=False):
+    """ Convert an indexed image to RGB: a `palette` of HPLuv colors, shaped (P, 3), and
+        an array of `indices` into it. Only the palette is converted, as by
+        `hpluv_to_rgb_batch()` with the same `dtype`, `layout` and `premultiplied`.
+        Return the converted palette and, if `indices` is given, the image it expands
+        to, shaped indices.shape + (3,), or + (4,) with alpha `layout`s -- written into
+        `out` if one is given, which also sets the dtype if `dtype` does not.
+    """
+    return convert_indexed(hpluv_to_rgb_converter, palette, indices, out, dtype, layout,
+                           premultiplied)
+
+def rgb_to_hpluv_indexed(palette, indices=None, out=None, dtype=None, layout='rgb',
+                         premultiplied=False):
+    """ Convert an indexed image to HPLuv: a `palette` of RGB colors, shaped (P, 3), and
+        an array of `indices` into it. Only the palette is converted, as by
+        `rgb_to_hpluv_batch()` with the same `dtype`, `layout` and `premultiplied`.
+        Return the converted palette and, if `indices` is given, the image it expands
+        to, shaped indices.shape + (3,), or + (4,) with alpha `layout`s -- written into
+        `out` if one is given, which also sets the dtype if `dtype` does not.
+    """
+    return convert_indexed(rgb_to_hpluv_converter, palette, indices, out, dtype, layout,
+                           premultiplied)
+
+cdef void gufunc_triple_loop(char** args, cnp.npy_intp* dimensions,
+                                          cnp.npy_intp* steps, void* data) noexcept nogil:
+    """ Inner float64 loop for the (3)->(3) gufuncs: `data` points to the Converter.
+        Contiguous pixels go to the batch kernel, and any others one by one.
+    """
+    cdef Converter* conv = <Converter*>data
+    cdef char* src = args[0]
+    cdef char* dst = args[1]
+    cdef cnp.npy_intp idx
+    cdef cnp.npy_intp src_step = steps[0], dst_step = steps[1]
+    cdef cnp.npy_intp src_core = steps[2], dst_core = steps[3]
+    if src_core == dst_core == sizeof(double) and src_step == dst_step == 3 * sizeof(double):
+        conv.batch(<double*>src, <double*>dst, dimensions[0])
+        return
+    for idx in range(dimensions[0]):
+        conv.convert((<double*>src)[0], (<double*>(src + src_core))[0], (<double*>(src + 2 * src_core))[0],
+                      <double*>dst,      <double*>(dst + dst_core),      <double*>(dst + 2 * dst_core))
+        src += src_step
+        dst += dst_step
+
+cdef void gufunc_triple_loopf(char** args, cnp.npy_intp* dimensions,
+                                           cnp.npy_intp* steps, void* data) noexcept nogil:
+    """ Inner float32 loop for the (3)->(3) gufuncs: `data` points to the Converter.
+        Contiguous pixels go to the batch kernel, and any others one by one.
+    """
+    cdef Converter* conv = <Converter*>data
+    cdef char* src = args[0]
+    cdef char* dst = args[1]
+    cdef cnp.npy_intp idx
+    cdef cnp.npy_intp src_step = steps[0], dst_step = steps[1]
+    cdef cnp.npy_intp src_core = steps[2], dst_core = steps[3]
+    if src_core == dst_core == sizeof(float) and src_step == dst_step == 3 * sizeof(float):
+        conv.batchf(<float*>src, <float*>dst, dimensions[0])
+        return
+    for idx in range(dimensions[0]):
+        conv.convertf((<float*>src)[0], (<float*>(src + src_core))[0], (<float*>(src + 2 * src_core))[0],
+                       <float*>dst,      <float*>(dst + dst_core),      <float*>(dst + 2 * dst_core))
+        src += src_step
+        dst += dst_step
+
+cdef enum:
+    GUFUNC_NTYPES = 2
+
+cdef cnp.PyUFuncGenericFunction gufunc_loops[GUFUNC_NTYPES]
+cdef char gufunc_types[GUFUNC_NTYPES * 2]
+cdef void* gufunc_data[4][GUFUNC_NTYPES]
+cdef Converter gufunc_converters[4]
+
+gufunc_loops[0] = <cnp.PyUFuncGenericFunction>gufunc_triple_loop
+gufunc_loops[1] = <cnp.PyUFuncGenericFunction>gufunc_triple_loopf
+gufunc_types[0] = cnp.NPY_DOUBLE
+gufunc_types[1] = cnp.NPY_DOUBLE
+gufunc_types[2] = cnp.NPY_FLOAT
+gufunc_types[3] = cnp.NPY_FLOAT
+
+cdef object register_gufunc(int index, Converter conv, char* name, char* doc):
+    """ Create a NumPy gufunc with signature (3)->(3) wrapping the conversions in
+        `conv` -- the name and docstring must be static strings, as NumPy keeps the
+        pointers.
+    """
+    gufunc_converters[index] = conv
+    gufunc_data[index][0] = &gufunc_converters[index]
+    gufunc_data[index][1] = &gufunc_converters[index]
+    return cnp.PyUFunc_FromFuncAndDataAndSignature(gufunc_loops, gufunc_data[index],
+                                                   gufunc_types, GUFUNC_NTYPES, 1, 1,
+                                                   cnp.PyUFunc_None, name, doc, 0,
+                                                   b"(3)->(3)")
+
+hsluv2rgb = register_gufunc(0, hsluv_to_rgb_converter, b"hsluv2rgb",
+                            b"Convert HSLuv triples along the last axis to RGB.")
+rgb2hsluv = register_gufunc(1, rgb_to_hsluv_converter, b"rgb2hsluv",
+                            b"Convert RGB triples along the last axis to HSLuv.")
+hpluv2rgb = register_gufunc(2, hpluv_to_rgb_converter, b"hpluv2rgb",
+                            b"Convert HPLuv triples along the last axis to RGB.")
+rgb2hpluv = register_gufunc(3, rgb_to_hpluv_converter, b"rgb2hpluv",
+                            b"Convert RGB triples along the last axis to HPLuv.")
+
+cdef Py_ssize_t RGB8_TABLE_SIZE = 1 << 24
+tables = {}
+tables_lock = threading.Lock()
+
+cdef triple_fn rgb_converter(object kind) except NULL:
+    """ Return the C function converting RGB to the color space named by `kind` """
+    if kind == 'hsluv':
+        return funcs.rgb2hsluv
+    if kind == 'hpluv':
+        return funcs.rgb2hpluv
+    raise ValueError(f"unknown color space {kind!r} (expected 'hsluv' or 'hpluv')")
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void fill_rgb8_table(triple_fn convert, real[:, ::1] table, int threads) noexcept nogil:
+    cdef Py_ssize_t idx
+    cdef double x, y, z
+    for idx in prange(table.shape[0], num_threads=threads, schedule='static'):
+        convert(((idx >> 16) & 0xFF) / 255.0,
+                ((idx >>  8) & 0xFF) / 255.0,
+                ( idx        & 0xFF) / 255.0, address(x), address(y), address(z))
+        table[idx, 0] = <real>x
+        table[idx, 1] = <real>y
+        table[idx, 2] = <real>z
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void gather_rgb8(const unsigned char[:, ::1] src, const real[:, ::1] table,
+                                                            real[:, ::1] dst) noexcept nogil:
+    cdef Py_ssize_t idx, key
+    cdef int threads = num_threads if src.shape[0] >= PARALLEL_THRESHOLD else 1
+    for idx in prange(src.shape[0], num_threads=threads, schedule='static'):
+        key = (<Py_ssize_t>src[idx, 0] << 16) | (<Py_ssize_t>src[idx, 1] << 8) | src[idx, 2]
+        dst[idx, 0] = table[key, 0]
+        dst[idx, 1] = table[key, 1]
+        dst[idx, 2] = table[key, 2]
+
+def build_rgb8_table(kind='hsluv', dtype=numpy.float32, parallel=True):
+    """ Compute a new (2**24, 3) lookup table holding the conversion of every 24-bit
+        sRGB color to HSLuv or HPLuv (per `kind`) as float32 or float64 (per `dtype`),
+        indexed by (r << 16) | (g << 8) | b -- across all threads if `parallel` is set
+    """
+    cdef triple_fn convert = rgb_converter(kind)
+    cdef float[:, ::1] ftable
+    cdef double[:, ::1] dtable
+    cdef int threads = num_threads if parallel else 1
+    dtype = numpy.dtype(dtype)
+    if dtype not in (numpy.float32, numpy.float64):
+        raise ValueError(f"lookup tables are float32 or float64, not {dtype.name}")
+    table = numpy.empty((RGB8_TABLE_SIZE, 3), dtype=dtype)
+    if dtype == numpy.float32:
+        ftable = table
+        with nogil:
+            fill_rgb8_table(convert, ftable, threads)
+    else:
+        dtable = table
+        with nogil:
+            fill_rgb8_table(convert, dtable, threads)
+    return table
+
+cdef object memoized_table(str name, object dtype, tuple shape, object build, bint persist):
+    """ Return the read-only table `name` of `dtype`, calling `build()` to compute
+        it on first use -- or, if `persist` is set, memory-mapping it from the on-disk
+        cache in `hsluv.cache`, which it is written to the first time any process
+        builds it. Tables stay in memory until `clear_tables()` is called. Tables are
+        built by the scalar conversions, so any flags from `set_flags()` are part of
+        the name: approximate tables never stand in for exact ones.
+    """
+    cdef unsigned flags = funcs.hsluv_get_flags()
+    if flags:
+        name = f"{name}-flags{flags}"
+    key = (name, dtype.name)
+    with tables_lock:
+        if key not in tables:
+            if persist:
+                table = cache.cached_table(__version__, name, dtype, shape, build)
+            else:
+                table = build()
+            table.flags.writeable = False
+            tables[key] = table
+        return tables[key]
+
+def clear_tables():
+    """ Release every lookup table built by `get_rgb8_table()` or
+        `get_inverse_table()` -- the on-disk cache is left alone
+    """
+    with tables_lock:
+        tables.clear()
+
+def get_rgb8_table(kind='hsluv', dtype=numpy.float32, parallel=True, persist=True):
+    """ Return the read-only lookup table from `build_rgb8_table()` for `kind` and
+        `dtype` -- float32 (192 MiB) or float64 (384 MiB) -- built on first use or,
+        if `persist` is set, memory-mapped from the on-disk cache
+    """
+    rgb_converter(kind)  # raises for an unknown kind, before taking the lock
+    dtype = numpy.dtype(dtype)
+    build = lambda: build_rgb8_table(kind, dtype, parallel)
+    return memoized_table(f"rgb8-{kind}", dtype, (RGB8_TABLE_SIZE, 3), build, persist)
+
+cdef object convert_rgb8(object kind, object pixels, object out, object dtype):
+    source = numpy.asarray(pixels)
+    if source.dtype != numpy.uint8:
+        raise TypeError(f"expected a uint8 array, got {source.dtype.name}")
+    source = numpy.ascontiguousarray(source)
+    if source.ndim < 1 or source.shape[source.ndim - 1] != 3:
+        raise ValueError(f"expected an array of shape (..., 3), got {source.shape}")
+    table = get_rgb8_table(kind, dtype)
+    output = prepare_output(source, out, False, table.dtype)
+    cdef const unsigned char[:, ::1] src = source.reshape(-1, 3)
+    cdef const float[:, ::1] ftable
+    cdef const double[:, ::1] dtable
+    cdef float[:, ::1] fdst
+    cdef double[:, ::1] ddst
+    if table.dtype == numpy.float32:
+        ftable, fdst = table, output.reshape(-1, 3)
+        with nogil:
+            gather_rgb8(src, ftable, fdst)
+    else:
+        dtable, ddst = table, output.reshape(-1, 3)
+        with nogil:
+            gather_rgb8(src, dtable, ddst)
+    return output
+
+def rgb8_to_hsluv_batch(pixels, out=None, dtype=numpy.float32):
+    """ Convert an array of 8-bit sRGB triples, shaped (..., 3), to HSLuv with one
+        lookup per pixel in the `dtype` table from `get_rgb8_table()`
+    """
+    return convert_rgb8('hsluv', pixels, out, dtype)
+
+def rgb8_to_hpluv_batch(pixels, out=None, dtype=numpy.float32):
+    """ Convert an array of 8-bit sRGB triples, shaped (..., 3), to HPLuv with one
+        lookup per pixel in the `dtype` table from `get_rgb8_table()`
+    """
+    return convert_rgb8('hpluv', pixels, out, dtype)
+
+cdef triple_fn inverse_converter(object kind) except NULL:
+    """ Return the C function converting the color space named by `kind` to RGB """
+    if kind == 'hsluv':
+        return funcs.hsluv2rgb
+    if kind == 'hpluv':
+        return funcs.hpluv2rgb
+    raise ValueError(f"unknown color space {kind!r} (expected 'hsluv' or 'hpluv')")
+
+cdef tuple inverse_table_shape(object size):
+    """ Normalize a table resolution -- one grid size for all of (H, S, L), or one
+        for each -- into the shape of the table
+    """
+    sizes = (size,) * 3 if isinstance(size, int) else tuple(int(axis) for axis in size)
+    if len(sizes) != 3 or min(sizes) < 2:
+        raise ValueError(f"inverse table sizes must be at least 2 on all three axes, got {size!r}")
+    return sizes + (3,)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void fill_inverse_table(triple_fn convert, real[:, :, :, ::1] table, int threads) noexcept nogil:
+    cdef Py_ssize_t ih, i_s, il
+    cdef double h, s, l, r, g, b
+    cdef double h_scale = 360.0 / (table.shape[0] - 1)
+    cdef double s_scale = 100.0 / (table.shape[1] - 1)
+    cdef double l_scale = 100.0 / (table.shape[2] - 1)
+    for ih in prange(table.shape[0], num_threads=threads, schedule='static'):
+        h = ih * h_scale
+        for i_s in range(table.shape[1]):
+            s = i_s * s_scale
+            for il in range(table.shape[2]):
+                l = il * l_scale
+                convert(h, s, l, address(r), address(g), address(b))
+                table[ih, i_s, il, 0] = <real>r
+                table[ih, i_s, il, 1] = <real>g
+                table[ih, i_s, il, 2] = <real>b
+
+cdef inline Py_ssize_t grid_cell(double value, double scale, Py_ssize_t size,
+                                 double* fraction) noexcept nogil:
+    """ Locate `value` (already clamped to the grid) in a grid axis of `size` points,
+        returning the index of the cell and storing the offset within it
+    """
+    cdef double position = value * scale
+    cdef Py_ssize_t cell = <Py_ssize_t>position
+    if cell > size - 2:
+        cell = size - 2
+    fraction[0] = position - cell
+    return cell
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void interpolate_inverse(const double[:, ::1] src, const real[:, :, :, ::1] table,
+                                    double[:, ::1] dst) noexcept nogil:
+    """ Tetrahedral interpolation in a (H, S, L) -> RGB grid: each cell is split into
+        six tetrahedra along its main diagonal, and the four corners of the one that
+        holds the point are blended -- four table reads per channel, not eight.
+    """
+    cdef Py_ssize_t idx, channel, base, first, second
+    cdef Py_ssize_t nh = table.shape[0], ns = table.shape[1], nl = table.shape[2]
+    cdef Py_ssize_t step_h = ns * nl * 3, step_s = nl * 3, step_l = 3
+    cdef Py_ssize_t last = step_h + step_s + step_l
+    cdef double h, s, l, fh, fs, fl, f1, f2, f3
+    cdef const real* corner
+    cdef int threads = num_threads if src.shape[0] >= PARALLEL_THRESHOLD else 1
+    for idx in prange(src.shape[0], num_threads=threads, schedule='static'):
+        if not (isfinite(src[idx, 0]) and isfinite(src[idx, 1]) and isfinite(src[idx, 2])):
+            dst[idx, 0] = NAN  # no cell to locate, and casting NaN to an index is undefined
+            dst[idx, 1] = NAN
+            dst[idx, 2] = NAN
+            continue
+        h = src[idx, 0] - 360.0 * floor(src[idx, 0] / 360.0)
+        s = fmin(fmax(src[idx, 1], 0.0), 100.0)
+        l = fmin(fmax(src[idx, 2], 0.0), 100.0)
+        base = grid_cell(h, (nh - 1) / 360.0, nh, address(fh)) * step_h \
+             + grid_cell(s, (ns - 1) / 100.0, ns, address(fs)) * step_s \
+             + grid_cell(l, (nl - 1) / 100.0, nl, address(fl)) * step_l
+        if fh >= fs:
+            if fs >= fl:
+                f1, f2, f3, first, second = fh, fs, fl, step_h, step_h + step_s
+            elif fh >= fl:
+                f1, f2, f3, first, second = fh, fl, fs, step_h, step_h + step_l
+            else:
+                f1, f2, f3, first, second = fl, fh, fs, step_l, step_h + step_l
+        else:
+            if fl >= fs:
+                f1, f2, f3, first, second = fl, fs, fh, step_l, step_s + step_l
+            elif fl >= fh:
+                f1, f2, f3, first, second = fs, fl, fh, step_s, step_s + step_l
+            else:
+                f1, f2, f3, first, second = fs, fh, fl, step_s, step_h + step_s
+        corner = &table[0, 0, 0, 0] + base
+        for channel in range(3):
+            dst[idx, channel] = (1.0 - f1) * corner[channel] \
+                              + (f1 - f2)  * corner[first + channel] \
+                              + (f2 - f3)  * corner[second + channel] \
+                              + f3         * corner[last + channel]
+
+def build_inverse_table(kind='hsluv', size=65, dtype=numpy.float32, parallel=True):
+    """ Compute a new table sampling the HSLuv or HPLuv (per `kind`) to RGB conversion
+        on a uniform (H, S, L) grid spanning [0, 360] x [0, 100] x [0, 100], with `size`
+        points per axis (or a triple of per-axis sizes), as float32 or float64
+    """
+    cdef triple_fn convert = inverse_converter(kind)
+    cdef float[:, :, :, ::1] ftable
+    cdef double[:, :, :, ::1] dtable
+    cdef int threads = num_threads if parallel else 1
+    dtype = numpy.dtype(dtype)
+    if dtype not in (numpy.float32, numpy.float64):
+        raise ValueError(f"lookup tables are float32 or float64, not {dtype.name}")
+    table = numpy.empty(inverse_table_shape(size), dtype=dtype)
+    if dtype == numpy.float32:
+        ftable = table
+        with nogil:
+            fill_inverse_table(convert, ftable, threads)
+    else:
+        dtable = table
+        with nogil:
+            fill_inverse_table(convert, dtable, threads)
+    return table
+
+def get_inverse_table(kind='hsluv', size=65, dtype=numpy.float32, parallel=True, persist=True):
+    """ Return the read-only table from `build_inverse_table()` for `kind`, `size`
+        and `dtype`, built on first use or, if `persist` is set, memory-mapped from
+        the on-disk cache
+    """
+    inverse_converter(kind)  # raises for an unknown kind, before taking the lock
+    dtype = numpy.dtype(dtype)
+    shape = inverse_table_shape(size)
+    build = lambda: build_inverse_table(kind, shape[:3], dtype, parallel)
+    return memoized_table(f"inverse-{kind}-{shape[0]}x{shape[1]}x{shape[2]}",
+                          dtype, shape, build, persist)
+
+cdef object convert_inverse(object kind, object pixels, object out, object size, object dtype):
+    source = numpy.ascontiguousarray(pixels, dtype=numpy.float64)
+    if source.ndim < 1 or source.shape[source.ndim - 1] != 3:
+        raise ValueError(f"expected an array of shape (..., 3), got {source.shape}")
+    table = get_inverse_table(kind, size, dtype)
+    output = prepare_output(source, out, False)
+    cdef const double[:, ::1] src = source.reshape(-1, 3)
+    cdef double[:, ::1] dst = output.reshape(-1, 3)
+    cdef const float[:, :, :, ::1] ftable
+    cdef const double[:, :, :, ::1] dtable
+    if table.dtype == numpy.float32:
+        ftable = table
+        with nogil:
+            interpolate_inverse(src, ftable, dst)
+    else:
+        dtable = table
+        with nogil:
+            interpolate_inverse(src, dtable, dst)
+    return output
+
+def hsluv_to_rgb_approx_batch(pixels, out=None, size=65, dtype=numpy.float32):
+    """ Approximate `hsluv_to_rgb_batch()` by tetrahedral interpolation in the table
+        from `get_inverse_table()`. Saturation and lightness are clamped to [0, 100],
+        and a pixel with a NaN or infinite component comes out all NaN; see
+        `inverse_table_error()` for the accuracy of a given `size` and `dtype`.
+    """
+    return convert_inverse('hsluv', pixels, out, size, dtype)
+
+def hpluv_to_rgb_approx_batch(pixels, out=None, size=65, dtype=numpy.float32):
+    """ Approximate `hpluv_to_rgb_batch()` by tetrahedral interpolation in the table
+        from `get_inverse_table()`. Saturation and lightness are clamped to [0, 100],
+        and a pixel with a NaN or infinite component comes out all NaN; see
+        `inverse_table_error()` for the accuracy of a given `size` and `dtype`.
+    """
+    return convert_inverse('hpluv', pixels, out, size, dtype)
+
+def inverse_table_error(kind='hsluv', size=65, dtype=numpy.float32, samples=1000000, seed=0):
+    """ Measure the approximate conversion against the exact C conversion over
+        `samples` random (H, S, L) points, returning a dict of the max, mean and RMS
+        absolute RGB channel error. With the default 65-point tables, the mean error
+        is about 0.0004 for HSLuv and 0.00007 for HPLuv. The worst case -- about 0.22
+        and 0.04 respectively -- sits at full saturation near the cusps of the sRGB
+        gamut, where the exact conversion bends too sharply for any grid to follow.
+        Each doubling of `size` cuts the mean error three- to fourfold (the worst case
+        only by about a third) for eight times the memory; float32 tables are as
+        accurate as float64 ones at every size worth using.
+    """
+    generator = numpy.random.default_rng(seed)
+    points = generator.random((samples, 3)) * (360.0, 100.0, 100.0)
+    if kind == 'hsluv':
+        exact = hsluv_to_rgb_batch(points)
+    else:
+        exact = hpluv_to_rgb_batch(points)
+    error = numpy.abs(convert_inverse(kind, points, None, size, dtype) - exact)
+    return dict(max=float(error.max()),
+                mean=float(error.mean()),
+                rms=float(numpy.sqrt(numpy.mean(error * error))),
+                samples=samples)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+""" Persistent on-disk cache for the precomputed tables in hsluv.api.
+
+    Tables are stored as NumPy .npy files named for the cache format, the library
+    version, the table kind and the dtype -- so an upgrade never picks up a stale
+    table -- and are loaded back memory-mapped read-only, letting every process on
+    a host share one page-cache copy of each table.
+"""
+
+import os
+import os.path
+import secrets
+import numpy
+import typing as tx
+
+FORMAT: int = 1
+
+MaybeTable = tx.Optional[numpy.ndarray]
+Builder = tx.Callable[[], numpy.ndarray]
+
+def cache_directory() -> tx.Optional[str]:
+    """ Return the cache directory: $HSLUV_CACHE_DIR if it is set, or “hsluv” under
+        $XDG_CACHE_HOME (~/.cache by default) otherwise. Setting HSLUV_CACHE_DIR to
+        an empty string disables the on-disk cache, in which case this returns None.
+    """
+    directory: tx.Optional[str] = os.environ.get('HSLUV_CACHE_DIR')
+    if directory is None:
+        base: str = os.environ.get('XDG_CACHE_HOME') or os.path.join('~', '.cache')
+        directory = os.path.join(os.path.expanduser(base), 'hsluv')
+    return directory or None
+
+def table_path(version: str, kind: str, dtype: tx.Any) -> tx.Optional[str]:
+    """ Return the path of the cache file for a table, or None if caching is off """
+    directory: tx.Optional[str] = cache_directory()
+    if directory is None:
+        return None
+    filename: str = f"table-f{FORMAT}-{version}-{kind}-{numpy.dtype(dtype).name}.npy"
+    return os.path.join(directory, filename)
+
+def load_table(version: str, kind: str, dtype: tx.Any, shape: tx.Tuple[int, ...]) -> MaybeTable:
+    """ Memory-map a cached table read-only, returning None if there is no usable
+        cache file -- missing, truncated, or of the wrong dtype or shape.
+    """
+    path: tx.Optional[str] = table_path(version, kind, dtype)
+    if path is None or not os.path.isfile(path):
+        return None
+    try:
+        table: numpy.ndarray = numpy.load(path, mmap_mode='r', allow_pickle=False)
+    except (OSError, ValueError):
+        return None
+    if table.dtype != numpy.dtype(dtype) or table.shape != tuple(shape):
+        return None
+    return table
+
+def store_table(version: str, kind: str, table: numpy.ndarray) -> tx.Optional[str]:
+    """ Write a table to the cache, returning its path -- or None if caching is off
+        or the cache directory is not writable. The file is written under a temporary
+        name and renamed into place, so concurrent readers never see a partial table.
+        It is created readable by all, as far as the umask allows, so the cache can
+        be shared like any other file the user writes.
+    """
+    path: tx.Optional[str] = table_path(version, kind, table.dtype)
+    if path is None:
+        return None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary: str = f"{path}.{os.getpid()}-{secrets.token_hex(8)}.tmp"
+        handle: int = os.open(temporary, os.O_CREAT | os.O_EXCL | os.O_WRONLY
+                                         | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            with os.fdopen(handle, 'wb') as stream:
+                numpy.save(stream, table, allow_pickle=False)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+    except OSError:
+        return None
+    return path
+
+def cached_table(version: str, kind: str, dtype: tx.Any, shape: tx.Tuple[int, ...],
+                 build: Builder) -> numpy.ndarray:
+    """ Return a table from the cache, calling `build()` and caching its result
+        first if need be. Whenever the cache is usable the returned table is the
+        read-only memory map rather than the freshly built array.
+    """
+    table: MaybeTable = load_table(version, kind, dtype, shape)
+    if table is None:
+        built: numpy.ndarray = build()
+        if store_table(version, kind, built) is not None:
+            table = load_table(version, kind, dtype, shape)
+        if table is None:
+            table = built
+    return table
+
+def clear(version: tx.Optional[str] = None) -> int:
+    """ Delete cached tables -- only those of `version`, if given -- returning the
+        number of files removed
+    """
+    directory: tx.Optional[str] = cache_directory()
+    if directory is None or not os.path.isdir(directory):
+        return 0
+    prefix: str = f"table-f{FORMAT}-{version}-" if version else "table-"
+    removed: int = 0
+    for filename in os.listdir(directory):
+        if filename.startswith(prefix) and filename.endswith('.npy'):
+            try:
+                os.unlink(os.path.join(directory, filename))
+            except OSError:
+                continue
+            removed += 1
+    return removed
@@ -12,3 +12,79 @@ cdef extern from "hsluv.h" nogil:
     
     void rgb2hpluv(double   r, double   g, double   b,
                    double* ph, double* ps, double* pl)
+    
+    void hsluv2rgbf(float   h, float   s, float   l,
+                    float* pr, float* pg, float* pb)
+    
+    void rgb2hsluvf(float   r, float   g, float   b,
+                    float* ph, float* ps, float* pl)
+    
+    void hpluv2rgbf(float   h, float   s, float   l,
+                    float* pr, float* pg, float* pb)
+    
+    void rgb2hpluvf(float   r, float   g, float   b,
+                    float* ph, float* ps, float* pl)
+    
+    void hsluv2rgb_batch(const double* src, double* dst, size_t n)
+    void rgb2hsluv_batch(const double* src, double* dst, size_t n)
+    void hpluv2rgb_batch(const double* src, double* dst, size_t n)
+    void rgb2hpluv_batch(const double* src, double* dst, size_t n)
+    
+    void hsluv2rgbf_batch(const float* src, float* dst, size_t n)
+    void rgb2hsluvf_batch(const float* src, float* dst, size_t n)
+    void hpluv2rgbf_batch(const float* src, float* dst, size_t n)
+    void rgb2hpluvf_batch(const float* src, float* dst, size_t n)
+    
+    enum:
+        HSLUV_FLOAT64
+        HSLUV_FLOAT32
+        HSLUV_UINT8
+        HSLUV_UINT16
+    
+    enum:
+        HSLUV_RGB
+        HSLUV_BGR
+        HSLUV_RGBA
+        HSLUV_BGRA
+        HSLUV_ARGB
+        HSLUV_ABGR
+        HSLUV_PREMULTIPLIED
+        HSLUV_SELECT_H
+        HSLUV_SELECT_S
+        HSLUV_SELECT_L
+    
+    ctypedef struct hsluv_pixels:
+        void* data
+        int type
+        int layout
+        ptrdiff_t pixel_stride
+        ptrdiff_t channel_stride
+    
+    void hsluv2rgb_pixels(const hsluv_pixels* src, const hsluv_pixels* dst, size_t n)
+    void rgb2hsluv_pixels(const hsluv_pixels* src, const hsluv_pixels* dst, size_t n)
+    void hpluv2rgb_pixels(const hsluv_pixels* src, const hsluv_pixels* dst, size_t n)
+    void rgb2hpluv_pixels(const hsluv_pixels* src, const hsluv_pixels* dst, size_t n)
+    void rgb2lightness_pixels(const hsluv_pixels* src, const hsluv_pixels* dst, size_t n)
+    
+    void rgb2xyz_pixels(const hsluv_pixels* src, const hsluv_pixels* dst, size_t n)
+    void xyz2rgb_pixels(const hsluv_pixels* src, const hsluv_pixels* dst, size_t n)
+    void xyz2luv_pixels(const hsluv_pixels* src, const hsluv_pixels* dst, size_t n)
+    void luv2xyz_pixels(const hsluv_pixels* src, const hsluv_pixels* dst, size_t n)
+    void luv2lch_pixels(const hsluv_pixels* src, const hsluv_pixels* dst, size_t n)
+    void lch2luv_pixels(const hsluv_pixels* src, const hsluv_pixels* dst, size_t n)
+    void lch2hsluv_pixels(const hsluv_pixels* src, const hsluv_pixels* dst, size_t n)
+    void hsluv2lch_pixels(const hsluv_pixels* src, const hsluv_pixels* dst, size_t n)
+    void lch2hpluv_pixels(const hsluv_pixels* src, const hsluv_pixels* dst, size_t n)
+    void hpluv2lch_pixels(const hsluv_pixels* src, const hsluv_pixels* dst, size_t n)
+    void hsluv2hpluv_pixels(const hsluv_pixels* src, const hsluv_pixels* dst, size_t n)
+    void hpluv2hsluv_pixels(const hsluv_pixels* src, const hsluv_pixels* dst, size_t n)
+    
+    int hsluv_batch_set_isa(const char* isa)
+    const char* hsluv_batch_isa()
+    
+    enum:
+        HSLUV_CACHE_BOUNDS
+        HSLUV_SAFE_CHROMA_TABLE
+    
+    void hsluv_set_flags(unsigned flags)
+    unsigned hsluv_get_flags()
@@ -30,6 +30,15 @@
 
 #include <float.h>
 #include <math.h>
+#include <stdint.h>
+#include <string.h>
+
+
+#if defined _MSC_VER
+    #define THREAD_LOCAL __declspec(thread)
+#else
+    #define THREAD_LOCAL __thread
+#endif
 
 
 typedef struct Triplet_tag Triplet;
@@ -60,6 +69,16 @@ static const double kappa = 903.29629629629629629630;
 static const double epsilon = 0.00885645167903563082;
 
 
+/* Unit vector along a hue angle in the (u, v) plane. The stages below pass it
+ * along instead of the angle, so the chroma bounds are evaluated without any
+ * trigonometry: at most one sin/cos pair (HSLuv/HPLuv to RGB) or one atan2
+ * (RGB to HSLuv/HPLuv) per conversion. */
+typedef struct Direction_tag Direction;
+struct Direction_tag {
+    double cos_h;
+    double sin_h;
+};
+
 typedef struct Bounds_tag Bounds;
 struct Bounds_tag {
     double a;
@@ -92,6 +111,9 @@ get_bounds(double l, Bounds bounds[6])
     }
 }
 
+/* See hsluv_set_flags() */
+static unsigned flags = 0;
+
 static double
 intersect_line_line(const Bounds* line1, const Bounds* line2)
 {
@@ -105,20 +127,18 @@ dist_from_pole(double x, double y)
 }
 
 static double
-ray_length_until_intersect(double theta, const Bounds* line)
+ray_length_until_intersect(const Direction* dir, const Bounds* line)
 {
-    return line->b / (sin(theta) - line->a * cos(theta));
+    return line->b / (dir->sin_h - line->a * dir->cos_h);
 }
 
 static double
-max_safe_chroma_for_l(double l)
+max_safe_chroma_for_bounds(const Bounds* bounds, int n)
 {
     double min_len = DBL_MAX;
-    Bounds bounds[6];
     int i;
 
-    get_bounds(l, bounds);
-    for(i = 0; i < 6; i++) {
+    for(i = 0; i < n; i++) {
         double m1 = bounds[i].a;
         double b1 = bounds[i].b;
         /* x where line intersects with perpendicular running though (0, 0) */
@@ -133,17 +153,137 @@ max_safe_chroma_for_l(double l)
     return min_len;
 }
 
+/* Per-lightness cache of get_bounds() results (see HSLUV_CACHE_BOUNDS).
+ * It is direct-mapped and keyed on the exact bit pattern of L, so a hit
+ * returns precisely what get_bounds() would have computed. Entries also
+ * memoize the maximal safe chroma, once some HPLuv conversion needs it.
+ * Every thread gets a cache of its own. */
+#define BOUNDS_CACHE_BITS   6
+#define BOUNDS_CACHE_SIZE   (1 << BOUNDS_CACHE_BITS)
+
+typedef struct BoundsCacheEntry_tag BoundsCacheEntry;
+struct BoundsCacheEntry_tag {
+    uint64_t key;
+    int valid;
+    int has_safe_chroma;
+    double safe_chroma;
+    Bounds bounds[6];
+};
+
+static THREAD_LOCAL BoundsCacheEntry bounds_cache[BOUNDS_CACHE_SIZE];
+
+static BoundsCacheEntry*
+bounds_cache_entry(double l)
+{
+    BoundsCacheEntry* entry;
+    uint64_t key;
+
+    memcpy(&key, &l, sizeof(key));
+    entry = &bounds_cache[((key ^ (key >> 32)) * 0x9E3779B97F4A7C15ULL) >> (64 - BOUNDS_CACHE_BITS)];
+    if(!entry->valid  ||  entry->key != key) {
+        get_bounds(l, entry->bounds);
+        entry->key = key;
+        entry->valid = 1;
+        entry->has_safe_chroma = 0;
+    }
+    return entry;
+}
+
+static const Bounds*
+lookup_bounds(double l, Bounds scratch[6])
+{
+    if(!(flags & HSLUV_CACHE_BOUNDS)) {
+        get_bounds(l, scratch);
+        return scratch;
+    }
+    return bounds_cache_entry(l)->bounds;
+}
+
+/* Distance from the pole to each of the six gamut bounds, sampled over the
+ * whole lightness range for linear interpolation (see
+ * HSLUV_SAFE_CHROMA_TABLE). Each distance is a smooth function of L, unlike
+ * their minimum, which has a kink wherever the nearest bound changes; so the
+ * distances are interpolated one by one, and the minimum taken afterwards.
+ * The table is built by hsluv_set_flags() the first time the flag is set,
+ * so conversions never race to build it. All distances go to zero with the
+ * lightness, which is where get_bounds() itself breaks down. */
+#define SAFE_CHROMA_TABLE_SIZE  4096
+
+static double safe_chroma_table[SAFE_CHROMA_TABLE_SIZE + 1][6];
+static int safe_chroma_table_ready = 0;
+
+static void
+build_safe_chroma_table(void)
+{
+    Bounds bounds[6];
+    int i;
+    int j;
+
+    for(j = 0; j < 6; j++)
+        safe_chroma_table[0][j] = 0.0;
+    for(i = 1; i <= SAFE_CHROMA_TABLE_SIZE; i++) {
+        get_bounds(i * (100.0 / SAFE_CHROMA_TABLE_SIZE), bounds);
+        for(j = 0; j < 6; j++)
+            safe_chroma_table[i][j] = max_safe_chroma_for_bounds(&bounds[j], 1);
+    }
+    safe_chroma_table_ready = 1;
+}
+
 static double
-max_chroma_for_lh(double l, double h)
+interpolate_safe_chroma(double l)
 {
     double min_len = DBL_MAX;
-    double hrad = h * 0.01745329251994329577; /* (2 * pi / 260) */
+    double position = l * (SAFE_CHROMA_TABLE_SIZE / 100.0);
+    int i = (int) position;
+    int j;
+
+    if(i < 0)
+        i = 0;
+    else if(i > SAFE_CHROMA_TABLE_SIZE - 1)
+        i = SAFE_CHROMA_TABLE_SIZE - 1;
+    position -= i;
+
+    for(j = 0; j < 6; j++) {
+        double distance = safe_chroma_table[i][j] + position * (safe_chroma_table[i + 1][j] - safe_chroma_table[i][j]);
+
+        if(distance < min_len)
+            min_len = distance;
+    }
+    return min_len;
+}
+
+static double
+max_safe_chroma_for_l(double l)
+{
     Bounds bounds[6];
-    int i;
+    BoundsCacheEntry* entry;
+
+    if(flags & HSLUV_SAFE_CHROMA_TABLE)
+        return interpolate_safe_chroma(l);
+
+    if(flags & HSLUV_CACHE_BOUNDS) {
+        entry = bounds_cache_entry(l);
+        if(!entry->has_safe_chroma) {
+            entry->safe_chroma = max_safe_chroma_for_bounds(entry->bounds, 6);
+            entry->has_safe_chroma = 1;
+        }
+        return entry->safe_chroma;
+    }
 
     get_bounds(l, bounds);
+    return max_safe_chroma_for_bounds(bounds, 6);
+}
+
+static double
+max_chroma_for_lh(double l, const Direction* dir)
+{
+    double min_len = DBL_MAX;
+    Bounds scratch[6];
+    const Bounds* bounds = lookup_bounds(l, scratch);
+    int i;
+
     for(i = 0; i < 6; i++) {
-        double l = ray_length_until_intersect(hrad, &bounds[i]);
+        double l = ray_length_until_intersect(dir, &bounds[i]);
 
         if(l >= 0  &&  l < min_len)
             min_len = l;
@@ -265,7 +405,17 @@ luv2xyz(Triplet* in_out)
 }
 
 static void
-luv2lch(Triplet* in_out)
+hue_direction(double h, Direction* dir)
+{
+    double hrad = h * 0.01745329251994329577;  /* (pi / 180.0) */
+
+    dir->cos_h = cos(hrad);
+    dir->sin_h = sin(hrad);
+}
+
+/* The direction of the hue is stored into dir, unless it is NULL. */
+static void
+luv2lch(Triplet* in_out, Direction* dir)
 {
     double l = in_out->a;
     double u = in_out->b;
@@ -276,10 +426,18 @@ luv2lch(Triplet* in_out)
     /* Grays: disambiguate hue */
     if(c < 0.00000001) {
         h = 0;
+        if(dir != NULL) {
+            dir->cos_h = 1.0;
+            dir->sin_h = 0.0;
+        }
     } else {
         h = atan2(v, u) * 57.29577951308232087680;  /* (180 / pi) */
         if(h < 0.0)
             h += 360.0;
+        if(dir != NULL) {
+            dir->cos_h = u / c;
+            dir->sin_h = v / c;
+        }
     }
 
     in_out->a = l;
@@ -288,18 +446,18 @@ luv2lch(Triplet* in_out)
 }
 
 static void
-lch2luv(Triplet* in_out)
+lch2luv(Triplet* in_out, const Direction* dir)
 {
-    double hrad = in_out->c * 0.01745329251994329577;  /* (pi / 180.0) */
-    double u = cos(hrad) * in_out->b;
-    double v = sin(hrad) * in_out->b;
+    double u = dir->cos_h * in_out->b;
+    double v = dir->sin_h * in_out->b;
 
     in_out->b = u;
     in_out->c = v;
 }
 
+/* The hue is disambiguated for grays, and dir along with it. */
 static void
-hsluv2lch(Triplet* in_out)
+hsluv2lch(Triplet* in_out, Direction* dir)
 {
     double h = in_out->a;
     double s = in_out->b;
@@ -310,11 +468,14 @@ hsluv2lch(Triplet* in_out)
     if(l > 99.9999999 || l < 0.00000001)
         c = 0.0;
     else
-        c = max_chroma_for_lh(l, h) / 100.0 * s;
+        c = max_chroma_for_lh(l, dir) / 100.0 * s;
 
     /* Grays: disambiguate hue */
-    if (s < 0.00000001)
+    if (s < 0.00000001) {
         h = 0.0;
+        dir->cos_h = 1.0;
+        dir->sin_h = 0.0;
+    }
 
     in_out->a = l;
     in_out->b = c;
@@ -322,7 +483,7 @@ hsluv2lch(Triplet* in_out)
 }
 
 static void
-lch2hsluv(Triplet* in_out)
+lch2hsluv(Triplet* in_out, const Direction* dir)
 {
     double l = in_out->a;
     double c = in_out->b;
@@ -333,7 +494,7 @@ lch2hsluv(Triplet* in_out)
     if(l > 99.9999999 || l < 0.00000001)
         s = 0.0;
     else
-        s = c / max_chroma_for_lh(l, h) * 100.0;
+        s = c / max_chroma_for_lh(l, dir) * 100.0;
 
     /* Grays: disambiguate hue */
     if (c < 0.00000001)
@@ -344,8 +505,9 @@ lch2hsluv(Triplet* in_out)
     in_out->c = l;
 }
 
+/* The hue is disambiguated for grays, and dir along with it. */
 static void
-hpluv2lch(Triplet* in_out)
+hpluv2lch(Triplet* in_out, Direction* dir)
 {
     double h = in_out->a;
     double s = in_out->b;
@@ -359,8 +521,11 @@ hpluv2lch(Triplet* in_out)
         c = max_safe_chroma_for_l(l) / 100.0 * s;
 
     /* Grays: disambiguate hue */
-    if (s < 0.00000001)
+    if (s < 0.00000001) {
         h = 0.0;
+        dir->cos_h = 1.0;
+        dir->sin_h = 0.0;
+    }
 
     in_out->a = l;
     in_out->b = c;
@@ -396,9 +561,11 @@ void
 hsluv2rgb(double h, double s, double l, double* pr, double* pg, double* pb)
 {
     Triplet tmp = { h, s, l };
+    Direction dir;
 
-    hsluv2lch(&tmp);
-    lch2luv(&tmp);
+    hue_direction(h, &dir);
+    hsluv2lch(&tmp, &dir);
+    lch2luv(&tmp, &dir);
     luv2xyz(&tmp);
     xyz2rgb(&tmp);
 
@@ -411,9 +578,11 @@ void
 hpluv2rgb(double h, double s, double l, double* pr, double* pg, double* pb)
 {
     Triplet tmp = { h, s, l };
+    Direction dir;
 
-    hpluv2lch(&tmp);
-    lch2luv(&tmp);
+    hue_direction(h, &dir);
+    hpluv2lch(&tmp, &dir);
+    lch2luv(&tmp, &dir);
     luv2xyz(&tmp);
     xyz2rgb(&tmp);
 
@@ -426,11 +595,12 @@ void
 rgb2hsluv(double r, double g, double b, double* ph, double* ps, double* pl)
 {
     Triplet tmp = { r, g, b };
+    Direction dir;
 
     rgb2xyz(&tmp);
     xyz2luv(&tmp);
-    luv2lch(&tmp);
-    lch2hsluv(&tmp);
+    luv2lch(&tmp, &dir);
+    lch2hsluv(&tmp, &dir);
 
     *ph = tmp.a;
     *ps = tmp.b;
@@ -444,10 +614,75 @@ rgb2hpluv(double r, double g, double b, double* ph, double* ps, double* pl)
 
     rgb2xyz(&tmp);
     xyz2luv(&tmp);
-    luv2lch(&tmp);
+    luv2lch(&tmp, NULL);
     lch2hpluv(&tmp);
 
     *ph = tmp.a;
     *ps = tmp.b;
     *pl = tmp.c;
 }
+
+/* The single-precision conversions run the double-precision pipeline on
+ * widened inputs and round once at the end, so they are as accurate as
+ * float allows. */
+void
+hsluv2rgbf(float h, float s, float l, float* pr, float* pg, float* pb)
+{
+    double r, g, b;
+
+    hsluv2rgb(h, s, l, &r, &g, &b);
+
+    *pr = (float) r;
+    *pg = (float) g;
+    *pb = (float) b;
+}
+
+void
+hpluv2rgbf(float h, float s, float l, float* pr, float* pg, float* pb)
+{
+    double r, g, b;
+
+    hpluv2rgb(h, s, l, &r, &g, &b);
+
+    *pr = (float) r;
+    *pg = (float) g;
+    *pb = (float) b;
+}
+
+void
+rgb2hsluvf(float r, float g, float b, float* ph, float* ps, float* pl)
+{
+    double h, s, l;
+
+    rgb2hsluv(r, g, b, &h, &s, &l);
+
+    *ph = (float) h;
+    *ps = (float) s;
+    *pl = (float) l;
+}
+
+void
+rgb2hpluvf(float r, float g, float b, float* ph, float* ps, float* pl)
+{
+    double h, s, l;
+
+    rgb2hpluv(r, g, b, &h, &s, &l);
+
+    *ph = (float) h;
+    *ps = (float) s;
+    *pl = (float) l;
+}
+
+void
+hsluv_set_flags(unsigned new_flags)
+{
+    if((new_flags & HSLUV_SAFE_CHROMA_TABLE)  &&  !safe_chroma_table_ready)
+        build_safe_chroma_table();
+    flags = new_flags;
+}
+
+unsigned
+hsluv_get_flags(void)
+{
+    return flags;
+}
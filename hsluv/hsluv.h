@@ -29,6 +29,8 @@
 #ifndef HSLUV_H
 #define HSLUV_H
 
+#include <stddef.h>
+
 #ifdef __cplusplus
 extern "C" {
 #endif
@@ -82,6 +84,240 @@ void hpluv2rgb(double h, double s, double l, double* pr, double* pg, double* pb)
  */
 void rgb2hpluv(double r, double g, double b, double* ph, double* ps, double* pl);
 
+/**
+ * Single-precision variants of the four conversions above.
+ *
+ * Arguments and ranges are the same. Each conversion runs in double
+ * precision internally and rounds only its outputs to float. Against the
+ * double-precision reference for the same (unrounded) color, results are
+ * within 0.00001 for RGB and 0.0001 for hue, saturation and lightness:
+ * about as close as float inputs and outputs allow.
+ *
+ * These only widen their arguments to double and call the functions above,
+ * so they are no faster: they exist for callers that hold floats.
+ */
+void hsluv2rgbf(float h, float s, float l, float* pr, float* pg, float* pb);
+void rgb2hsluvf(float r, float g, float b, float* ph, float* ps, float* pl);
+void hpluv2rgbf(float h, float s, float l, float* pr, float* pg, float* pb);
+void rgb2hpluvf(float r, float g, float b, float* ph, float* ps, float* pl);
+
+
+/**
+ * Batch variants of the conversions above, for n pixels at once.
+ *
+ * The input and output are arrays of 3 * n values, the three components of
+ * each pixel being consecutive (h, s, l, h, s, l, ... or r, g, b, r, g, b,
+ * ...). They may be the same array, for conversion in place, but must not
+ * overlap otherwise. Ranges are the same as for the single-pixel functions.
+ *
+ * These run several pixels per instruction on any SIMD unit the compiler
+ * targets, with vectorized approximations of pow(), cbrt(), atan2(), sin()
+ * and cos() accurate to a few units in the last place: results agree with
+ * the single-pixel functions to within 0.00000001. The flags of
+ * hsluv_set_flags() do not affect them.
+ */
+void hsluv2rgb_batch(const double* in, double* out, size_t n);
+void rgb2hsluv_batch(const double* in, double* out, size_t n);
+void hpluv2rgb_batch(const double* in, double* out, size_t n);
+void rgb2hpluv_batch(const double* in, double* out, size_t n);
+
+/**
+ * The float batch variants likewise compute in double precision, widening
+ * each pixel as it is loaded and rounding it as it is stored. They save
+ * memory traffic, not arithmetic.
+ */
+void hsluv2rgbf_batch(const float* in, float* out, size_t n);
+void rgb2hsluvf_batch(const float* in, float* out, size_t n);
+void hpluv2rgbf_batch(const float* in, float* out, size_t n);
+void rgb2hpluvf_batch(const float* in, float* out, size_t n);
+
+/**
+ * Element types of hsluv_pixels.
+ */
+#define HSLUV_FLOAT64       0
+#define HSLUV_FLOAT32       1
+#define HSLUV_UINT8         2
+#define HSLUV_UINT16        3
+
+/**
+ * Layouts of hsluv_pixels: the order of the components of each pixel, and
+ * where its alpha is, if it has one. They are named for RGB; HSLuv and HPLuv
+ * buffers hold h, s and l where these hold r, g and b.
+ *
+ * HSLUV_PREMULTIPLIED, or'ed onto a layout with alpha, marks RGB components
+ * premultiplied by alpha. It is ignored for HSLuv and HPLuv, which always
+ * hold the straight color.
+ *
+ * HSLUV_SELECT_H, HSLUV_SELECT_S and HSLUV_SELECT_L, any of them or'ed onto
+ * the layout of the output of rgb2hsluv_pixels() or rgb2hpluv_pixels(), make
+ * it hold only these components, in the order h, s, l, without alpha and
+ * whatever the layout. The conversion then skips what only the others need:
+ * the hue without HSLUV_SELECT_H, the gamut bounds without HSLUV_SELECT_S,
+ * and both for HSLUV_SELECT_L alone (see rgb2lightness_pixels()). They are
+ * ignored elsewhere.
+ */
+#define HSLUV_RGB           0
+#define HSLUV_BGR           1
+#define HSLUV_RGBA          2
+#define HSLUV_BGRA          3
+#define HSLUV_ARGB          4
+#define HSLUV_ABGR          5
+#define HSLUV_PREMULTIPLIED 0x100
+#define HSLUV_SELECT_H      0x200
+#define HSLUV_SELECT_S      0x400
+#define HSLUV_SELECT_L      0x800
+
+/**
+ * A buffer of pixels for the typed batch conversions below: n pixels of the
+ * given layout, each made of 3 (or 4, with alpha) values of the given element
+ * type.
+ *
+ * The strides say where these are, in bytes: from each pixel to the next, and
+ * from each component of a pixel to the next in the order of the layout.
+ * Zero strides stand for packed pixels, one after the other, with their
+ * components consecutive. For planar buffers -- one plane per component,
+ * e.g. (3, height, width) arrays -- the pixel stride is the size of the type
+ * and the channel stride the size of a plane. This is the fastest layout, as
+ * it needs no (de)interleaving.
+ */
+typedef struct hsluv_pixels_tag hsluv_pixels;
+struct hsluv_pixels_tag {
+    void* data;
+    int type;                   /* HSLUV_FLOAT64, HSLUV_FLOAT32, HSLUV_UINT8 or HSLUV_UINT16 */
+    int layout;                 /* HSLUV_RGB, HSLUV_BGR, ..., possibly | HSLUV_PREMULTIPLIED */
+    ptrdiff_t pixel_stride;     /* 0 for packed pixels */
+    ptrdiff_t channel_stride;   /* 0 for packed pixels */
+};
+
+/**
+ * Batch conversions between buffers of any element type: e.g. 8-bit RGB to
+ * single-precision HSLuv, or the other way round.
+ *
+ * Integer RGB components span the full range of their type, so 255 (or
+ * 65535) stands for 1.0. Integer hue, saturation and lightness are taken as
+ * they are. On output, integers are rounded to nearest and clamped to the
+ * range of their type: meant for RGB, this also clamps hues to 255 in 8-bit
+ * HSLuv or HPLuv, and rounds XYZ to 0 or 1, so other spaces are best written
+ * as floats. Alpha, which is always a fraction of the full range
+ * (1.0 for floats), is carried from input to output when both have it; output
+ * alpha without input alpha is opaque. Fully transparent premultiplied RGB
+ * converts as black.
+ *
+ * The conversion of element types and layouts happens block by block, inside
+ * the conversion loop, with the same accuracy as the batch conversions above.
+ * The input and output may be the same buffer (of the same type, number of
+ * components and strides), but must not overlap otherwise.
+ */
+void hsluv2rgb_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n);
+void rgb2hsluv_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n);
+void hpluv2rgb_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n);
+void rgb2hpluv_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n);
+
+/**
+ * Batch lightness of RGB pixels: the L of HSLuv and HPLuv (which share it)
+ * without their hue and saturation, which cost most of a conversion.
+ *
+ * The input is as for rgb2hsluv_pixels(). The output holds one value per
+ * pixel, whatever its layout; its pixel stride is the bytes from one value
+ * to the next (0 for consecutive values). 8-bit RGB, unless premultiplied,
+ * is made linear by table lookup rather than by the transfer function.
+ */
+void rgb2lightness_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n);
+
+/**
+ * Batch conversions between the stages the conversions above go through:
+ * RGB, CIE XYZ, CIELUV (L, u, v) and its polar form LCh (L, C, h), then HSLuv
+ * or HPLuv. Each converts n pixels between two neighboring stages, as
+ * buffers of three components each, like the typed batch conversions above:
+ * x, y, z, or l, u, v, or l, c, h where those hold r, g, b. Integer buffers
+ * hold these as they are, except for RGB.
+ *
+ * Hues are in degrees. Grays -- chroma or saturation below 0.00000001 --
+ * get hue 0, as in the conversions above. LCh to LUV, HSLuv and HPLuv take
+ * the direction of the hue from its angle, so a round trip from LUV through
+ * LCh is off by a few units in the last place.
+ */
+void rgb2xyz_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n);
+void xyz2rgb_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n);
+void xyz2luv_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n);
+void luv2xyz_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n);
+void luv2lch_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n);
+void lch2luv_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n);
+void lch2hsluv_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n);
+void hsluv2lch_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n);
+void lch2hpluv_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n);
+void hpluv2lch_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n);
+
+/**
+ * Batch conversions between HSLuv and HPLuv, through LCh rather than RGB:
+ * the lightness and hue stay as they are, but for grays, and only the
+ * saturation is rescaled from one gamut bound to the other. Buffers are as
+ * for the conversions between stages above.
+ */
+void hsluv2hpluv_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n);
+void hpluv2hsluv_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n);
+
+/**
+ * Select the instruction set the batch conversions run on.
+ *
+ * On x86 (when built with GCC or clang), the batch conversions are compiled
+ * for "avx512" (AVX-512 F, DQ and VL), "avx2" (AVX2 and FMA) and "baseline"
+ * (whatever the build targets, usually SSE2). On first use, they run on the
+ * best of these the CPU supports; this overrides that choice. Elsewhere,
+ * "baseline" is the only one. Not thread-safe: call it before converting.
+ *
+ * @param isa Name of the instruction set, or NULL for the best supported.
+ * @return 1 on success, 0 if the CPU or the build does not support isa.
+ */
+int hsluv_batch_set_isa(const char* isa);
+
+/**
+ * Get the name of the instruction set the batch conversions run on.
+ */
+const char* hsluv_batch_isa(void);
+
+/**
+ * Flags for hsluv_set_flags().
+ *
+ * HSLUV_CACHE_BOUNDS: Memoize the gamut bounds, which depend only on
+ * lightness, in a small per-thread cache keyed on the exact value of L.
+ * Results are bit-identical to the uncached computation; the cache pays off
+ * when many conversions share a few lightness values (gradients, palettes,
+ * flat image regions).
+ */
+#define HSLUV_CACHE_BOUNDS      0x0001
+
+/**
+ * HSLUV_SAFE_CHROMA_TABLE: Take the maximal safe chroma of HPLuv, which
+ * depends only on lightness, from a precomputed 4096-step table by linear
+ * interpolation instead of intersecting the six gamut bounds. This is an
+ * approximation: the chroma is off by a relative 0.000003 at most up to
+ * lightness 99.5 (0.0002 closer to white), and RGB from hpluv2rgb() by at
+ * most 0.000005. Without this flag, HSLUV_CACHE_BOUNDS memoizes the exact
+ * value for each distinct lightness. The batch conversions always compute
+ * the exact value, whatever the flags.
+ */
+#define HSLUV_SAFE_CHROMA_TABLE 0x0002
+
+/**
+ * Set the flags tuning the single-pixel conversions above, in double and
+ * single precision.
+ *
+ * The flags are global to the process. They default to zero, which means
+ * the reference computation with no caching. They have no effect on the
+ * batch conversions, the *_batch() and *_pixels() functions, whose kernels
+ * always compute the gamut bounds directly. This includes the gufuncs and
+ * batch functions of the Python module, which run on those kernels.
+ *
+ * @param flags Bitwise OR of HSLUV_* flags.
+ */
+void hsluv_set_flags(unsigned flags);
+
+/**
+ * Get the flags set with hsluv_set_flags().
+ */
+unsigned hsluv_get_flags(void);
+
 
 #ifdef __cplusplus
 }
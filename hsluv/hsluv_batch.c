@@ -0,0 +1,1125 @@
+/*
+ * HSLuv-C: Human-friendly HSL
+ * <http://github.com/hsluv/hsluv-c>
+ * <http://www.hsluv.org/>
+ *
+ * Copyright (c) 2015 Alexei Boronine (original idea, JavaScript implementation)
+ * Copyright (c) 2015 Roger Tallada (Obj-C implementation)
+ * Copyright (c) 2017 Martin Mitas (C implementation, based on Obj-C implementation)
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a
+ * copy of this software and associated documentation files (the "Software"),
+ * to deal in the Software without restriction, including without limitation
+ * the rights to use, copy, modify, merge, publish, distribute, sublicense,
+ * and/or sell copies of the Software, and to permit persons to whom the
+ * Software is furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+ * OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+ * FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+ * IN THE SOFTWARE.
+ */
+
+/* Batch conversions (see hsluv2rgb_batch() and friends).
+ *
+ * Pixels are converted in blocks: each block is deinterleaved into one array
+ * per channel (structure of arrays), converted lane by lane, and interleaved
+ * back. The per-lane code below has no branches, no calls into libm and no
+ * lookups: conditionals are selects, and pow(), cbrt(), atan2(), sin() and
+ * cos() are replaced by polynomial versions accurate to a few units in the
+ * last place. So the compiler vectorizes every block loop, converting two,
+ * four or eight pixels per instruction with SSE2, AVX2 or AVX-512, for
+ * whichever the CPU supports (see hsluv_batch_set_isa()).
+ *
+ * The gamut bounds are always computed directly, as the reference does when
+ * no flags are set: the caches and tables of hsluv_set_flags() do not apply.
+ */
+
+#include "hsluv.h"
+
+#include <float.h>
+#include <math.h>
+#include <stddef.h>
+#include <stdint.h>
+#include <string.h>
+
+
+/* Every per-lane helper must be inlined into the block loops for these to
+ * vectorize. */
+#if defined _MSC_VER
+    #define LANE static __forceinline
+#else
+    #define LANE static inline __attribute__((always_inline))
+#endif
+
+#define BLOCK_SIZE  64
+
+typedef struct Block_tag Block;
+struct Block_tag {
+    double a[BLOCK_SIZE];
+    double b[BLOCK_SIZE];
+    double c[BLOCK_SIZE];
+};
+
+/* Same constants as in hsluv.c */
+static const double m[3][3] = {
+    {  3.24096994190452134377, -1.53738317757009345794, -0.49861076029300328366 },
+    { -0.96924363628087982613,  1.87596750150772066772,  0.04155505740717561247 },
+    {  0.05563007969699360846, -0.20397695888897656435,  1.05697151424287856072 }
+};
+
+static const double m_inv[3][3] = {
+    {  0.41239079926595948129,  0.35758433938387796373,  0.18048078840183428751 },
+    {  0.21263900587151035754,  0.71516867876775592746,  0.07219231536073371500 },
+    {  0.01933081871559185069,  0.11919477979462598791,  0.95053215224966058086 }
+};
+
+static const double ref_u = 0.19783000664283680764;
+static const double ref_v = 0.46831999493879100370;
+
+static const double kappa = 903.29629629629629629630;
+static const double epsilon = 0.00885645167903563082;
+
+static const double ln2_hi = 6.93147180369123816490e-01;
+static const double ln2_lo = 1.90821492927058770002e-10;
+
+/* Adding this rounds a double below 2^51 in magnitude to an integer, which
+ * ends up in the low bits of the sum. */
+static const double round_magic = 6755399441055744.0;   /* 1.5 * 2^52 */
+
+
+LANE uint64_t
+bits_of(double x)
+{
+    uint64_t bits;
+
+    memcpy(&bits, &x, sizeof(bits));
+    return bits;
+}
+
+LANE double
+double_of(uint64_t bits)
+{
+    double x;
+
+    memcpy(&x, &bits, sizeof(x));
+    return x;
+}
+
+/* Natural logarithm of a positive normal x. With x = 2^k * z and z between
+ * sqrt(1/2) and sqrt(2), log(z) = 2 atanh(s) for s = (z - 1) / (z + 1), and
+ * |s| < 0.172 makes the atanh series converge fast. */
+LANE double
+lane_log(double x)
+{
+    /* Subtracting the mantissa bits of sqrt(2) borrows from the exponent
+     * field for any smaller mantissa, which leaves field - 1022 = k. */
+    uint64_t bits = bits_of(x);
+    uint64_t field = (bits - 0x0006a09e667f3bcdULL) >> 52;
+    uint64_t k = field - 1022;
+    double z = double_of(bits - (k << 52));
+    double kd = double_of(field | 0x4330000000000000ULL) - (4503599627370496.0 + 1022.0);
+    double s = (z - 1.0) / (z + 1.0);
+    double s2 = s * s;
+    double p;
+
+    p = 1.0 / 21.0;
+    p = p * s2 + 1.0 / 19.0;
+    p = p * s2 + 1.0 / 17.0;
+    p = p * s2 + 1.0 / 15.0;
+    p = p * s2 + 1.0 / 13.0;
+    p = p * s2 + 1.0 / 11.0;
+    p = p * s2 + 1.0 / 9.0;
+    p = p * s2 + 1.0 / 7.0;
+    p = p * s2 + 1.0 / 5.0;
+    p = p * s2 + 1.0 / 3.0;
+    return kd * ln2_hi + (2.0 * s + (2.0 * s * s2 * p + kd * ln2_lo));
+}
+
+/* e^x for x within +-708, from 2^n * e^r with |r| <= log(2) / 2. */
+LANE double
+lane_exp(double x)
+{
+    double t = x * 1.44269504088896338700 + round_magic;    /* (1 / log(2)) */
+    double n = t - round_magic;
+    double r = (x - n * ln2_hi) - n * ln2_lo;
+    uint64_t scale = (bits_of(t) - bits_of(round_magic) + 1023) << 52;
+    double p;
+
+    p = 1.0 / 6227020800.0;
+    p = p * r + 1.0 / 479001600.0;
+    p = p * r + 1.0 / 39916800.0;
+    p = p * r + 1.0 / 3628800.0;
+    p = p * r + 1.0 / 362880.0;
+    p = p * r + 1.0 / 40320.0;
+    p = p * r + 1.0 / 5040.0;
+    p = p * r + 1.0 / 720.0;
+    p = p * r + 1.0 / 120.0;
+    p = p * r + 1.0 / 24.0;
+    p = p * r + 1.0 / 6.0;
+    p = p * r + 0.5;
+    p = p * r + 1.0;
+    p = p * r + 1.0;
+    return p * double_of(scale);
+}
+
+/* x^y for a positive normal x, with |y log(x)| within 708 */
+LANE double
+lane_pow(double x, double y)
+{
+    return lane_exp(y * lane_log(x));
+}
+
+/* Angle of (x, y) in degrees, between 0.0 and 360.0. The arctangent of
+ * min(|x|, |y|) / max(|x|, |y|) is the rational approximation of Cephes. */
+LANE double
+lane_hue(double x, double y)
+{
+    double ax = x < 0.0 ? -x : x;
+    double ay = y < 0.0 ? -y : y;
+    double hi = ax > ay ? ax : ay;
+    double lo = ax > ay ? ay : ax;
+    double t = lo / (hi > 0.0 ? hi : 1.0);
+    int big = t > 0.66;
+    double shifted = (t - 1.0) / (t + 1.0);
+    double u = big ? shifted : t;
+    double z = u * u;
+    double p;
+    double q;
+    double a;
+
+    p = -8.750608600031904122785e-01;
+    p = p * z - 1.615753718733365076637e+01;
+    p = p * z - 7.500855792314704667340e+01;
+    p = p * z - 1.228866684490136173410e+02;
+    p = p * z - 6.485021904942025371773e+01;
+    q = z + 2.485846490142306297962e+01;
+    q = q * z + 1.650270098316988542046e+02;
+    q = q * z + 4.328810604912902668951e+02;
+    q = q * z + 4.853903996359136964868e+02;
+    q = q * z + 1.945506571482613964425e+02;
+    a = u + u * z * p / q;
+    a = big ? a + 0.78539816339744830962 : a;      /* (pi / 4) */
+    a = ay > ax ? 1.57079632679489661923 - a : a;  /* (pi / 2) */
+    a = x < 0.0 ? 3.14159265358979323846 - a : a;
+    a *= 57.29577951308232087680;                  /* (180 / pi) */
+    return y < 0.0 ? 360.0 - a : a;
+}
+
+/* Unit vector along a hue angle in degrees. The angle is reduced to within
+ * 45 degrees of a multiple of 90 (exactly, for any hue below 2^40 or so),
+ * where the Taylor series of sin() and cos() converge fast. */
+LANE void
+lane_hue_direction(double h, double* cos_h, double* sin_h)
+{
+    double quadrant = (h * (1.0 / 90.0) + round_magic) - round_magic;
+    /* The quadrant modulo 4, rounding to nearest without any ties */
+    double turns = (quadrant * 0.25 - 0.375 + round_magic) - round_magic;
+    double q = quadrant - 4.0 * turns;
+    double r = (h - quadrant * 90.0) * 0.01745329251994329577;  /* (pi / 180.0) */
+    double r2 = r * r;
+    double s;
+    double c;
+
+    s = -1.0 / 1307674368000.0;
+    s = s * r2 + 1.0 / 6227020800.0;
+    s = s * r2 - 1.0 / 39916800.0;
+    s = s * r2 + 1.0 / 362880.0;
+    s = s * r2 - 1.0 / 5040.0;
+    s = s * r2 + 1.0 / 120.0;
+    s = s * r2 - 1.0 / 6.0;
+    s = r + r * r2 * s;
+
+    c = 1.0 / 20922789888000.0;
+    c = c * r2 - 1.0 / 87178291200.0;
+    c = c * r2 + 1.0 / 479001600.0;
+    c = c * r2 - 1.0 / 3628800.0;
+    c = c * r2 + 1.0 / 40320.0;
+    c = c * r2 - 1.0 / 720.0;
+    c = c * r2 + 1.0 / 24.0;
+    c = c * r2 - 0.5;
+    c = 1.0 + r2 * c;
+
+    /* Rotate by q quarter turns. The selects compare doubles rather than
+     * integer bits: SSE2 has no 64-bit integer comparisons. */
+    *cos_h = (q == 1.0  ||  q == 3.0) ? -s : c;
+    *sin_h = (q == 1.0  ||  q == 3.0) ? c : s;
+    *cos_h = q >= 2.0 ? -*cos_h : *cos_h;
+    *sin_h = q >= 2.0 ? -*sin_h : *sin_h;
+}
+
+LANE double
+lane_from_linear(double c)
+{
+    double p = lane_pow(c > 0.0031308 ? c : 1.0, 1.0 / 2.4);
+
+    return c <= 0.0031308 ? 12.92 * c : 1.055 * p - 0.055;
+}
+
+LANE double
+lane_to_linear(double c)
+{
+    double shifted = (c + 0.055) * (1.0 / 1.055);
+    double p = lane_pow(c > 0.04045 ? shifted : 1.0, 2.4);
+    double linear = c * (1.0 / 12.92);
+
+    return c > 0.04045 ? p : linear;
+}
+
+LANE double
+lane_y2l(double y)
+{
+    double cbrt_y = lane_exp(lane_log(y > epsilon ? y : 1.0) * (1.0 / 3.0));
+
+    return y <= epsilon ? y * kappa : 116.0 * cbrt_y - 16.0;
+}
+
+LANE double
+lane_l2y(double l)
+{
+    double x = (l + 16.0) * (1.0 / 116.0);
+    double linear = l * (1.0 / kappa);
+
+    return l <= 8.0 ? linear : x * x * x;
+}
+
+LANE double
+lane_sub2(double l)
+{
+    double tl = l + 16.0;
+    double sub1 = (tl * tl * tl) * (1.0 / 1560896.0);
+    double linear = l * (1.0 / kappa);
+
+    return sub1 > epsilon ? sub1 : linear;
+}
+
+/* Bound number channel * 2 + t of get_bounds(), as the line
+ * bottom * y = top1 * x + top2, leaving out the divisions by bottom */
+LANE void
+lane_bound(double l, double sub2, int channel, int t,
+           double* top1, double* top2, double* bottom)
+{
+    double m1 = m[channel][0];
+    double m2 = m[channel][1];
+    double m3 = m[channel][2];
+
+    *top1 = (284517.0 * m1 - 94839.0 * m3) * sub2;
+    *top2 = (838422.0 * m3 + 769860.0 * m2 + 731718.0 * m1) * l * sub2 - 769860.0 * t * l;
+    *bottom = (632260.0 * m3 - 126452.0 * m2) * sub2 + 126452.0 * t;
+}
+
+/* The lesser of min_len and the length of the ray along (cos_h, sin_h) until
+ * it crosses the given bound, if it does */
+LANE double
+lane_min_ray_length(double l, double sub2, int channel, int t,
+                    double cos_h, double sin_h, double min_len)
+{
+    double top1, top2, bottom, len;
+
+    lane_bound(l, sub2, channel, t, &top1, &top2, &bottom);
+    len = top2 / (bottom * sin_h - top1 * cos_h);
+    return (len >= 0.0  &&  len < min_len) ? len : min_len;
+}
+
+/* The lesser of min_sq and the squared distance from the pole to the given
+ * bound */
+LANE double
+lane_min_distance_sq(double l, double sub2, int channel, int t, double min_sq)
+{
+    double top1, top2, bottom, sq;
+
+    lane_bound(l, sub2, channel, t, &top1, &top2, &bottom);
+    sq = (top2 * top2) / (top1 * top1 + bottom * bottom);
+    return sq < min_sq ? sq : min_sq;
+}
+
+/* max_chroma_for_lh(). The bounds are spelled out rather than looped over,
+ * as compilers do not always unroll such loops before vectorizing. */
+LANE double
+lane_max_chroma(double l, double cos_h, double sin_h)
+{
+    double sub2 = lane_sub2(l);
+    double min_len = DBL_MAX;
+
+    min_len = lane_min_ray_length(l, sub2, 0, 0, cos_h, sin_h, min_len);
+    min_len = lane_min_ray_length(l, sub2, 0, 1, cos_h, sin_h, min_len);
+    min_len = lane_min_ray_length(l, sub2, 1, 0, cos_h, sin_h, min_len);
+    min_len = lane_min_ray_length(l, sub2, 1, 1, cos_h, sin_h, min_len);
+    min_len = lane_min_ray_length(l, sub2, 2, 0, cos_h, sin_h, min_len);
+    min_len = lane_min_ray_length(l, sub2, 2, 1, cos_h, sin_h, min_len);
+    return min_len;
+}
+
+/* max_safe_chroma_for_l() */
+LANE double
+lane_max_safe_chroma(double l)
+{
+    double sub2 = lane_sub2(l);
+    double min_sq = DBL_MAX;
+    double min_len;
+
+    min_sq = lane_min_distance_sq(l, sub2, 0, 0, min_sq);
+    min_sq = lane_min_distance_sq(l, sub2, 0, 1, min_sq);
+    min_sq = lane_min_distance_sq(l, sub2, 1, 0, min_sq);
+    min_sq = lane_min_distance_sq(l, sub2, 1, 1, min_sq);
+    min_sq = lane_min_distance_sq(l, sub2, 2, 0, min_sq);
+    min_sq = lane_min_distance_sq(l, sub2, 2, 1, min_sq);
+    min_len = sqrt(min_sq);
+    return min_sq < DBL_MAX ? min_len : DBL_MAX;
+}
+
+/* luv2xyz() */
+LANE void
+lane_luv2xyz(double l, double u, double v, double* px, double* py, double* pz)
+{
+    int black = l <= 0.00000001;
+    double inv_l = 1.0 / (13.0 * (black ? 1.0 : l));
+    double var_u = u * inv_l + ref_u;
+    double var_v = v * inv_l + ref_v;
+    double inv_v = 1.0 / var_v;
+    double y = lane_l2y(l);
+    /* -(9 y var_u) / ((var_u - 4) var_v - var_u var_v), simplified */
+    double x = 2.25 * y * var_u * inv_v;
+    double z = (9.0 * y - (15.0 * var_v * y) - (var_v * x)) * inv_v * (1.0 / 3.0);
+
+    *px = black ? 0.0 : x;
+    *py = black ? 0.0 : y;
+    *pz = black ? 0.0 : z;
+}
+
+/* xyz2rgb() */
+LANE void
+lane_xyz2rgb(double x, double y, double z, double* pr, double* pg, double* pb)
+{
+    *pr = lane_from_linear(m[0][0] * x + m[0][1] * y + m[0][2] * z);
+    *pg = lane_from_linear(m[1][0] * x + m[1][1] * y + m[1][2] * z);
+    *pb = lane_from_linear(m[2][0] * x + m[2][1] * y + m[2][2] * z);
+}
+
+/* lch2luv(), luv2xyz() and xyz2rgb(), for the hue direction (cos_h, sin_h) */
+LANE void
+lane_lch2rgb(double l, double c, double cos_h, double sin_h,
+             double* pr, double* pg, double* pb)
+{
+    double x, y, z;
+
+    lane_luv2xyz(l, cos_h * c, sin_h * c, &x, &y, &z);
+    lane_xyz2rgb(x, y, z, pr, pg, pb);
+}
+
+/* rgb2xyz() */
+LANE void
+lane_rgb2xyz(double r, double g, double b, double* px, double* py, double* pz)
+{
+    double rl = lane_to_linear(r);
+    double gl = lane_to_linear(g);
+    double bl = lane_to_linear(b);
+
+    *px = m_inv[0][0] * rl + m_inv[0][1] * gl + m_inv[0][2] * bl;
+    *py = m_inv[1][0] * rl + m_inv[1][1] * gl + m_inv[1][2] * bl;
+    *pz = m_inv[2][0] * rl + m_inv[2][1] * gl + m_inv[2][2] * bl;
+}
+
+/* xyz2luv() */
+LANE void
+lane_xyz2luv(double x, double y, double z, double* pl, double* pu, double* pv)
+{
+    double denominator = x + (15.0 * y) + (3.0 * z);
+    double inv_d = 1.0 / (denominator != 0.0 ? denominator : 1.0);
+    double l = lane_y2l(y);
+    int black = l < 0.00000001;
+
+    *pl = l;
+    *pu = black ? 0.0 : 13.0 * l * ((4.0 * x) * inv_d - ref_u);
+    *pv = black ? 0.0 : 13.0 * l * ((9.0 * y) * inv_d - ref_v);
+}
+
+/* rgb2xyz(), xyz2luv() */
+LANE void
+lane_rgb2luv(double r, double g, double b, double* pl, double* pu, double* pv)
+{
+    double x, y, z;
+
+    lane_rgb2xyz(r, g, b, &x, &y, &z);
+    lane_xyz2luv(x, y, z, pl, pu, pv);
+}
+
+typedef void (*BlockFn)(Block* blk, int n);
+
+typedef struct Kernels_tag Kernels;
+struct Kernels_tag {
+    const char* isa;
+    BlockFn hsluv2rgb;
+    BlockFn rgb2hsluv;
+    BlockFn hpluv2rgb;
+    BlockFn rgb2hpluv;
+    BlockFn rgb2hl;             /* hue and lightness only */
+    BlockFn rgb2hsluv_sl;       /* saturation and lightness only */
+    BlockFn rgb2hpluv_sl;
+    BlockFn rgb2l;
+    BlockFn linear2l;
+    BlockFn rgb2xyz;            /* the stages, one by one */
+    BlockFn xyz2rgb;
+    BlockFn xyz2luv;
+    BlockFn luv2xyz;
+    BlockFn luv2lch;
+    BlockFn lch2luv;
+    BlockFn lch2hsluv;
+    BlockFn hsluv2lch;
+    BlockFn lch2hpluv;
+    BlockFn hpluv2lch;
+    BlockFn hsluv2hpluv;
+    BlockFn hpluv2hsluv;
+};
+
+#define KERNEL(name)    name##_baseline
+#define KERNEL_ISA      "baseline"
+#include "hsluv_batch_kernels.h"
+#undef KERNEL
+#undef KERNEL_ISA
+
+/* With GCC or clang on x86, the kernels are compiled for AVX2 and AVX-512 as
+ * well, whatever the target of the build, and the best one the CPU supports
+ * is picked at runtime. The lane helpers above get inlined into each. */
+#if (defined __x86_64__ || defined __i386__)  &&  (defined __GNUC__ || defined __clang__)
+    #define DISPATCH            1
+    #define PRAGMA(text)        _Pragma(#text)
+    #if defined __clang__
+        #define BEGIN_TARGET(isa)   PRAGMA(clang attribute push(__attribute__((target(isa))), apply_to = function))
+        #define END_TARGET()        PRAGMA(clang attribute pop)
+    #else
+        #define BEGIN_TARGET(isa)   PRAGMA(GCC push_options) PRAGMA(GCC target(isa))
+        #define END_TARGET()        PRAGMA(GCC pop_options)
+    #endif
+
+    BEGIN_TARGET("avx2,fma")
+    #define KERNEL(name)    name##_avx2
+    #define KERNEL_ISA      "avx2"
+    #include "hsluv_batch_kernels.h"
+    #undef KERNEL
+    #undef KERNEL_ISA
+    END_TARGET()
+
+    BEGIN_TARGET("avx512f,avx512dq,avx512vl,avx2,fma")
+    #define KERNEL(name)    name##_avx512
+    #define KERNEL_ISA      "avx512"
+    #include "hsluv_batch_kernels.h"
+    #undef KERNEL
+    #undef KERNEL_ISA
+    END_TARGET()
+#else
+    #define DISPATCH            0
+#endif
+
+/* Best first */
+static const Kernels* const all_kernels[] = {
+#if DISPATCH
+    &kernels_avx512,
+    &kernels_avx2,
+#endif
+    &kernels_baseline
+};
+
+/* See hsluv_batch_set_isa() */
+static const Kernels* kernels = NULL;
+
+static int
+cpu_supports(const Kernels* candidate)
+{
+#if DISPATCH
+    __builtin_cpu_init();
+    if(candidate == &kernels_avx512)
+        return __builtin_cpu_supports("avx512f")  &&  __builtin_cpu_supports("avx512dq")  &&
+               __builtin_cpu_supports("avx512vl")  &&  __builtin_cpu_supports("avx2")  &&
+               __builtin_cpu_supports("fma");
+    if(candidate == &kernels_avx2)
+        return __builtin_cpu_supports("avx2")  &&  __builtin_cpu_supports("fma");
+#endif
+    return candidate == &kernels_baseline;
+}
+
+static const Kernels*
+current_kernels(void)
+{
+    if(kernels == NULL)
+        hsluv_batch_set_isa(NULL);
+    return kernels;
+}
+
+/* Where the pixels of each layout keep their three color components and their
+ * alpha, in elements from the start of the pixel. Indexed by HSLUV_RGB etc. */
+typedef struct Layout_tag Layout;
+struct Layout_tag {
+    int channels;
+    int color[3];
+    int alpha;          /* -1 if there is none */
+};
+
+static const Layout layouts[] = {
+    { 3, { 0, 1, 2 }, -1 },
+    { 3, { 2, 1, 0 }, -1 },
+    { 4, { 0, 1, 2 },  3 },
+    { 4, { 2, 1, 0 },  3 },
+    { 4, { 1, 2, 3 },  0 },
+    { 4, { 3, 2, 1 },  0 }
+};
+
+#define LAYOUT_MASK     0xff
+
+/* Round x to the nearest integer in [0, max]: NaN goes to 0. */
+static inline double
+to_integer(double x, double max)
+{
+    x += 0.5;
+    x = x > 0.0 ? x : 0.0;
+    x = x < max ? x : max;
+    return x;
+}
+
+/* Read count elements of type T, stride bytes apart from src on, into dst,
+ * dividing them by full. Unit strides (planar buffers) get a loop of their
+ * own, which compilers vectorize. */
+#define LOAD(T, full)                                                       \
+    do {                                                                    \
+        if(stride == (ptrdiff_t) sizeof(T)) {                               \
+            const T* in = (const T*) src;                                   \
+            for(i = 0; i < count; i++)                                      \
+                dst[i] = in[i] / (full);                                    \
+        } else {                                                            \
+            for(i = 0; i < count; i++)                                      \
+                dst[i] = *(const T*) (src + i * stride) / (full);           \
+        }                                                                   \
+    } while(0)
+
+/* Write count values of src into elements of type T, stride bytes apart from
+ * dst on, passing them through CAST. */
+#define STORE(T, CAST)                                                      \
+    do {                                                                    \
+        if(stride == (ptrdiff_t) sizeof(T)) {                               \
+            T* out = (T*) dst;                                              \
+            for(i = 0; i < count; i++)                                      \
+                out[i] = (T) CAST(src[i]);                                  \
+        } else {                                                            \
+            for(i = 0; i < count; i++)                                      \
+                *(T*) (dst + i * stride) = (T) CAST(src[i]);                \
+        }                                                                   \
+    } while(0)
+
+#define AS_IS(x)        (x)
+#define AS_UINT8(x)     to_integer((x) * full, 255.0)
+#define AS_UINT16(x)    to_integer((x) * full, 65535.0)
+
+/* to_linear() of each 8-bit component, i / 255.0, as computed by hsluv.c */
+static const double linear_of_uint8[256] = {
+    0.00000000000000000e+00, 3.03526983548837515e-04, 6.07053967097675030e-04, 9.10580950646512491e-04,
+    1.21410793419535006e-03, 1.51763491774418741e-03, 1.82116190129302498e-03, 2.12468888484186255e-03,
+    2.42821586839070012e-03, 2.73174285193953726e-03, 3.03526983548837483e-03, 3.34653576389916082e-03,
+    3.67650732404743589e-03, 4.02471701849630662e-03, 4.39144203741029335e-03, 4.77695348069372919e-03,
+    5.18151670233838596e-03, 5.60539162420272286e-03, 6.04883302285705391e-03, 6.51209079259447519e-03,
+    6.99541018726538687e-03, 7.49903204322617534e-03, 8.02319298538499426e-03, 8.56812561806930689e-03,
+    9.13405870222078718e-03, 9.72121732023784914e-03, 1.03298230296269365e-02, 1.09600940064882458e-02,
+    1.16122451797438849e-02, 1.22864883569158718e-02, 1.29830323421730124e-02, 1.37020830472896864e-02,
+    1.44438435960925447e-02, 1.52085144229127094e-02, 1.59962933655096312e-02, 1.68073757528873838e-02,
+    1.76419544883840776e-02, 1.85002201283796970e-02, 1.93823609569357229e-02, 2.02885630566524006e-02,
+    2.12190103760035546e-02, 2.21738847933873814e-02, 2.31533661781104100e-02, 2.41576324485047560e-02,
+    2.51868596273616303e-02, 2.62412218948498976e-02, 2.73208916390748936e-02, 2.84260395044207935e-02,
+    2.95568344378088002e-02, 3.07134437329936345e-02, 3.18960330730115316e-02, 3.31047665708850553e-02,
+    3.43398068086821703e-02, 3.56013148750203429e-02, 3.68894504011000393e-02, 3.82043715953465021e-02,
+    3.95462352767328371e-02, 4.09151969068531907e-02, 4.23114106208096752e-02, 4.37350292569734650e-02,
+    4.51862043856755408e-02, 4.66650863368800947e-02, 4.81718242268894190e-02, 4.97065659841272323e-02,
+    5.12694583740432377e-02, 5.28606470231802461e-02, 5.44802764424423686e-02, 5.61284900496000910e-02,
+    5.78054301910672294e-02, 5.95112381629811990e-02, 6.12460542316176082e-02, 6.30100176531676742e-02,
+    6.48032666929057727e-02, 6.66259386437728918e-02, 6.84781698444001663e-02, 7.03600956965958757e-02,
+    7.22718506823174789e-02, 7.42135683801496276e-02, 7.61853814813078511e-02, 7.81874218051863273e-02,
+    8.02198203144683236e-02, 8.22827071298147944e-02, 8.43762115441488159e-02, 8.65004620365497634e-02,
+    8.86555862857729415e-02, 9.08417111834076835e-02, 9.30589628466874513e-02, 9.53074666309647045e-02,
+    9.75873471418624572e-02, 9.98987282471138910e-02, 1.02241733088101319e-01, 1.04616484091104189e-01,
+    1.07023102978267615e-01, 1.09461710778299331e-01, 1.11932427836905601e-01, 1.14435373826973733e-01,
+    1.16970667758510838e-01, 1.19538427988345616e-01, 1.22138772229601872e-01, 1.24771817560950488e-01,
+    1.27437680435647432e-01, 1.30136476690364294e-01, 1.32868321553817975e-01, 1.35633329655205664e-01,
+    1.38431615032451827e-01, 1.41263291140271641e-01, 1.44128470858057772e-01, 1.47027266497594983e-01,
+    1.49959789810608562e-01, 1.52926151996150173e-01, 1.55926463707827395e-01, 1.58960835060880407e-01,
+    1.62029375639110990e-01, 1.65132194501667606e-01, 1.68269400189690749e-01, 1.71441100732822593e-01,
+    1.74647403655585037e-01, 1.77888415983629117e-01, 1.81164244249860218e-01, 1.84474994500440997e-01,
+    1.87820772300677868e-01, 1.91201682740791384e-01, 1.94617830441575795e-01, 1.98069319559948859e-01,
+    2.01556253794397067e-01, 2.05078736390316929e-01, 2.08636870145255754e-01, 2.12230757414055227e-01,
+    2.15860500113899262e-01, 2.19526199729269206e-01, 2.23227957316808501e-01, 2.26965873510098365e-01,
+    2.30740048524349151e-01, 2.34550582161005217e-01, 2.38397573812271002e-01, 2.42281122465554860e-01,
+    2.46201326707835483e-01, 2.50158284729953440e-01, 2.54152094330826750e-01, 2.58182852921595818e-01,
+    2.62250657529696229e-01, 2.66355604802862467e-01, 2.70497791013065814e-01, 2.74677312060384649e-01,
+    2.78894263476810400e-01, 2.83148740429992107e-01, 2.87440837726917475e-01, 2.91770649817535865e-01,
+    2.96138270798321113e-01, 3.00543794415776500e-01, 3.04987314069886273e-01, 3.09468922817508540e-01,
+    3.13988713375717543e-01, 3.18546778125091856e-01, 3.23143209112950747e-01, 3.27778098056542178e-01,
+    3.32451536346179355e-01, 3.37163615048330367e-01, 3.41914424908660919e-01, 3.46704056355029600e-01,
+    3.51532599500439358e-01, 3.56400144145943509e-01, 3.61306779783509502e-01, 3.66252595598839492e-01,
+    3.71237680474149123e-01, 3.76262122990906500e-01, 3.81326011432530143e-01, 3.86429433787049026e-01,
+    3.91572477749723258e-01, 3.96755230725626851e-01, 4.01977779832195792e-01, 4.07240211901736704e-01,
+    4.12542613483903753e-01, 4.17885070848137474e-01, 4.23267669986071682e-01, 4.28690496613906624e-01,
+    4.34153636174748947e-01, 4.39657173840918791e-01, 4.45201194516227861e-01, 4.50785782838223459e-01,
+    4.56411023180404662e-01, 4.62076999654407072e-01, 4.67783796112158978e-01, 4.73531496148009545e-01,
+    4.79320183100826802e-01, 4.85149940056070372e-01, 4.91020849847835616e-01, 4.96932995060870408e-01,
+    5.02886458032568706e-01, 5.08881320854933761e-01, 5.14917665376521394e-01, 5.20995573204354301e-01,
+    5.27115125705813092e-01, 5.33276404010505245e-01, 5.39479489012107183e-01, 5.45724461370186598e-01,
+    5.52011401512000122e-01, 5.58340389634267908e-01, 5.64711505704929229e-01, 5.71124829464873085e-01,
+    5.77580440429650621e-01, 5.84078417891164103e-01, 5.90618840919336918e-01, 5.97201788363763364e-01,
+    6.03827338855337792e-01, 6.10495570807864762e-01, 6.17206562419651106e-01, 6.23960391675076109e-01,
+    6.30757136346146829e-01, 6.37596873994032642e-01, 6.44479681970582141e-01, 6.51405637419824157e-01,
+    6.58374817279448465e-01, 6.65387298282272055e-01, 6.72443156957687527e-01, 6.79542469633093837e-01,
+    6.86685312435313500e-01, 6.93871761291989908e-01, 7.01101891932973120e-01, 7.08375779891686763e-01,
+    7.15693500506480729e-01, 7.23055128921969326e-01, 7.30460740090353666e-01, 7.37910408772730841e-01,
+    7.45404209540387441e-01, 7.52942216776077866e-01, 7.60524504675292423e-01, 7.68151147247506993e-01,
+    7.75822218317423595e-01, 7.83537791526193517e-01, 7.91297940332630234e-01, 7.99102738014409009e-01,
+    8.06952257669251605e-01, 8.14846572216101239e-01, 8.22785754396283542e-01, 8.30769876774654636e-01,
+    8.38799011740740008e-01, 8.46873231509858049e-01, 8.54992608124233833e-01, 8.63157213454102346e-01,
+    8.71367119198797169e-01, 8.79622396887831726e-01, 8.87923117881966317e-01, 8.96269353374266387e-01,
+    9.04661174391149570e-01, 9.13098651793419203e-01, 9.21581856277294609e-01, 9.30110858375423732e-01,
+    9.38685728457888002e-01, 9.47306536733199867e-01, 9.55973353249286117e-01, 9.64686247894465110e-01,
+    9.73445290398412544e-01, 9.82250550333117145e-01, 9.91102097113829794e-01, 1.00000000000000000e+00
+};
+
+/* How load_channel() takes integers: as they are, as fractions of the full
+ * range, or (8-bit only) as sRGB components made linear */
+#define RAW             0
+#define SCALED          1
+#define LINEAR          2
+
+/* Read the components of a buffer starting at src into dst. */
+static void
+load_channel(double* dst, int type, const char* src, ptrdiff_t stride, int count, int mode)
+{
+    int i;
+
+    if(type == HSLUV_UINT8  &&  mode == LINEAR) {
+        for(i = 0; i < count; i++)
+            dst[i] = linear_of_uint8[*(const uint8_t*) (src + i * stride)];
+        return;
+    }
+
+    switch(type) {
+        case HSLUV_FLOAT32:     LOAD(float, 1.0); break;
+        case HSLUV_UINT8:       LOAD(uint8_t, mode != RAW ? 255.0 : 1.0); break;
+        case HSLUV_UINT16:      LOAD(uint16_t, mode != RAW ? 65535.0 : 1.0); break;
+        default:                LOAD(double, 1.0); break;
+    }
+}
+
+/* Write src into the components of a buffer starting at dst. Integers are
+ * scaled from [0, 1] if scaled is set, and always rounded and clamped. */
+static void
+store_channel(int type, char* dst, ptrdiff_t stride, const double* src, int count, int scaled)
+{
+    double full = 1.0;
+    int i;
+
+    switch(type) {
+        case HSLUV_FLOAT32:
+            STORE(float, AS_IS);
+            break;
+
+        case HSLUV_UINT8:
+            if(scaled)
+                full = 255.0;
+            STORE(uint8_t, AS_UINT8);
+            break;
+
+        case HSLUV_UINT16:
+            if(scaled)
+                full = 65535.0;
+            STORE(uint16_t, AS_UINT16);
+            break;
+
+        default:
+            STORE(double, AS_IS);
+            break;
+    }
+}
+
+#undef LOAD
+#undef STORE
+#undef AS_IS
+#undef AS_UINT8
+#undef AS_UINT16
+
+/* Fully transparent pixels have no color left: they come out black. */
+static void
+unpremultiply(Block* blk, const double* alpha, int count)
+{
+    int i;
+
+    for(i = 0; i < count; i++) {
+        double inv = 1.0 / alpha[i];
+        double scale = alpha[i] > 0.0 ? inv : 0.0;
+
+        blk->a[i] *= scale;
+        blk->b[i] *= scale;
+        blk->c[i] *= scale;
+    }
+}
+
+static void
+premultiply(Block* blk, const double* alpha, int count)
+{
+    int i;
+
+    for(i = 0; i < count; i++) {
+        blk->a[i] *= alpha[i];
+        blk->b[i] *= alpha[i];
+        blk->c[i] *= alpha[i];
+    }
+}
+
+static size_t
+type_size(int type)
+{
+    switch(type) {
+        case HSLUV_FLOAT32:     return sizeof(float);
+        case HSLUV_UINT8:       return sizeof(uint8_t);
+        case HSLUV_UINT16:      return sizeof(uint16_t);
+        default:                return sizeof(double);
+    }
+}
+
+/* Where the components of a buffer are: the byte offsets of its three color
+ * components and its alpha (if any) within each pixel, and the bytes from one
+ * pixel to the next. Components left out of a selection have none. */
+typedef struct Access_tag Access;
+struct Access_tag {
+    ptrdiff_t color[3];
+    ptrdiff_t alpha;
+    ptrdiff_t pixel_stride;
+    int has_color[3];
+    int has_alpha;
+};
+
+/* Bits of the components of a block: a (h or r), b (s or g) and c (l or b),
+ * in the order of HSLUV_SELECT_H, HSLUV_SELECT_S and HSLUV_SELECT_L */
+#define CHANNEL_A       0x1
+#define CHANNEL_B       0x2
+#define CHANNEL_C       0x4
+#define ALL_CHANNELS    (CHANNEL_A | CHANNEL_B | CHANNEL_C)
+#define SELECT_SHIFT    9
+
+/* Buffers holding a selection of the components hold the selected ones in
+ * the order of the block, with no alpha, whatever their layout. A selection
+ * of 0 stands for all the components of the layout. */
+static void
+resolve_access(Access* access, const hsluv_pixels* px, unsigned select)
+{
+    const Layout* layout = &layouts[px->layout & LAYOUT_MASK];
+    ptrdiff_t channel_stride = px->channel_stride;
+    int channels = 0;
+    int k;
+
+    if(channel_stride == 0)
+        channel_stride = (ptrdiff_t) type_size(px->type);
+    if(select == 0) {
+        for(k = 0; k < 3; k++) {
+            access->color[k] = layout->color[k] * channel_stride;
+            access->has_color[k] = 1;
+        }
+        access->alpha = layout->alpha * channel_stride;
+        access->has_alpha = (layout->alpha >= 0);
+        channels = layout->channels;
+    } else {
+        for(k = 0; k < 3; k++) {
+            access->has_color[k] = (select >> k) & 1;
+            access->color[k] = channels * channel_stride;
+            channels += access->has_color[k];
+        }
+        access->alpha = 0;
+        access->has_alpha = 0;
+    }
+    access->pixel_stride = px->pixel_stride;
+    if(access->pixel_stride == 0)
+        access->pixel_stride = channels * channel_stride;
+}
+
+/* Flags of convert_pixels() */
+#define FROM_RGB        0x1     /* the input is RGB */
+#define TO_RGB          0x2     /* the output is RGB */
+#define LINEAR_INPUT    0x4     /* the kernel takes linear RGB */
+
+/* The element types and layouts are converted while gathering and scattering
+ * each block, so no pixels need a full-size copy. Alpha is always read and
+ * written as a fraction of the full range, like integer RGB. The output holds
+ * the components in select (see resolve_access()).
+ *
+ * Kernels taking linear RGB (LINEAR_INPUT) get 8-bit input linearized by
+ * linear_of_uint8; any other input goes through convert_any instead, which
+ * takes sRGB. */
+static void
+convert_pixels(BlockFn convert, BlockFn convert_any, unsigned flags, unsigned select,
+               const hsluv_pixels* in, const hsluv_pixels* out, size_t n)
+{
+    int from_rgb = (flags & FROM_RGB) != 0;
+    int to_rgb = (flags & TO_RGB) != 0;
+    int in_premultiplied = from_rgb  &&  (in->layout & HSLUV_PREMULTIPLIED);
+    int out_premultiplied = to_rgb  &&  (out->layout & HSLUV_PREMULTIPLIED);
+    int in_mode = from_rgb ? SCALED : RAW;
+    Access src;
+    Access dst;
+    Block blk;
+    double* color[3] = { blk.a, blk.b, blk.c };
+    double alpha[BLOCK_SIZE];
+    size_t start;
+
+    resolve_access(&src, in, 0);
+    resolve_access(&dst, out, select);
+    in_premultiplied = in_premultiplied  &&  src.has_alpha;
+    out_premultiplied = out_premultiplied  &&  dst.has_alpha;
+
+    /* Premultiplication applies to the sRGB components, not the linear ones. */
+    if(flags & LINEAR_INPUT) {
+        if(in->type == HSLUV_UINT8  &&  !in_premultiplied)
+            in_mode = LINEAR;
+        else
+            convert = convert_any;
+    }
+
+    for(start = 0; start < n; start += BLOCK_SIZE) {
+        int count = n - start < BLOCK_SIZE ? (int) (n - start) : BLOCK_SIZE;
+        const char* in_pixel = (const char*) in->data + (ptrdiff_t) start * src.pixel_stride;
+        char* out_pixel = (char*) out->data + (ptrdiff_t) start * dst.pixel_stride;
+        int k;
+
+        for(k = 0; k < 3; k++)
+            load_channel(color[k], in->type, in_pixel + src.color[k], src.pixel_stride, count, in_mode);
+        if(src.has_alpha) {
+            load_channel(alpha, in->type, in_pixel + src.alpha, src.pixel_stride, count, SCALED);
+        } else {
+            for(k = 0; k < count; k++)
+                alpha[k] = 1.0;
+        }
+
+        if(in_premultiplied)
+            unpremultiply(&blk, alpha, count);
+        convert(&blk, count);
+        if(out_premultiplied)
+            premultiply(&blk, alpha, count);
+
+        for(k = 0; k < 3; k++) {
+            if(dst.has_color[k])
+                store_channel(out->type, out_pixel + dst.color[k], dst.pixel_stride, color[k], count, to_rgb);
+        }
+        if(dst.has_alpha)
+            store_channel(out->type, out_pixel + dst.alpha, dst.pixel_stride, alpha, count, 1);
+    }
+}
+
+static void
+convert_array(BlockFn convert, int from_rgb, int type, const void* in, void* out, size_t n)
+{
+    hsluv_pixels src;
+    hsluv_pixels dst;
+
+    src.data = (void*) in;
+    src.type = type;
+    src.layout = HSLUV_RGB;
+    src.pixel_stride = 0;
+    src.channel_stride = 0;
+    dst.data = out;
+    dst.type = type;
+    dst.layout = HSLUV_RGB;
+    dst.pixel_stride = 0;
+    dst.channel_stride = 0;
+    convert_pixels(convert, NULL, from_rgb ? FROM_RGB : TO_RGB, 0, &src, &dst, n);
+}
+
+/* RGB to HSLuv, or to HPLuv if hpluv is set, with the kernel that computes
+ * no more than the components out selects */
+static void
+convert_from_rgb(int hpluv, const hsluv_pixels* in, const hsluv_pixels* out, size_t n)
+{
+    const Kernels* kern = current_kernels();
+    unsigned select = ((unsigned) out->layout >> SELECT_SHIFT) & ALL_CHANNELS;
+
+    if(select == CHANNEL_C)
+        convert_pixels(kern->linear2l, kern->rgb2l, FROM_RGB | LINEAR_INPUT, select, in, out, n);
+    else if(select != 0  &&  !(select & CHANNEL_B))
+        convert_pixels(kern->rgb2hl, NULL, FROM_RGB, select, in, out, n);
+    else if(select != 0  &&  !(select & CHANNEL_A))
+        convert_pixels(hpluv ? kern->rgb2hpluv_sl : kern->rgb2hsluv_sl, NULL, FROM_RGB, select, in, out, n);
+    else
+        convert_pixels(hpluv ? kern->rgb2hpluv : kern->rgb2hsluv, NULL, FROM_RGB, select, in, out, n);
+}
+
+
+void
+hsluv2rgb_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n)
+{
+    convert_pixels(current_kernels()->hsluv2rgb, NULL, TO_RGB, 0, in, out, n);
+}
+
+void
+rgb2hsluv_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n)
+{
+    convert_from_rgb(0, in, out, n);
+}
+
+void
+hpluv2rgb_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n)
+{
+    convert_pixels(current_kernels()->hpluv2rgb, NULL, TO_RGB, 0, in, out, n);
+}
+
+void
+rgb2hpluv_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n)
+{
+    convert_from_rgb(1, in, out, n);
+}
+
+void
+rgb2lightness_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n)
+{
+    const Kernels* kern = current_kernels();
+
+    convert_pixels(kern->linear2l, kern->rgb2l, FROM_RGB | LINEAR_INPUT, CHANNEL_C, in, out, n);
+}
+
+void
+rgb2xyz_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n)
+{
+    convert_pixels(current_kernels()->rgb2xyz, NULL, FROM_RGB, 0, in, out, n);
+}
+
+void
+xyz2rgb_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n)
+{
+    convert_pixels(current_kernels()->xyz2rgb, NULL, TO_RGB, 0, in, out, n);
+}
+
+void
+xyz2luv_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n)
+{
+    convert_pixels(current_kernels()->xyz2luv, NULL, 0, 0, in, out, n);
+}
+
+void
+luv2xyz_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n)
+{
+    convert_pixels(current_kernels()->luv2xyz, NULL, 0, 0, in, out, n);
+}
+
+void
+luv2lch_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n)
+{
+    convert_pixels(current_kernels()->luv2lch, NULL, 0, 0, in, out, n);
+}
+
+void
+lch2luv_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n)
+{
+    convert_pixels(current_kernels()->lch2luv, NULL, 0, 0, in, out, n);
+}
+
+void
+lch2hsluv_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n)
+{
+    convert_pixels(current_kernels()->lch2hsluv, NULL, 0, 0, in, out, n);
+}
+
+void
+hsluv2lch_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n)
+{
+    convert_pixels(current_kernels()->hsluv2lch, NULL, 0, 0, in, out, n);
+}
+
+void
+lch2hpluv_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n)
+{
+    convert_pixels(current_kernels()->lch2hpluv, NULL, 0, 0, in, out, n);
+}
+
+void
+hpluv2lch_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n)
+{
+    convert_pixels(current_kernels()->hpluv2lch, NULL, 0, 0, in, out, n);
+}
+
+void
+hsluv2hpluv_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n)
+{
+    convert_pixels(current_kernels()->hsluv2hpluv, NULL, 0, 0, in, out, n);
+}
+
+void
+hpluv2hsluv_pixels(const hsluv_pixels* in, const hsluv_pixels* out, size_t n)
+{
+    convert_pixels(current_kernels()->hpluv2hsluv, NULL, 0, 0, in, out, n);
+}
+
+void
+hsluv2rgb_batch(const double* in, double* out, size_t n)
+{
+    convert_array(current_kernels()->hsluv2rgb, 0, HSLUV_FLOAT64, in, out, n);
+}
+
+void
+rgb2hsluv_batch(const double* in, double* out, size_t n)
+{
+    convert_array(current_kernels()->rgb2hsluv, 1, HSLUV_FLOAT64, in, out, n);
+}
+
+void
+hpluv2rgb_batch(const double* in, double* out, size_t n)
+{
+    convert_array(current_kernels()->hpluv2rgb, 0, HSLUV_FLOAT64, in, out, n);
+}
+
+void
+rgb2hpluv_batch(const double* in, double* out, size_t n)
+{
+    convert_array(current_kernels()->rgb2hpluv, 1, HSLUV_FLOAT64, in, out, n);
+}
+
+void
+hsluv2rgbf_batch(const float* in, float* out, size_t n)
+{
+    convert_array(current_kernels()->hsluv2rgb, 0, HSLUV_FLOAT32, in, out, n);
+}
+
+void
+rgb2hsluvf_batch(const float* in, float* out, size_t n)
+{
+    convert_array(current_kernels()->rgb2hsluv, 1, HSLUV_FLOAT32, in, out, n);
+}
+
+void
+hpluv2rgbf_batch(const float* in, float* out, size_t n)
+{
+    convert_array(current_kernels()->hpluv2rgb, 0, HSLUV_FLOAT32, in, out, n);
+}
+
+void
+rgb2hpluvf_batch(const float* in, float* out, size_t n)
+{
+    convert_array(current_kernels()->rgb2hpluv, 1, HSLUV_FLOAT32, in, out, n);
+}
+
+int
+hsluv_batch_set_isa(const char* isa)
+{
+    size_t i;
+
+    for(i = 0; i < sizeof(all_kernels) / sizeof(all_kernels[0]); i++) {
+        if(isa != NULL  &&  strcmp(isa, all_kernels[i]->isa) != 0)
+            continue;
+        if(cpu_supports(all_kernels[i])) {
+            kernels = all_kernels[i];
+            return 1;
+        }
+    }
+    return 0;
+}
+
+const char*
+hsluv_batch_isa(void)
+{
+    return current_kernels()->isa;
+}
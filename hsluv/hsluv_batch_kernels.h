@@ -0,0 +1,538 @@
+/*
+ * HSLuv-C: Human-friendly HSL
+ * <http://github.com/hsluv/hsluv-c>
+ * <http://www.hsluv.org/>
+ *
+ * Copyright (c) 2015 Alexei Boronine (original idea, JavaScript implementation)
+ * Copyright (c) 2015 Roger Tallada (Obj-C implementation)
+ * Copyright (c) 2017 Martin Mitas (C implementation, based on Obj-C implementation)
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a
+ * copy of this software and associated documentation files (the "Software"),
+ * to deal in the Software without restriction, including without limitation
+ * the rights to use, copy, modify, merge, publish, distribute, sublicense,
+ * and/or sell copies of the Software, and to permit persons to whom the
+ * Software is furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in
+ * all copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+ * OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+ * FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+ * IN THE SOFTWARE.
+ */
+
+/* The block loops of the batch conversions, included by hsluv_batch.c once
+ * for each instruction set it targets, with KERNEL(name) defined to suffix
+ * every name and KERNEL_ISA to name the instruction set. The lane helpers
+ * they inline come from hsluv_batch.c itself. */
+
+/* Gray pixels, black and white included, have closed forms that skip the hue,
+ * the gamut bounds and most of the transfer functions. Lanes cannot take
+ * shortcuts of their own, so whole blocks do when all their pixels are gray,
+ * as most are in scans, documents and UI assets. */
+
+static int
+KERNEL(is_gray_rgb)(const Block* blk, int n)
+{
+    int count = 0;
+    int i;
+
+    for(i = 0; i < n; i++)
+        count += (blk->a[i] == blk->b[i]) & (blk->b[i] == blk->c[i]);
+    return count == n;
+}
+
+/* Negative saturations are not grays: lanes scale the chroma by them, so
+ * these take the opposite hue. */
+static int
+KERNEL(is_gray_hsl)(const Block* blk, int n)
+{
+    int count = 0;
+    int i;
+
+    for(i = 0; i < n; i++)
+        count += ((blk->b[i] >= 0.0) & (blk->b[i] < 0.00000001)) | (blk->c[i] > 99.9999999) |
+                 (blk->c[i] < 0.00000001);
+    return count == n;
+}
+
+/* Between HSLuv and HPLuv, tiny saturations still map to tiny saturations, so
+ * only blocks of exact zeros and extreme lightnesses take the shortcut. */
+static int
+KERNEL(is_unsaturated_hsl)(const Block* blk, int n)
+{
+    int count = 0;
+    int i;
+
+    for(i = 0; i < n; i++)
+        count += (blk->b[i] == 0.0) | (blk->c[i] > 99.9999999) | (blk->c[i] < 0.00000001);
+    return count == n;
+}
+
+/* RGB to HSLuv or HPLuv, for r == g == b: no hue, no saturation. */
+static void
+KERNEL(gray_from_rgb)(Block* blk, int n)
+{
+    int i;
+
+    for(i = 0; i < n; i++) {
+        double y = (m_inv[1][0] + m_inv[1][1] + m_inv[1][2]) * lane_to_linear(blk->a[i]);
+
+        blk->a[i] = 0.0;
+        blk->b[i] = 0.0;
+        blk->c[i] = lane_y2l(y);
+    }
+}
+
+/* HSLuv or HPLuv to RGB, for no chroma: the white point, scaled to Y. */
+static void
+KERNEL(gray_to_rgb)(Block* blk, int n)
+{
+    int i;
+
+    for(i = 0; i < n; i++) {
+        double l = blk->c[i];
+        double y = lane_l2y(l);
+        double gray = lane_from_linear(l <= 0.00000001 ? 0.0 : y);
+
+        blk->a[i] = gray;
+        blk->b[i] = gray;
+        blk->c[i] = gray;
+    }
+}
+
+static void
+KERNEL(hsluv2rgb_block)(Block* blk, int n)
+{
+    int i;
+
+    if(KERNEL(is_gray_hsl)(blk, n)) {
+        KERNEL(gray_to_rgb)(blk, n);
+        return;
+    }
+
+    for(i = 0; i < n; i++) {
+        double h = blk->a[i];
+        double s = blk->b[i];
+        double l = blk->c[i];
+        double cos_h, sin_h;
+        double c;
+
+        /* hsluv2lch(): the chroma along the hue, even for grays */
+        lane_hue_direction(h, &cos_h, &sin_h);
+        c = lane_max_chroma(l, cos_h, sin_h) * 0.01 * s;
+        c = (l > 99.9999999  ||  l < 0.00000001) ? 0.0 : c;
+        cos_h = s < 0.00000001 ? 1.0 : cos_h;
+        sin_h = s < 0.00000001 ? 0.0 : sin_h;
+
+        lane_lch2rgb(l, c, cos_h, sin_h, &blk->a[i], &blk->b[i], &blk->c[i]);
+    }
+}
+
+static void
+KERNEL(hpluv2rgb_block)(Block* blk, int n)
+{
+    int i;
+
+    if(KERNEL(is_gray_hsl)(blk, n)) {
+        KERNEL(gray_to_rgb)(blk, n);
+        return;
+    }
+
+    for(i = 0; i < n; i++) {
+        double h = blk->a[i];
+        double s = blk->b[i];
+        double l = blk->c[i];
+        double cos_h, sin_h;
+        double c;
+
+        /* hpluv2lch() */
+        lane_hue_direction(h, &cos_h, &sin_h);
+        cos_h = s < 0.00000001 ? 1.0 : cos_h;
+        sin_h = s < 0.00000001 ? 0.0 : sin_h;
+        c = lane_max_safe_chroma(l) * 0.01 * s;
+        c = (l > 99.9999999  ||  l < 0.00000001) ? 0.0 : c;
+
+        lane_lch2rgb(l, c, cos_h, sin_h, &blk->a[i], &blk->b[i], &blk->c[i]);
+    }
+}
+
+/* RGB to HSLuv, or to HPLuv if hpluv is set, with the hue only if hue is set
+ * and the saturation only if saturation is set. The block functions below
+ * pass constants, so the compiler drops the atan2() or the gamut bounds they
+ * do not need. */
+LANE void
+KERNEL(rgb2hsl_lanes)(Block* blk, int n, int hpluv, int hue, int saturation)
+{
+    int i;
+
+    if(KERNEL(is_gray_rgb)(blk, n)) {
+        KERNEL(gray_from_rgb)(blk, n);
+        return;
+    }
+
+    for(i = 0; i < n; i++) {
+        double l, u, v;
+        double c, h, s;
+        double cos_h, sin_h, safe_c, inv_c;
+        int gray;
+
+        lane_rgb2luv(blk->a[i], blk->b[i], blk->c[i], &l, &u, &v);
+
+        /* luv2lch() */
+        c = sqrt(u * u + v * v);
+        gray = c < 0.00000001;
+        h = 0.0;
+        if(hue) {
+            h = lane_hue(u, v);
+            h = gray ? 0.0 : h;
+        }
+
+        /* lch2hsluv(), lch2hpluv() */
+        s = 0.0;
+        if(saturation  &&  hpluv) {
+            s = c / lane_max_safe_chroma(l) * 100.0;
+            s = (l > 99.9999999  ||  l < 0.00000001) ? 0.0 : s;
+        } else if(saturation) {
+            safe_c = gray ? 1.0 : c;
+            inv_c = 1.0 / safe_c;
+            cos_h = u * inv_c;
+            sin_h = v * inv_c;
+            cos_h = gray ? 1.0 : cos_h;
+            sin_h = gray ? 0.0 : sin_h;
+            s = c / lane_max_chroma(l, cos_h, sin_h) * 100.0;
+            s = (l > 99.9999999  ||  l < 0.00000001) ? 0.0 : s;
+        }
+
+        blk->a[i] = h;
+        blk->b[i] = s;
+        blk->c[i] = l;
+    }
+}
+
+static void
+KERNEL(rgb2hsluv_block)(Block* blk, int n)
+{
+    KERNEL(rgb2hsl_lanes)(blk, n, 0, 1, 1);
+}
+
+static void
+KERNEL(rgb2hpluv_block)(Block* blk, int n)
+{
+    KERNEL(rgb2hsl_lanes)(blk, n, 1, 1, 1);
+}
+
+/* Hue and lightness, the same for HSLuv and HPLuv */
+static void
+KERNEL(rgb2hl_block)(Block* blk, int n)
+{
+    KERNEL(rgb2hsl_lanes)(blk, n, 0, 1, 0);
+}
+
+/* Saturation and lightness */
+static void
+KERNEL(rgb2hsluv_sl_block)(Block* blk, int n)
+{
+    KERNEL(rgb2hsl_lanes)(blk, n, 0, 0, 1);
+}
+
+static void
+KERNEL(rgb2hpluv_sl_block)(Block* blk, int n)
+{
+    KERNEL(rgb2hsl_lanes)(blk, n, 1, 0, 1);
+}
+
+/* Lightness only, in c: no chroma, no hue, no gamut bounds. */
+static void
+KERNEL(rgb2l_block)(Block* blk, int n)
+{
+    int i;
+
+    if(KERNEL(is_gray_rgb)(blk, n)) {
+        KERNEL(gray_from_rgb)(blk, n);
+        return;
+    }
+
+    for(i = 0; i < n; i++) {
+        double y = m_inv[1][0] * lane_to_linear(blk->a[i]) + m_inv[1][1] * lane_to_linear(blk->b[i]) +
+                   m_inv[1][2] * lane_to_linear(blk->c[i]);
+
+        blk->c[i] = lane_y2l(y);
+    }
+}
+
+/* Same, from linear RGB */
+static void
+KERNEL(linear2l_block)(Block* blk, int n)
+{
+    int i;
+
+    for(i = 0; i < n; i++) {
+        double y = m_inv[1][0] * blk->a[i] + m_inv[1][1] * blk->b[i] + m_inv[1][2] * blk->c[i];
+
+        blk->c[i] = lane_y2l(y);
+    }
+}
+
+/* The stages of the conversions, one by one: RGB, XYZ, LUV and LCh, then
+ * HSLuv or HPLuv. Each takes the hue direction from the hue it is given. */
+
+static void
+KERNEL(rgb2xyz_block)(Block* blk, int n)
+{
+    int i;
+
+    for(i = 0; i < n; i++)
+        lane_rgb2xyz(blk->a[i], blk->b[i], blk->c[i], &blk->a[i], &blk->b[i], &blk->c[i]);
+}
+
+static void
+KERNEL(xyz2rgb_block)(Block* blk, int n)
+{
+    int i;
+
+    for(i = 0; i < n; i++)
+        lane_xyz2rgb(blk->a[i], blk->b[i], blk->c[i], &blk->a[i], &blk->b[i], &blk->c[i]);
+}
+
+static void
+KERNEL(xyz2luv_block)(Block* blk, int n)
+{
+    int i;
+
+    for(i = 0; i < n; i++)
+        lane_xyz2luv(blk->a[i], blk->b[i], blk->c[i], &blk->a[i], &blk->b[i], &blk->c[i]);
+}
+
+static void
+KERNEL(luv2xyz_block)(Block* blk, int n)
+{
+    int i;
+
+    for(i = 0; i < n; i++)
+        lane_luv2xyz(blk->a[i], blk->b[i], blk->c[i], &blk->a[i], &blk->b[i], &blk->c[i]);
+}
+
+static void
+KERNEL(luv2lch_block)(Block* blk, int n)
+{
+    int i;
+
+    for(i = 0; i < n; i++) {
+        double u = blk->b[i];
+        double v = blk->c[i];
+        double c = sqrt(u * u + v * v);
+        double h = lane_hue(u, v);
+
+        blk->b[i] = c;
+        blk->c[i] = c < 0.00000001 ? 0.0 : h;
+    }
+}
+
+static void
+KERNEL(lch2luv_block)(Block* blk, int n)
+{
+    int i;
+
+    for(i = 0; i < n; i++) {
+        double c = blk->b[i];
+        double cos_h, sin_h;
+
+        lane_hue_direction(blk->c[i], &cos_h, &sin_h);
+        blk->b[i] = cos_h * c;
+        blk->c[i] = sin_h * c;
+    }
+}
+
+static void
+KERNEL(lch2hsluv_block)(Block* blk, int n)
+{
+    int i;
+
+    for(i = 0; i < n; i++) {
+        double l = blk->a[i];
+        double c = blk->b[i];
+        double h = blk->c[i];
+        double cos_h, sin_h;
+        double s;
+
+        lane_hue_direction(h, &cos_h, &sin_h);
+        s = c / lane_max_chroma(l, cos_h, sin_h) * 100.0;
+        s = (l > 99.9999999  ||  l < 0.00000001) ? 0.0 : s;
+
+        blk->a[i] = c < 0.00000001 ? 0.0 : h;
+        blk->b[i] = s;
+        blk->c[i] = l;
+    }
+}
+
+static void
+KERNEL(hsluv2lch_block)(Block* blk, int n)
+{
+    int i;
+
+    for(i = 0; i < n; i++) {
+        double h = blk->a[i];
+        double s = blk->b[i];
+        double l = blk->c[i];
+        double cos_h, sin_h;
+        double c;
+
+        lane_hue_direction(h, &cos_h, &sin_h);
+        c = lane_max_chroma(l, cos_h, sin_h) * 0.01 * s;
+        c = (l > 99.9999999  ||  l < 0.00000001) ? 0.0 : c;
+
+        blk->a[i] = l;
+        blk->b[i] = c;
+        blk->c[i] = s < 0.00000001 ? 0.0 : h;
+    }
+}
+
+static void
+KERNEL(lch2hpluv_block)(Block* blk, int n)
+{
+    int i;
+
+    for(i = 0; i < n; i++) {
+        double l = blk->a[i];
+        double c = blk->b[i];
+        double h = blk->c[i];
+        double s;
+
+        s = c / lane_max_safe_chroma(l) * 100.0;
+        s = (l > 99.9999999  ||  l < 0.00000001) ? 0.0 : s;
+
+        blk->a[i] = c < 0.00000001 ? 0.0 : h;
+        blk->b[i] = s;
+        blk->c[i] = l;
+    }
+}
+
+static void
+KERNEL(hpluv2lch_block)(Block* blk, int n)
+{
+    int i;
+
+    for(i = 0; i < n; i++) {
+        double h = blk->a[i];
+        double s = blk->b[i];
+        double l = blk->c[i];
+        double c;
+
+        c = lane_max_safe_chroma(l) * 0.01 * s;
+        c = (l > 99.9999999  ||  l < 0.00000001) ? 0.0 : c;
+
+        blk->a[i] = l;
+        blk->b[i] = c;
+        blk->c[i] = s < 0.00000001 ? 0.0 : h;
+    }
+}
+
+/* HSLuv to HPLuv and back through LCh, which keeps the lightness and the
+ * hue: only the chroma is rescaled, from one gamut bound to the other. */
+
+/* No chroma, white and black included: hue and saturation 0 */
+static void
+KERNEL(gray_hsl)(Block* blk, int n)
+{
+    int i;
+
+    for(i = 0; i < n; i++) {
+        blk->a[i] = 0.0;
+        blk->b[i] = 0.0;
+    }
+}
+
+static void
+KERNEL(hsluv2hpluv_block)(Block* blk, int n)
+{
+    int i;
+
+    if(KERNEL(is_unsaturated_hsl)(blk, n)) {
+        KERNEL(gray_hsl)(blk, n);
+        return;
+    }
+
+    for(i = 0; i < n; i++) {
+        double h = blk->a[i];
+        double s = blk->b[i];
+        double l = blk->c[i];
+        int extreme = l > 99.9999999  ||  l < 0.00000001;
+        double cos_h, sin_h;
+        double c;
+
+        /* hsluv2lch() */
+        lane_hue_direction(h, &cos_h, &sin_h);
+        c = lane_max_chroma(l, cos_h, sin_h) * 0.01 * s;
+        c = extreme ? 0.0 : c;
+
+        /* lch2hpluv() */
+        h = (s < 0.00000001  ||  c < 0.00000001) ? 0.0 : h;
+        s = c / lane_max_safe_chroma(l) * 100.0;
+        blk->a[i] = h;
+        blk->b[i] = extreme ? 0.0 : s;
+    }
+}
+
+static void
+KERNEL(hpluv2hsluv_block)(Block* blk, int n)
+{
+    int i;
+
+    if(KERNEL(is_unsaturated_hsl)(blk, n)) {
+        KERNEL(gray_hsl)(blk, n);
+        return;
+    }
+
+    for(i = 0; i < n; i++) {
+        double h = blk->a[i];
+        double s = blk->b[i];
+        double l = blk->c[i];
+        int extreme = l > 99.9999999  ||  l < 0.00000001;
+        double cos_h, sin_h;
+        double c;
+
+        /* hpluv2lch() */
+        c = lane_max_safe_chroma(l) * 0.01 * s;
+        c = extreme ? 0.0 : c;
+        lane_hue_direction(h, &cos_h, &sin_h);
+        cos_h = s < 0.00000001 ? 1.0 : cos_h;
+        sin_h = s < 0.00000001 ? 0.0 : sin_h;
+        h = s < 0.00000001 ? 0.0 : h;
+
+        /* lch2hsluv() */
+        s = c / lane_max_chroma(l, cos_h, sin_h) * 100.0;
+        blk->a[i] = c < 0.00000001 ? 0.0 : h;
+        blk->b[i] = extreme ? 0.0 : s;
+    }
+}
+
+static const Kernels KERNEL(kernels) = {
+    KERNEL_ISA,
+    KERNEL(hsluv2rgb_block),
+    KERNEL(rgb2hsluv_block),
+    KERNEL(hpluv2rgb_block),
+    KERNEL(rgb2hpluv_block),
+    KERNEL(rgb2hl_block),
+    KERNEL(rgb2hsluv_sl_block),
+    KERNEL(rgb2hpluv_sl_block),
+    KERNEL(rgb2l_block),
+    KERNEL(linear2l_block),
+    KERNEL(rgb2xyz_block),
+    KERNEL(xyz2rgb_block),
+    KERNEL(xyz2luv_block),
+    KERNEL(luv2xyz_block),
+    KERNEL(luv2lch_block),
+    KERNEL(lch2luv_block),
+    KERNEL(lch2hsluv_block),
+    KERNEL(hsluv2lch_block),
+    KERNEL(lch2hpluv_block),
+    KERNEL(hpluv2lch_block),
+    KERNEL(hsluv2hpluv_block),
+    KERNEL(hpluv2hsluv_block)
+};
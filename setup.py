@@ -6,7 +6,7 @@ from __future__ import print_function
 import os
 import os.path
 import six
-# import sys
+import sys
 
 # import before Cython stuff, to avoid
 # overriding Cython’s Extension class:
@@ -248,7 +248,7 @@ classifiers = [
     'License :: OSI Approved :: MIT License']
 
 api_extension_sources = [os.path.join('hsluv', 'api.pyx')]
-other_source_names = ('hsluv.c',)
+other_source_names = ('hsluv.c', 'hsluv_batch.c')
 other_sources = [os.path.join('hsluv', source) for source in other_source_names]
 
 hsluv_base_path = os.path.abspath(os.path.dirname(__file__))
@@ -259,6 +259,12 @@ include_dirs = [
     os.path.join(hsluv_base_path, 'hsluv'),
     os.path.curdir]
 
+# OpenMP drives the parallel batch conversions in hsluv.api; it is on by default
+# except on macOS, where Apple’s clang ships without it. Set HSLUV_OPENMP=0 or =1
+# in the environment to override:
+use_openmp = os.environ.get('HSLUV_OPENMP', sys.platform != 'darwin' and '1' or '0') != '0'
+openmp_args = use_openmp and ['-fopenmp'] or []
+
 macros = Macros()
 macros.define('NDEBUG')
 macros.define('NUMPY')
@@ -292,8 +298,10 @@ setup(name='hsluv-cython',
                 '-Wno-unneeded-internal-declaration',
                 '-O3',
                 '-fstrict-aliasing',
-                '-funroll-loops',
-                '-mtune=native']
+                '-fno-math-errno',
+                '-fno-trapping-math',
+                '-funroll-loops'] + openmp_args,
+            extra_link_args=openmp_args
         )],
         nthreads=cpu_count(),
         compiler_directives=dict(language_level=3,
@@ -0,0 +1,623 @@
+# -*- coding: utf-8 -*-
+""" Behaviour tests for hsluv.api, checking the batch conversions and their
+    options against the single-triple functions, which wrap the reference C code.
+
+    Run with `python -m pytest tests` (or nose) against an in-place build.
+"""
+
+import contextlib
+import os
+import stat
+import tempfile
+import numpy
+import numpy.testing as npt
+
+from hsluv import api, cache
+
+# How far the vectorized kernels may stray from the reference computation:
+BATCH_TOLERANCE = 0.00000001
+
+CONVERSIONS = (
+    (api.hsluv_to_rgb_batch, api.hsluv_to_rgb, 'hsl'),
+    (api.rgb_to_hsluv_batch, api.rgb_to_hsluv, 'rgb'),
+    (api.hpluv_to_rgb_batch, api.hpluv_to_rgb, 'hsl'),
+    (api.rgb_to_hpluv_batch, api.rgb_to_hpluv, 'rgb'),
+)
+
+def sample_pixels(space, count, seed=0):
+    """ Return `count` random float64 triples spanning the ranges of `space`:
+        'hsl' for HSLuv and HPLuv, 'rgb' for RGB
+    """
+    generator = numpy.random.default_rng(seed)
+    scale = (360.0, 100.0, 100.0) if space == 'hsl' else (1.0, 1.0, 1.0)
+    return generator.random((count, 3)) * scale
+
+def reference(scalar, pixels):
+    """ Convert an array of shape (..., 3) one triple at a time with `scalar` """
+    source = numpy.asarray(pixels, dtype=numpy.float64)
+    flat = source.reshape(-1, 3)
+    result = numpy.empty_like(flat)
+    for idx in range(flat.shape[0]):
+        result[idx] = scalar(numpy.array(flat[idx]), numpy.empty(3))
+    return result.reshape(source.shape)
+
+# [user-001] Batched (..., 3) conversions
+
+def test_batch_matches_scalar():
+    for batch, scalar, space in CONVERSIONS:
+        pixels = sample_pixels(space, 1000)
+        npt.assert_allclose(batch(pixels), reference(scalar, pixels), rtol=0, atol=BATCH_TOLERANCE)
+
+def test_batch_shapes():
+    for batch, scalar, space in CONVERSIONS:
+        pixels = sample_pixels(space, 24).reshape(2, 3, 4, 3)
+        result = batch(pixels)
+        assert result.shape == pixels.shape and result.dtype == numpy.float64
+        npt.assert_allclose(result, reference(scalar, pixels), rtol=0, atol=BATCH_TOLERANCE)
+        assert batch(numpy.empty((0, 3))).shape == (0, 3)
+        assert batch(pixels[0, 0, 0]).shape == (3,)
+        npt.assert_raises(ValueError, batch, numpy.zeros((4, 2)))
+
+def test_batch_lists_and_integers():
+    npt.assert_allclose(api.hsluv_to_rgb_batch([[12.5, 50.0, 50.0]]),
+                        reference(api.hsluv_to_rgb, [[12.5, 50.0, 50.0]]), rtol=0,
+                        atol=BATCH_TOLERANCE)
+    hsl = numpy.array([[120, 40, 60], [300, 100, 20]], dtype=numpy.int64)
+    npt.assert_allclose(api.hsluv_to_rgb_batch(hsl), reference(api.hsluv_to_rgb, hsl), rtol=0,
+                        atol=BATCH_TOLERANCE)
+
+# [user-002] Multi-core batch conversion
+
+def test_threads_give_identical_results():
+    pixels = sample_pixels('hsl', 100002).reshape(-1, 7, 3)
+    try:
+        assert api.set_num_threads(1) == api.get_num_threads() == 1
+        single = api.hsluv_to_rgb_batch(pixels)
+        threads = api.set_num_threads(4)
+        assert threads in (1, 4)
+        npt.assert_array_equal(api.hsluv_to_rgb_batch(pixels), single)
+        npt.assert_array_equal(api.hsluv_to_rgb_batch(pixels[:, ::2]), single[:, ::2])
+    finally:
+        api.set_num_threads()
+    assert api.set_num_threads(0) == api.get_num_threads() >= 1
+
+# [user-003] Generalized ufuncs
+
+GUFUNCS = (
+    (api.hsluv2rgb, api.hsluv_to_rgb, 'hsl'),
+    (api.rgb2hsluv, api.rgb_to_hsluv, 'rgb'),
+    (api.hpluv2rgb, api.hpluv_to_rgb, 'hsl'),
+    (api.rgb2hpluv, api.rgb_to_hpluv, 'rgb'),
+)
+
+def test_gufuncs_match_scalar():
+    for gufunc, scalar, space in GUFUNCS:
+        pixels = sample_pixels(space, 600).reshape(20, 30, 3)
+        expected = reference(scalar, pixels)
+        assert gufunc.signature == '(3)->(3)'
+        npt.assert_allclose(gufunc(pixels), expected, rtol=0, atol=BATCH_TOLERANCE)
+        # Strided pixels take the single-pixel loop, exact to the last bit:
+        npt.assert_array_equal(gufunc(pixels[:, ::3]), expected[:, ::3])
+        planar = numpy.ascontiguousarray(numpy.moveaxis(pixels, -1, 0))
+        npt.assert_array_equal(gufunc(planar, axes=[0, 0]), numpy.moveaxis(expected, -1, 0))
+        out = numpy.zeros_like(pixels)
+        assert gufunc(pixels, out=out) is out
+        npt.assert_allclose(out, expected, rtol=0, atol=BATCH_TOLERANCE)
+
+def test_gufuncs_float32():
+    for gufunc, scalar, space in GUFUNCS:
+        pixels = sample_pixels(space, 600).astype(numpy.float32)
+        expected = reference(scalar, pixels)
+        tolerance = 0.00001 if space == 'hsl' else 0.0001
+        # Contiguous pixels take the batch kernel, strided ones the float functions:
+        for result, wanted in ((gufunc(pixels), expected), (gufunc(pixels[::2]), expected[::2])):
+            assert result.dtype == numpy.float32
+            npt.assert_allclose(result, wanted, rtol=0, atol=tolerance)
+
+# [user-004] Non-mutating conversions and out=
+
+def test_triple_out():
+    hsl = numpy.array([250.0, 60.0, 40.0])
+    rgb = numpy.empty(3)
+    result = api.hsluv_to_rgb(hsl, rgb)
+    npt.assert_array_equal(hsl, [250.0, 60.0, 40.0])
+    npt.assert_array_equal(numpy.asarray(result), rgb)
+    api.hsluv_to_rgb(hsl)
+    npt.assert_array_equal(hsl, rgb)
+
+def test_batch_out_and_inplace():
+    for batch, scalar, space in CONVERSIONS:
+        pixels = sample_pixels(space, 100)
+        original = pixels.copy()
+        expected = batch(pixels)
+        npt.assert_array_equal(pixels, original)
+        out = numpy.empty_like(pixels)
+        assert batch(pixels, out=out) is out
+        npt.assert_array_equal(out, expected)
+        assert batch(pixels, inplace=True) is pixels
+        npt.assert_array_equal(pixels, expected)
+        # out= may alias the input, as inplace=True does:
+        aliased = original.copy()
+        assert batch(aliased, out=aliased) is aliased
+        npt.assert_array_equal(aliased, expected)
+        # Any other overlap goes through a temporary:
+        reversed_out = original.copy()
+        batch(reversed_out, out=reversed_out[::-1])
+        npt.assert_array_equal(reversed_out, expected[::-1])
+        shifted = numpy.concatenate([original, original[-1:]])
+        batch(shifted[:100], out=shifted[1:])
+        npt.assert_array_equal(shifted[1:], expected)
+        npt.assert_array_equal(shifted[0], original[0])
+        npt.assert_raises(ValueError, batch, original, out=out, inplace=True)
+        npt.assert_raises(ValueError, batch, original, out=numpy.empty((100, 3), numpy.int32))
+        npt.assert_raises(ValueError, batch, original, out=numpy.empty((99, 3)))
+        npt.assert_raises(ValueError, batch, original.astype(numpy.int64), inplace=True)
+        npt.assert_raises(ValueError, batch, original, inplace=True, dtype=numpy.float32)
+
+def test_inplace_keeps_dtype():
+    pixels = sample_pixels('hsl', 100).astype(numpy.float32)
+    expected = api.hsluv_to_rgb_batch(pixels)
+    assert expected.dtype == numpy.float32
+    assert api.hsluv_to_rgb_batch(pixels, inplace=True) is pixels
+    npt.assert_array_equal(pixels, expected)
+
+def test_triple_lengths():
+    for batch, scalar, space in CONVERSIONS:
+        npt.assert_raises(ValueError, scalar, numpy.zeros(3), numpy.zeros(2))
+        npt.assert_raises(ValueError, scalar, numpy.zeros(2), numpy.zeros(3))
+        npt.assert_raises(ValueError, scalar, numpy.zeros(2))
+        npt.assert_array_equal(numpy.asarray(scalar(numpy.zeros(4), numpy.ones(4)))[3:], [1.0])
+
+# [user-005] 24-bit sRGB lookup tables
+
+def test_rgb8_table():
+    generator = numpy.random.default_rng(0)
+    pixels = generator.integers(0, 256, (50, 40, 3), dtype=numpy.uint8)
+    try:
+        table = api.get_rgb8_table('hsluv', persist=False)
+        assert table.shape == (1 << 24, 3) and table.dtype == numpy.float32
+        assert not table.flags.writeable
+        assert api.get_rgb8_table('hsluv', persist=False) is table
+        expected = reference(api.rgb_to_hsluv, pixels / 255.0)
+        result = api.rgb8_to_hsluv_batch(pixels)
+        assert result.dtype == numpy.float32 and result.shape == pixels.shape
+        npt.assert_allclose(result, expected, rtol=0.000001, atol=0.000001)
+        npt.assert_array_equal(api.rgb8_to_hsluv_batch(pixels[::-1, ::2]), result[::-1, ::2])
+        npt.assert_raises(TypeError, api.rgb8_to_hsluv_batch, pixels / 255.0)
+        npt.assert_raises(TypeError, api.rgb8_to_hsluv_batch, pixels.astype(numpy.uint16))
+        npt.assert_raises(ValueError, api.rgb8_to_hsluv_batch, pixels[..., :2])
+        npt.assert_raises(ValueError, api.get_rgb8_table, 'hsv')
+    finally:
+        api.clear_tables()
+
+# [user-006] The on-disk table cache
+
+@contextlib.contextmanager
+def cache_directory(directory=None):
+    """ Point HSLUV_CACHE_DIR at `directory`, or at a new temporary one, for the
+        duration of the block, and yield it
+    """
+    previous = os.environ.get('HSLUV_CACHE_DIR')
+    with tempfile.TemporaryDirectory() as temporary:
+        os.environ['HSLUV_CACHE_DIR'] = temporary if directory is None else directory
+        try:
+            yield os.environ['HSLUV_CACHE_DIR']
+        finally:
+            if previous is None:
+                del os.environ['HSLUV_CACHE_DIR']
+            else:
+                os.environ['HSLUV_CACHE_DIR'] = previous
+
+class Builder(object):
+    """ A table builder counting its calls """
+
+    def __init__(self, shape=(16, 3), dtype=numpy.float32):
+        self.table = numpy.arange(numpy.prod(shape), dtype=dtype).reshape(shape)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.table.copy()
+
+def test_cache_round_trip():
+    with cache_directory() as directory:
+        build = Builder()
+        table = cache.cached_table('0.0', 'test', numpy.float32, (16, 3), build)
+        npt.assert_array_equal(table, build.table)
+        assert isinstance(table, numpy.memmap) and not table.flags.writeable
+        path = cache.table_path('0.0', 'test', numpy.float32)
+        assert os.path.dirname(path) == directory and os.path.isfile(path)
+        npt.assert_array_equal(cache.cached_table('0.0', 'test', numpy.float32, (16, 3), build),
+                               build.table)
+        assert build.calls == 1
+        assert [name for name in os.listdir(directory) if name.endswith('.tmp')] == []
+        assert cache.clear('0.1') == 0 and cache.clear('0.0') == 1
+        assert os.listdir(directory) == []
+
+def test_cache_file_mode_follows_umask():
+    previous = os.umask(0o077)
+    try:
+        with cache_directory():
+            path = cache.store_table('0.0', 'test', Builder().table)
+            assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+        os.umask(0o022)
+        with cache_directory():
+            path = cache.store_table('0.0', 'test', Builder().table)
+            assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+    finally:
+        os.umask(previous)
+
+def test_cache_rebuilds_truncated_files():
+    with cache_directory():
+        build = Builder()
+        path = cache.store_table('0.0', 'test', build.table)
+        with open(path, 'r+b') as stream:
+            stream.truncate(os.path.getsize(path) // 2)
+        assert cache.load_table('0.0', 'test', numpy.float32, (16, 3)) is None
+        npt.assert_array_equal(cache.cached_table('0.0', 'test', numpy.float32, (16, 3), build),
+                               build.table)
+        assert build.calls == 1
+        assert cache.load_table('0.0', 'test', numpy.float32, (16, 3)) is not None
+
+def test_cache_rebuilds_tables_of_the_wrong_shape():
+    with cache_directory():
+        cache.store_table('0.0', 'test', Builder(shape=(8, 3)).table)
+        assert cache.load_table('0.0', 'test', numpy.float32, (16, 3)) is None
+        build = Builder()
+        table = cache.cached_table('0.0', 'test', numpy.float32, (16, 3), build)
+        assert table.shape == (16, 3) and build.calls == 1
+
+def test_cache_falls_back_to_memory():
+    with tempfile.NamedTemporaryFile() as blocker:
+        # A cache directory that cannot be created, under a regular file:
+        with cache_directory(os.path.join(blocker.name, 'hsluv')):
+            build = Builder()
+            assert cache.store_table('0.0', 'test', build.table) is None
+            table = cache.cached_table('0.0', 'test', numpy.float32, (16, 3), build)
+            assert not isinstance(table, numpy.memmap) and build.calls == 1
+            npt.assert_array_equal(table, build.table)
+    with cache_directory(''):
+        assert cache.cache_directory() is None and cache.table_path('0.0', 'test', 'f4') is None
+        assert cache.store_table('0.0', 'test', Builder().table) is None
+        assert cache.clear() == 0
+
+def test_memoized_tables_persist():
+    with cache_directory() as directory:
+        try:
+            table = api.get_inverse_table('hsluv', 5)
+            assert isinstance(table, numpy.memmap)
+            assert len(os.listdir(directory)) == 1
+            api.clear_tables()
+            npt.assert_array_equal(api.get_inverse_table('hsluv', 5), table)
+            api.clear_tables()
+            flags = api.get_flags()
+            api.set_flags(api.SAFE_CHROMA_TABLE)
+            try:
+                api.get_inverse_table('hsluv', 5)
+            finally:
+                api.set_flags(flags)
+            assert len(os.listdir(directory)) == 2
+        finally:
+            api.clear_tables()
+
+# [user-007] Tetrahedral interpolation in inverse tables
+
+def test_inverse_table_nodes_are_exact():
+    with cache_directory():
+        try:
+            table = api.get_inverse_table('hsluv', (9, 5, 5), numpy.float64)
+            assert table.shape == (9, 5, 5, 3)
+            h, s, l = numpy.meshgrid(numpy.linspace(0.0, 360.0, 9), numpy.linspace(0.0, 100.0, 5),
+                                     numpy.linspace(0.0, 100.0, 5), indexing='ij')
+            nodes = numpy.stack([h, s, l], axis=-1)
+            expected = reference(api.hsluv_to_rgb, nodes)
+            npt.assert_allclose(table, expected, rtol=0, atol=0.000000000001)
+            result = api.hsluv_to_rgb_approx_batch(nodes, size=(9, 5, 5), dtype=numpy.float64)
+            npt.assert_allclose(result, expected, rtol=0, atol=0.000000000001)
+            # Hues wrap around, and saturation and lightness are clamped:
+            npt.assert_allclose(api.hsluv_to_rgb_approx_batch(nodes + (720.0, 0.0, 0.0),
+                                                              size=(9, 5, 5), dtype=numpy.float64),
+                                expected, rtol=0, atol=0.000000001)
+            npt.assert_array_equal(api.hsluv_to_rgb_approx_batch([[40.0, 150.0, -5.0]],
+                                                                 size=(9, 5, 5), dtype=numpy.float64),
+                                   api.hsluv_to_rgb_approx_batch([[40.0, 100.0, 0.0]],
+                                                                 size=(9, 5, 5), dtype=numpy.float64))
+            # Non-finite components have no cell, and give all-NaN pixels:
+            bad = numpy.array([[numpy.nan, 50.0, 50.0], [numpy.inf, 50.0, 50.0],
+                               [40.0, numpy.nan, 50.0], [40.0, 50.0, -numpy.inf],
+                               [40.0, 50.0, 50.0]])
+            result = api.hsluv_to_rgb_approx_batch(bad, size=(9, 5, 5), dtype=numpy.float64)
+            assert numpy.isnan(result[:4]).all() and numpy.isfinite(result[4]).all()
+            npt.assert_raises(ValueError, api.get_inverse_table, 'hsluv', 1)
+            npt.assert_raises(ValueError, api.get_inverse_table, 'hsluv', (9, 5))
+        finally:
+            api.clear_tables()
+
+def test_inverse_table_error_bounds():
+    # The bounds documented by inverse_table_error(), with some margin:
+    bounds = {'hsluv': (0.25, 0.0005), 'hpluv': (0.05, 0.0001)}
+    with cache_directory():
+        try:
+            for kind, (worst, mean) in bounds.items():
+                error = api.inverse_table_error(kind, samples=200000)
+                assert error['samples'] == 200000
+                assert error['max'] < worst and error['mean'] < mean
+                assert error['mean'] <= error['rms'] <= error['max']
+                coarse = api.inverse_table_error(kind, size=33, samples=200000)
+                assert coarse['mean'] > 2.0 * error['mean']
+            precise = api.inverse_table_error('hsluv', dtype=numpy.float64, samples=200000)
+            assert abs(precise['mean'] - api.inverse_table_error('hsluv', samples=200000)['mean']) < 0.00001
+        finally:
+            api.clear_tables()
+
+# [user-015] Integer RGB
+
+def test_integer_rgb():
+    hsl = sample_pixels('hsl', 500)
+    rgb = api.hsluv_to_rgb_batch(hsl)
+    for dtype, top in ((numpy.uint8, 255.0), (numpy.uint16, 65535.0)):
+        expected = numpy.round(numpy.clip(rgb, 0.0, 1.0) * top)
+        npt.assert_array_equal(api.hsluv_to_rgb_batch(hsl, dtype=dtype), expected)
+        npt.assert_array_equal(api.xyz_to_rgb_batch(api.rgb_to_xyz_batch(rgb), dtype=dtype), expected)
+        pixels = expected.astype(dtype)
+        npt.assert_allclose(api.rgb_to_hsluv_batch(pixels), api.rgb_to_hsluv_batch(pixels / top),
+                            rtol=0, atol=BATCH_TOLERANCE)
+
+def test_integer_output_is_rgb_only():
+    pixels = (sample_pixels('rgb', 100) * 255.0).astype(numpy.uint8)
+    original = pixels.copy()
+    for batch in (api.rgb_to_hsluv_batch, api.rgb_to_hpluv_batch, api.rgb_to_xyz_batch):
+        npt.assert_raises(ValueError, batch, pixels, inplace=True)
+        npt.assert_raises(ValueError, batch, pixels, dtype=numpy.uint16)
+        npt.assert_raises(ValueError, batch, pixels, out=numpy.empty((100, 3), numpy.uint8))
+    npt.assert_array_equal(pixels, original)
+    npt.assert_raises(ValueError, api.rgb_to_lightness_batch, pixels, dtype=numpy.uint8)
+    npt.assert_raises(ValueError, api.rgb_to_hsluv_indexed, pixels, dtype=numpy.uint8)
+    hsl = api.rgb_to_hsluv_batch(pixels)
+    for batch in (api.xyz_to_luv_batch, api.luv_to_xyz_batch, api.luv_to_lch_batch,
+                  api.lch_to_luv_batch, api.lch_to_hsluv_batch, api.hsluv_to_lch_batch,
+                  api.lch_to_hpluv_batch, api.hpluv_to_lch_batch, api.hsluv_to_hpluv_batch,
+                  api.hpluv_to_hsluv_batch):
+        npt.assert_raises(ValueError, batch, hsl, dtype=numpy.uint8)
+        npt.assert_raises(ValueError, batch, hsl.astype(numpy.uint16), inplace=True)
+
+# [user-018] Arbitrary strides
+
+def test_strided_input():
+    pixels = sample_pixels('hsl', 24 * 20).reshape(24, 20, 3)
+    expected = api.hsluv_to_rgb_batch(pixels)
+    views = (
+        (pixels[::-1], expected[::-1]),
+        (pixels[:, ::-1], expected[:, ::-1]),
+        (pixels[::-2, 3::3], expected[::-2, 3::3]),
+        (pixels.transpose(1, 0, 2), expected.transpose(1, 0, 2)),
+        (pixels[5:6, :, :], expected[5:6]),
+        (numpy.asfortranarray(pixels), expected),
+    )
+    for view, wanted in views:
+        npt.assert_array_equal(api.hsluv_to_rgb_batch(view), wanted)
+
+def test_strided_output():
+    pixels = sample_pixels('rgb', 24 * 20).reshape(24, 20, 3)
+    expected = api.rgb_to_hsluv_batch(pixels)
+    out = numpy.zeros((20, 24, 3)).transpose(1, 0, 2)
+    api.rgb_to_hsluv_batch(pixels[::-1], out=out[::-1])
+    npt.assert_array_equal(out, expected)
+    out = numpy.zeros((24, 40, 3))
+    api.rgb_to_hsluv_batch(pixels, out=out[:, ::2])
+    npt.assert_array_equal(out[:, ::2], expected)
+    npt.assert_array_equal(out[:, 1::2], 0.0)
+    # In place over a view leaves the rest of the array alone:
+    view = pixels.copy()
+    api.rgb_to_hsluv_batch(view[::2], inplace=True)
+    npt.assert_array_equal(view[::2], expected[::2])
+    npt.assert_array_equal(view[1::2], pixels[1::2])
+
+def test_broadcast_input():
+    pixel = sample_pixels('hsl', 1)
+    expected = api.hsluv_to_rgb_batch(pixel)
+    result = api.hsluv_to_rgb_batch(numpy.broadcast_to(pixel, (7, 5, 3)))
+    npt.assert_array_equal(result, numpy.broadcast_to(expected, (7, 5, 3)))
+    npt.assert_raises(ValueError, api.hsluv_to_rgb_batch, numpy.broadcast_to(pixel.copy(), (7, 3)),
+                      inplace=True)
+
+def test_strided_planar_and_integer():
+    pixels = (sample_pixels('rgb', 30 * 16) * 255.0).astype(numpy.uint8).reshape(30, 16, 3)
+    expected = api.rgb_to_hpluv_batch(pixels)
+    planar = numpy.moveaxis(pixels, -1, 0)
+    npt.assert_array_equal(api.rgb_to_hpluv_batch(planar[:, ::-3, ::2], planar=True),
+                           numpy.moveaxis(expected[::-3, ::2], -1, 0))
+    npt.assert_array_equal(api.rgb_to_hpluv_batch(pixels[::-1, ::-1]), expected[::-1, ::-1])
+    back = api.hpluv_to_rgb_batch(expected[:, ::-1], dtype=numpy.uint8)
+    npt.assert_array_equal(back, pixels[:, ::-1])
+
+# [user-019] Unique-color deduplication
+
+def sampled_image(count, colors, seed=0, dtype=numpy.uint8, channels=3):
+    """ Return `count` pixels drawn from `colors` random colors, except that every
+        pixel the deduplication samples first is the same color -- so the sample
+        always looks repetitive enough to go on with
+    """
+    generator = numpy.random.default_rng(seed)
+    top = numpy.iinfo(dtype).max + 1
+    palette = generator.integers(0, top, (colors, channels), dtype=dtype)
+    pixels = palette[generator.integers(0, colors, count)]
+    pixels[::max(count // 1024, 1)] = palette[0]
+    return pixels
+
+def test_unique_matches_plain_conversion():
+    images = (
+        sampled_image(100000, 12),                                   # a few colors
+        sampled_image(100000, 5000),                                 # the hash table grows
+        sampled_image(100000, 1 << 24),                              # too many: gives up
+        sampled_image(50000, 300, dtype=numpy.uint16),
+        sampled_image(1000, 1 << 24, seed=1)[numpy.zeros(1000, dtype=int)],
+        (sample_pixels('rgb', 1000) * 255.0).astype(numpy.uint8),    # sample too varied
+        numpy.zeros((0, 3), dtype=numpy.uint8),
+    )
+    for pixels in images:
+        for batch in (api.rgb_to_hsluv_batch, api.rgb_to_hpluv_batch):
+            expected = batch(pixels)
+            npt.assert_array_equal(batch(pixels, unique=True), expected)
+            npt.assert_array_equal(batch(pixels, unique=True, dtype=numpy.float32),
+                                   batch(pixels, dtype=numpy.float32))
+            npt.assert_array_equal(batch(pixels, unique=True, channels='sl'), expected[..., 1:])
+
+def test_unique_layouts_and_strides():
+    rgba = sampled_image(40000, 50, channels=4, dtype=numpy.uint16)
+    npt.assert_array_equal(api.rgb_to_hsluv_batch(rgba, unique=True, layout='bgra'),
+                           api.rgb_to_hsluv_batch(rgba, layout='bgra'))
+    image = sampled_image(40000, 50).reshape(200, 200, 3)
+    npt.assert_array_equal(api.rgb_to_hsluv_batch(image[::-1, ::2], unique=True),
+                           api.rgb_to_hsluv_batch(image[::-1, ::2]))
+    planar = numpy.ascontiguousarray(numpy.moveaxis(image, -1, 0))
+    npt.assert_array_equal(api.rgb_to_hsluv_batch(planar, unique=True, planar=True),
+                           api.rgb_to_hsluv_batch(planar, planar=True))
+    out = numpy.zeros((200, 200, 3)).transpose(1, 0, 2)
+    api.rgb_to_hsluv_batch(image, out=out, unique=True)
+    npt.assert_array_equal(out, api.rgb_to_hsluv_batch(image))
+    # Float pixels do not pack into a key, and are converted as they are:
+    rgb = image / 255.0
+    npt.assert_array_equal(api.rgb_to_hsluv_batch(rgb, unique=True), api.rgb_to_hsluv_batch(rgb))
+
+# [user-020] Indexed images
+
+def test_indexed_matches_batch():
+    palette = sample_pixels('hsl', 40)
+    generator = numpy.random.default_rng(0)
+    indices = generator.integers(0, 40, (30, 20))
+    colors, image = api.hsluv_to_rgb_indexed(palette, indices)
+    npt.assert_array_equal(colors, api.hsluv_to_rgb_batch(palette))
+    npt.assert_array_equal(image, colors[indices])
+    colors, image = api.hsluv_to_rgb_indexed(palette)
+    assert image is None
+    for dtype in (numpy.uint8, numpy.int16, numpy.uint32):
+        _, image = api.hsluv_to_rgb_indexed(palette, indices.astype(dtype)[::-1], dtype=numpy.uint8)
+        npt.assert_array_equal(image, api.hsluv_to_rgb_batch(palette, dtype=numpy.uint8)[indices[::-1]])
+    out = numpy.zeros((20, 30, 3)).transpose(1, 0, 2)
+    _, image = api.hsluv_to_rgb_indexed(palette, indices, out=out)
+    assert image is out
+    npt.assert_array_equal(out, colors[indices])
+    # out= sets the dtype, as for the batch functions:
+    out = numpy.empty((30, 20, 3), dtype=numpy.float32)
+    colors, image = api.hsluv_to_rgb_indexed(palette, indices, out=out)
+    assert image is out and colors.dtype == numpy.float32
+    npt.assert_array_equal(out, api.hsluv_to_rgb_batch(palette, dtype=numpy.float32)[indices])
+    rgba, image = api.rgb_to_hpluv_indexed(numpy.full((2, 4), 0.5), [[1, 0]], layout='rgba')
+    assert rgba.shape == (2, 4) and image.shape == (1, 2, 4)
+
+def test_indexed_bounds_checks():
+    palette = sample_pixels('rgb', 5)
+    for indices in ([0, 5], [-1, 2], numpy.array([[4, 70000]], dtype=numpy.int32)):
+        npt.assert_raises(ValueError, api.rgb_to_hsluv_indexed, palette, indices)
+    npt.assert_raises(ValueError, api.rgb_to_hsluv_indexed, palette, [0.0, 1.0])
+    npt.assert_raises(ValueError, api.rgb_to_hsluv_indexed, palette, [0, 1], out=numpy.empty((3, 3)))
+    npt.assert_raises(ValueError, api.rgb_to_hsluv_indexed, palette, [0, 1], dtype=numpy.float64,
+                      out=numpy.empty((2, 3), dtype=numpy.float32))
+    npt.assert_raises(ValueError, api.rgb_to_hsluv_indexed, palette, [0, 1],
+                      out=numpy.empty((2, 3), dtype=numpy.int32))
+    npt.assert_raises(ValueError, api.rgb_to_hsluv_indexed, palette.reshape(5, 1, 3), [0])
+    # uint8 indices can only miss a palette of fewer than 256 colors:
+    full = sample_pixels('rgb', 256)
+    indices = numpy.arange(256, dtype=numpy.uint8)
+    colors, image = api.rgb_to_hsluv_indexed(full, indices)
+    npt.assert_array_equal(image, colors)
+    npt.assert_raises(ValueError, api.rgb_to_hsluv_indexed, full[:255], indices)
+    _, image = api.rgb_to_hsluv_indexed(palette, numpy.empty((0, 4), dtype=numpy.int64))
+    assert image.shape == (0, 4, 3)
+
+# [user-022] Lightness-only extraction
+
+def test_lightness_matches_full_conversion():
+    rgb = sample_pixels('rgb', 500)
+    expected = api.rgb_to_hsluv_batch(rgb)[..., 2]
+    npt.assert_allclose(api.rgb_to_lightness_batch(rgb), expected, rtol=0, atol=BATCH_TOLERANCE)
+    npt.assert_allclose(api.rgb_to_hpluv_batch(rgb)[..., 2], expected, rtol=0, atol=BATCH_TOLERANCE)
+    result = api.rgb_to_lightness_batch(rgb.astype(numpy.float32))
+    assert result.dtype == numpy.float32
+    npt.assert_allclose(result, expected, rtol=0, atol=0.001)
+    bgra = numpy.concatenate([rgb[:, ::-1], numpy.ones((500, 1))], axis=1)
+    npt.assert_allclose(api.rgb_to_lightness_batch(bgra, layout='bgra'), expected,
+                        rtol=0, atol=BATCH_TOLERANCE)
+
+def test_lightness_out_and_planar():
+    rgb = sample_pixels('rgb', 500).reshape(20, 25, 3)
+    expected = api.rgb_to_lightness_batch(rgb)
+    assert expected.shape == (20, 25)
+    planar = numpy.ascontiguousarray(numpy.moveaxis(rgb, -1, 0))
+    npt.assert_array_equal(api.rgb_to_lightness_batch(planar, planar=True), expected)
+    for out in (numpy.empty((20, 25)), numpy.empty((25, 20)).T):
+        assert api.rgb_to_lightness_batch(rgb, out=out) is out
+        npt.assert_array_equal(out, expected)
+        out[...] = 0.0
+        assert api.rgb_to_lightness_batch(planar, out=out, planar=True) is out
+        npt.assert_array_equal(out, expected)
+    npt.assert_raises(ValueError, api.rgb_to_lightness_batch, rgb, out=numpy.empty((20, 25, 1)))
+
+def test_rgb8_lightness_is_an_alias():
+    pixels = (sample_pixels('rgb', 500) * 255.0).astype(numpy.uint8)
+    expected = api.rgb_to_lightness_batch(pixels)
+    result = api.rgb8_to_lightness_batch(pixels)
+    assert result.dtype == expected.dtype
+    npt.assert_array_equal(result, expected)
+    npt.assert_allclose(expected, api.rgb_to_lightness_batch(pixels / 255.0),
+                        rtol=0, atol=BATCH_TOLERANCE)
+    npt.assert_raises(TypeError, api.rgb8_to_lightness_batch, pixels / 255.0)
+
+# [user-024] Intermediate spaces
+
+def test_stages_compose_to_full_conversions():
+    rgb = sample_pixels('rgb', 500)
+    lch = api.luv_to_lch_batch(api.xyz_to_luv_batch(api.rgb_to_xyz_batch(rgb)))
+    npt.assert_allclose(api.lch_to_hsluv_batch(lch), api.rgb_to_hsluv_batch(rgb),
+                        rtol=0, atol=BATCH_TOLERANCE)
+    npt.assert_allclose(api.lch_to_hpluv_batch(lch), api.rgb_to_hpluv_batch(rgb),
+                        rtol=0, atol=BATCH_TOLERANCE)
+    hsl = sample_pixels('hsl', 500)
+    for to_lch, to_rgb in ((api.hsluv_to_lch_batch, api.hsluv_to_rgb_batch),
+                           (api.hpluv_to_lch_batch, api.hpluv_to_rgb_batch)):
+        xyz = api.luv_to_xyz_batch(api.lch_to_luv_batch(to_lch(hsl)))
+        npt.assert_allclose(api.xyz_to_rgb_batch(xyz), to_rgb(hsl), rtol=0, atol=BATCH_TOLERANCE)
+
+def test_stages_round_trip():
+    rgb = sample_pixels('rgb', 500)
+    xyz = api.rgb_to_xyz_batch(rgb)
+    npt.assert_allclose(api.xyz_to_rgb_batch(xyz), rgb, rtol=0, atol=BATCH_TOLERANCE)
+    luv = api.xyz_to_luv_batch(xyz)
+    npt.assert_allclose(api.luv_to_xyz_batch(luv), xyz, rtol=0, atol=BATCH_TOLERANCE)
+    lch = api.luv_to_lch_batch(luv)
+    npt.assert_allclose(api.lch_to_luv_batch(lch), luv, rtol=0, atol=BATCH_TOLERANCE)
+    planar = numpy.ascontiguousarray(luv.T)
+    npt.assert_array_equal(api.luv_to_lch_batch(planar, planar=True), lch.T)
+    assert api.luv_to_lch_batch(planar, inplace=True, planar=True) is planar
+    npt.assert_array_equal(planar, lch.T)
+    gray = api.luv_to_lch_batch(api.xyz_to_luv_batch(api.rgb_to_xyz_batch([[0.5, 0.5, 0.5]])))
+    assert abs(gray[0, 1]) < 0.00000001 and gray[0, 2] == 0.0
+
+# [user-025] Direct HSLuv <-> HPLuv conversion
+
+def test_hsluv_hpluv_match_conversion_through_rgb():
+    # Away from the poles and grays, where the hue through RGB is not determined:
+    hsl = sample_pixels('hsl', 500) * (1.0, 0.9, 0.9) + (0.0, 5.0, 5.0)
+    hpl = api.hsluv_to_hpluv_batch(hsl)
+    through_rgb = api.rgb_to_hpluv_batch(api.hsluv_to_rgb_batch(hsl))
+    npt.assert_allclose(hpl[:, 1:], through_rgb[:, 1:], rtol=0, atol=0.000001)
+    npt.assert_allclose((hpl[:, 0] - through_rgb[:, 0] + 180.0) % 360.0, 180.0,
+                        rtol=0, atol=0.000001)
+    npt.assert_allclose(hpl[:, 0], hsl[:, 0], rtol=0, atol=BATCH_TOLERANCE)
+    npt.assert_allclose(hpl[:, 2], hsl[:, 2], rtol=0, atol=BATCH_TOLERANCE)
+    pastel = api.rgb_to_hpluv_batch(sample_pixels('rgb', 500))
+    npt.assert_allclose(api.hpluv_to_hsluv_batch(pastel),
+                        api.rgb_to_hsluv_batch(api.hpluv_to_rgb_batch(pastel)),
+                        rtol=0, atol=0.000001)
+
+def test_hsluv_hpluv_round_trip():
+    hsl = sample_pixels('hsl', 500) * (1.0, 1.0, 0.9) + (0.0, 0.0, 5.0)
+    hpl = api.hsluv_to_hpluv_batch(hsl)
+    assert (hpl[:, 1] > 100.0).any()
+    npt.assert_allclose(api.hpluv_to_hsluv_batch(hpl), hsl, rtol=0, atol=0.000001)
+    out = numpy.empty_like(hsl)
+    assert api.hpluv_to_hsluv_batch(hpl, out=out) is out
+    npt.assert_allclose(out, hsl, rtol=0, atol=0.000001)
+    planar = numpy.ascontiguousarray(hsl.T)
+    npt.assert_array_equal(api.hsluv_to_hpluv_batch(planar, planar=True), hpl.T)
@@ -3,8 +3,13 @@
 #include "hsluv.h"
 #include "snapshot.h"
 
+#include <stdlib.h>
+#include <string.h>
+
 
 #define MAX_DIFF            0.00000001
+#define MAX_DIFF_FLOAT      0.0001
+#define MAX_DIFF_FLOAT_RGB  0.00001
 
 #define ABS(x)              ((x) >= 0 ? (x) : -(x))
 
@@ -13,6 +18,16 @@
                     "%s: Mismatch in channel '" #a "' (%f versus %f).", \
                      snapshot[i].hex_str, (double)a, (double)b)
 
+#define CHECK_EQ_FLOAT(a, b)                                            \
+        TEST_CHECK_(ABS((a) - (b)) < MAX_DIFF_FLOAT,                    \
+                    "%s: Mismatch in channel '" #a "' (%f versus %f).", \
+                     snapshot[i].hex_str, (double)a, (double)b)
+
+#define CHECK_EQ_FLOAT_RGB(a, b)                                        \
+        TEST_CHECK_(ABS((a) - (b)) < MAX_DIFF_FLOAT_RGB,                \
+                    "%s: Mismatch in channel '" #a "' (%f versus %f).", \
+                     snapshot[i].hex_str, (double)a, (double)b)
+
 
 static void
 test_hsluv2rgb(void)
@@ -78,11 +93,804 @@ test_rgb2hpluv(void)
     }
 }
 
+static void
+test_bounds_cache(void)
+{
+    int i;
+
+    for(i = 0; i < snapshot_n; i++) {
+        double ref[12];
+        double out[12];
+        int j;
+
+        hsluv_set_flags(0);
+        hsluv2rgb(snapshot[i].hsluv_h, snapshot[i].hsluv_s, snapshot[i].hsluv_l, &ref[0], &ref[1], &ref[2]);
+        rgb2hsluv(snapshot[i].rgb_r, snapshot[i].rgb_g, snapshot[i].rgb_b, &ref[3], &ref[4], &ref[5]);
+        hpluv2rgb(snapshot[i].hpluv_h, snapshot[i].hpluv_s, snapshot[i].hpluv_l, &ref[6], &ref[7], &ref[8]);
+        rgb2hpluv(snapshot[i].rgb_r, snapshot[i].rgb_g, snapshot[i].rgb_b, &ref[9], &ref[10], &ref[11]);
+
+        /* Twice: once to fill the cache, once to hit it. */
+        hsluv_set_flags(HSLUV_CACHE_BOUNDS);
+        for(j = 0; j < 2; j++) {
+            hsluv2rgb(snapshot[i].hsluv_h, snapshot[i].hsluv_s, snapshot[i].hsluv_l, &out[0], &out[1], &out[2]);
+            rgb2hsluv(snapshot[i].rgb_r, snapshot[i].rgb_g, snapshot[i].rgb_b, &out[3], &out[4], &out[5]);
+            hpluv2rgb(snapshot[i].hpluv_h, snapshot[i].hpluv_s, snapshot[i].hpluv_l, &out[6], &out[7], &out[8]);
+            rgb2hpluv(snapshot[i].rgb_r, snapshot[i].rgb_g, snapshot[i].rgb_b, &out[9], &out[10], &out[11]);
+
+            TEST_CHECK_(memcmp(ref, out, sizeof(ref)) == 0,
+                        "%s: Cached bounds changed the result.", snapshot[i].hex_str);
+        }
+    }
+
+    hsluv_set_flags(0);
+}
+
+static void
+test_safe_chroma_table(void)
+{
+    int i;
+
+    hsluv_set_flags(HSLUV_SAFE_CHROMA_TABLE);
+
+    for(i = 0; i < snapshot_n; i++) {
+        double r, g, b;
+        double h, s, l;
+        double tolerance = (snapshot[i].hpluv_l < 99.5 ? 0.000003 : 0.0002) * snapshot[i].hpluv_s;
+
+        hpluv2rgb(snapshot[i].hpluv_h, snapshot[i].hpluv_s, snapshot[i].hpluv_l, &r, &g, &b);
+
+        TEST_CHECK_(ABS(r - snapshot[i].rgb_r) < 0.000005  &&
+                    ABS(g - snapshot[i].rgb_g) < 0.000005  &&
+                    ABS(b - snapshot[i].rgb_b) < 0.000005,
+                    "%s: Interpolated safe chroma is too far off in RGB.", snapshot[i].hex_str);
+
+        rgb2hpluv(snapshot[i].rgb_r, snapshot[i].rgb_g, snapshot[i].rgb_b, &h, &s, &l);
+
+        CHECK_EQ(h, snapshot[i].hpluv_h);
+        CHECK_EQ(l, snapshot[i].hpluv_l);
+        TEST_CHECK_(ABS(s - snapshot[i].hpluv_s) <= tolerance + MAX_DIFF,
+                    "%s: Interpolated safe chroma is too far off in saturation (%f versus %f).",
+                    snapshot[i].hex_str, s, snapshot[i].hpluv_s);
+    }
+
+    hsluv_set_flags(0);
+}
+
+static void
+test_float(void)
+{
+    int i;
+
+    for(i = 0; i < snapshot_n; i++) {
+        float r, g, b;
+        float h, s, l;
+
+        hsluv2rgbf(snapshot[i].hsluv_h, snapshot[i].hsluv_s, snapshot[i].hsluv_l, &r, &g, &b);
+
+        CHECK_EQ_FLOAT_RGB(r, snapshot[i].rgb_r);
+        CHECK_EQ_FLOAT_RGB(g, snapshot[i].rgb_g);
+        CHECK_EQ_FLOAT_RGB(b, snapshot[i].rgb_b);
+
+        rgb2hsluvf(snapshot[i].rgb_r, snapshot[i].rgb_g, snapshot[i].rgb_b, &h, &s, &l);
+
+        CHECK_EQ_FLOAT(h, snapshot[i].hsluv_h);
+        CHECK_EQ_FLOAT(s, snapshot[i].hsluv_s);
+        CHECK_EQ_FLOAT(l, snapshot[i].hsluv_l);
+
+        hpluv2rgbf(snapshot[i].hpluv_h, snapshot[i].hpluv_s, snapshot[i].hpluv_l, &r, &g, &b);
+
+        CHECK_EQ_FLOAT_RGB(r, snapshot[i].rgb_r);
+        CHECK_EQ_FLOAT_RGB(g, snapshot[i].rgb_g);
+        CHECK_EQ_FLOAT_RGB(b, snapshot[i].rgb_b);
+
+        rgb2hpluvf(snapshot[i].rgb_r, snapshot[i].rgb_g, snapshot[i].rgb_b, &h, &s, &l);
+
+        CHECK_EQ_FLOAT(h, snapshot[i].hpluv_h);
+        CHECK_EQ_FLOAT(s, snapshot[i].hpluv_s);
+        CHECK_EQ_FLOAT(l, snapshot[i].hpluv_l);
+    }
+}
+
+static void
+check_batch(void)
+{
+    double* hsl = malloc(3 * snapshot_n * sizeof(double));
+    double* hpl = malloc(3 * snapshot_n * sizeof(double));
+    double* rgb = malloc(3 * snapshot_n * sizeof(double));
+    double edges[3 * 3 * 5];
+    double results[3 * 3 * 5];
+    int i;
+
+    TEST_CHECK(hsl != NULL  &&  hpl != NULL  &&  rgb != NULL);
+
+    for(i = 0; i < snapshot_n; i++) {
+        rgb[3 * i] = snapshot[i].rgb_r;
+        rgb[3 * i + 1] = snapshot[i].rgb_g;
+        rgb[3 * i + 2] = snapshot[i].rgb_b;
+    }
+    rgb2hsluv_batch(rgb, hsl, snapshot_n);
+    rgb2hpluv_batch(rgb, hpl, snapshot_n);
+
+    for(i = 0; i < snapshot_n; i++) {
+        CHECK_EQ(hsl[3 * i], snapshot[i].hsluv_h);
+        CHECK_EQ(hsl[3 * i + 1], snapshot[i].hsluv_s);
+        CHECK_EQ(hsl[3 * i + 2], snapshot[i].hsluv_l);
+        CHECK_EQ(hpl[3 * i], snapshot[i].hpluv_h);
+        CHECK_EQ(hpl[3 * i + 1], snapshot[i].hpluv_s);
+        CHECK_EQ(hpl[3 * i + 2], snapshot[i].hpluv_l);
+    }
+
+    /* In place */
+    hsluv2rgb_batch(hsl, hsl, snapshot_n);
+    hpluv2rgb_batch(hpl, hpl, snapshot_n);
+
+    for(i = 0; i < snapshot_n; i++) {
+        CHECK_EQ(hsl[3 * i], snapshot[i].rgb_r);
+        CHECK_EQ(hsl[3 * i + 1], snapshot[i].rgb_g);
+        CHECK_EQ(hsl[3 * i + 2], snapshot[i].rgb_b);
+        CHECK_EQ(hpl[3 * i], snapshot[i].rgb_r);
+        CHECK_EQ(hpl[3 * i + 1], snapshot[i].rgb_g);
+        CHECK_EQ(hpl[3 * i + 2], snapshot[i].rgb_b);
+    }
+
+    /* Grays, black and white, which take special cases in every stage */
+    for(i = 0; i < 15; i++) {
+        edges[3 * i] = (i % 3) * 135.0;
+        edges[3 * i + 1] = (i / 5) * 50.0;
+        edges[3 * i + 2] = (i % 5) * 25.0;
+    }
+    hsluv2rgb_batch(edges, results, 15);
+    for(i = 0; i < 15; i++) {
+        double r, g, b;
+
+        hsluv2rgb(edges[3 * i], edges[3 * i + 1], edges[3 * i + 2], &r, &g, &b);
+        TEST_CHECK_(ABS(r - results[3 * i]) < MAX_DIFF  &&  ABS(g - results[3 * i + 1]) < MAX_DIFF  &&
+                    ABS(b - results[3 * i + 2]) < MAX_DIFF,
+                    "HSLuv (%f, %f, %f): Batch result differs.", edges[3 * i], edges[3 * i + 1], edges[3 * i + 2]);
+    }
+    for(i = 0; i < 15; i++) {
+        edges[3 * i] = edges[3 * i + 1] = edges[3 * i + 2] = (i % 5) * 0.25;
+    }
+    rgb2hsluv_batch(edges, results, 15);
+    for(i = 0; i < 15; i++) {
+        double h, s, l;
+
+        rgb2hsluv(edges[3 * i], edges[3 * i + 1], edges[3 * i + 2], &h, &s, &l);
+        TEST_CHECK_(ABS(h - results[3 * i]) < MAX_DIFF  &&  ABS(s - results[3 * i + 1]) < MAX_DIFF  &&
+                    ABS(l - results[3 * i + 2]) < MAX_DIFF,
+                    "RGB (%f, %f, %f): Batch result differs.", edges[3 * i], edges[3 * i + 1], edges[3 * i + 2]);
+    }
+
+    /* Blocks of nothing but grays, which take closed forms */
+    for(i = 0; i < snapshot_n; i++) {
+        rgb[3 * i] = rgb[3 * i + 1] = rgb[3 * i + 2] = (i % 256) / 255.0;
+        hsl[3 * i] = (i % 36) * 10.0;
+        hsl[3 * i + 1] = (i % 3 == 0) ? 0.0 : 50.0;
+        hsl[3 * i + 2] = (i % 3 == 0) ? (i % 101) : (i % 3 == 1) ? 0.0 : 100.0;
+    }
+    rgb2hsluv_batch(rgb, hpl, snapshot_n);
+    for(i = 0; i < snapshot_n; i++) {
+        double h, s, l;
+
+        rgb2hsluv(rgb[3 * i], rgb[3 * i + 1], rgb[3 * i + 2], &h, &s, &l);
+        TEST_CHECK_(ABS(h - hpl[3 * i]) < MAX_DIFF  &&  ABS(s - hpl[3 * i + 1]) < MAX_DIFF  &&
+                    ABS(l - hpl[3 * i + 2]) < MAX_DIFF,
+                    "RGB (%f, %f, %f): Gray batch result differs.", rgb[3 * i], rgb[3 * i + 1], rgb[3 * i + 2]);
+    }
+    rgb2hpluv_batch(rgb, hpl, snapshot_n);
+    for(i = 0; i < snapshot_n; i++) {
+        double h, s, l;
+
+        rgb2hpluv(rgb[3 * i], rgb[3 * i + 1], rgb[3 * i + 2], &h, &s, &l);
+        TEST_CHECK_(ABS(h - hpl[3 * i]) < MAX_DIFF  &&  ABS(s - hpl[3 * i + 1]) < MAX_DIFF  &&
+                    ABS(l - hpl[3 * i + 2]) < MAX_DIFF,
+                    "RGB (%f, %f, %f): Gray batch result differs.", rgb[3 * i], rgb[3 * i + 1], rgb[3 * i + 2]);
+    }
+    hsluv2rgb_batch(hsl, rgb, snapshot_n);
+    hpluv2rgb_batch(hsl, hpl, snapshot_n);
+    for(i = 0; i < snapshot_n; i++) {
+        double r, g, b;
+
+        hsluv2rgb(hsl[3 * i], hsl[3 * i + 1], hsl[3 * i + 2], &r, &g, &b);
+        TEST_CHECK_(ABS(r - rgb[3 * i]) < MAX_DIFF  &&  ABS(g - rgb[3 * i + 1]) < MAX_DIFF  &&
+                    ABS(b - rgb[3 * i + 2]) < MAX_DIFF,
+                    "HSLuv (%f, %f, %f): Gray batch result differs.", hsl[3 * i], hsl[3 * i + 1], hsl[3 * i + 2]);
+        hpluv2rgb(hsl[3 * i], hsl[3 * i + 1], hsl[3 * i + 2], &r, &g, &b);
+        TEST_CHECK_(ABS(r - hpl[3 * i]) < MAX_DIFF  &&  ABS(g - hpl[3 * i + 1]) < MAX_DIFF  &&
+                    ABS(b - hpl[3 * i + 2]) < MAX_DIFF,
+                    "HPLuv (%f, %f, %f): Gray batch result differs.", hsl[3 * i], hsl[3 * i + 1], hsl[3 * i + 2]);
+    }
+
+    /* Blocks of nothing but negative saturations, which are no grays */
+    for(i = 0; i < snapshot_n; i++) {
+        hsl[3 * i] = (i % 36) * 10.0;
+        hsl[3 * i + 1] = -10.0 * (i % 5 + 1);
+        hsl[3 * i + 2] = 20.0 + (i % 7) * 10.0;
+    }
+    hsluv2rgb_batch(hsl, rgb, snapshot_n);
+    hpluv2rgb_batch(hsl, hpl, snapshot_n);
+    for(i = 0; i < snapshot_n; i++) {
+        double r, g, b;
+
+        hsluv2rgb(hsl[3 * i], hsl[3 * i + 1], hsl[3 * i + 2], &r, &g, &b);
+        TEST_CHECK_(ABS(r - rgb[3 * i]) < MAX_DIFF  &&  ABS(g - rgb[3 * i + 1]) < MAX_DIFF  &&
+                    ABS(b - rgb[3 * i + 2]) < MAX_DIFF,
+                    "HSLuv (%f, %f, %f): Negative saturation batch result differs.", hsl[3 * i], hsl[3 * i + 1], hsl[3 * i + 2]);
+        hpluv2rgb(hsl[3 * i], hsl[3 * i + 1], hsl[3 * i + 2], &r, &g, &b);
+        TEST_CHECK_(ABS(r - hpl[3 * i]) < MAX_DIFF  &&  ABS(g - hpl[3 * i + 1]) < MAX_DIFF  &&
+                    ABS(b - hpl[3 * i + 2]) < MAX_DIFF,
+                    "HPLuv (%f, %f, %f): Negative saturation batch result differs.", hsl[3 * i], hsl[3 * i + 1], hsl[3 * i + 2]);
+    }
+
+    free(hsl);
+    free(hpl);
+    free(rgb);
+}
+
+static void
+test_batch(void)
+{
+    check_batch();
+}
+
+static void
+test_batch_isa(void)
+{
+    static const char* isas[] = { "baseline", "avx2", "avx512" };
+    int i;
+
+    TEST_CHECK(hsluv_batch_set_isa("baseline"));
+    TEST_CHECK(!hsluv_batch_set_isa("no-such-isa"));
+    TEST_CHECK(strcmp(hsluv_batch_isa(), "baseline") == 0);
+
+    for(i = 0; i < 3; i++) {
+        if(!hsluv_batch_set_isa(isas[i]))
+            continue;
+        TEST_MSG("Instruction set: %s", isas[i]);
+        check_batch();
+    }
+
+    TEST_CHECK(hsluv_batch_set_isa(NULL));
+}
+
+static void
+test_batch_float(void)
+{
+    float rgb[3];
+    float hsl[3];
+    float hpl[3];
+    int i;
+
+    for(i = 0; i < snapshot_n; i++) {
+        rgb[0] = snapshot[i].rgb_r;
+        rgb[1] = snapshot[i].rgb_g;
+        rgb[2] = snapshot[i].rgb_b;
+        rgb2hsluvf_batch(rgb, hsl, 1);
+        rgb2hpluvf_batch(rgb, hpl, 1);
+
+        CHECK_EQ_FLOAT(hsl[0], snapshot[i].hsluv_h);
+        CHECK_EQ_FLOAT(hsl[1], snapshot[i].hsluv_s);
+        CHECK_EQ_FLOAT(hsl[2], snapshot[i].hsluv_l);
+        CHECK_EQ_FLOAT(hpl[0], snapshot[i].hpluv_h);
+        CHECK_EQ_FLOAT(hpl[1], snapshot[i].hpluv_s);
+        CHECK_EQ_FLOAT(hpl[2], snapshot[i].hpluv_l);
+
+        hsl[0] = snapshot[i].hsluv_h;
+        hsl[1] = snapshot[i].hsluv_s;
+        hsl[2] = snapshot[i].hsluv_l;
+        hsluv2rgbf_batch(hsl, rgb, 1);
+
+        CHECK_EQ_FLOAT_RGB(rgb[0], snapshot[i].rgb_r);
+        CHECK_EQ_FLOAT_RGB(rgb[1], snapshot[i].rgb_g);
+        CHECK_EQ_FLOAT_RGB(rgb[2], snapshot[i].rgb_b);
+
+        hpl[0] = snapshot[i].hpluv_h;
+        hpl[1] = snapshot[i].hpluv_s;
+        hpl[2] = snapshot[i].hpluv_l;
+        hpluv2rgbf_batch(hpl, rgb, 1);
+
+        CHECK_EQ_FLOAT_RGB(rgb[0], snapshot[i].rgb_r);
+        CHECK_EQ_FLOAT_RGB(rgb[1], snapshot[i].rgb_g);
+        CHECK_EQ_FLOAT_RGB(rgb[2], snapshot[i].rgb_b);
+    }
+}
+
+static void
+test_batch_integer(void)
+{
+    unsigned char rgb8[3 * 256];
+    unsigned short rgb16[3 * 256];
+    unsigned short hsl16[3 * 256];
+    double hsl[3 * 256];
+    hsluv_pixels in;
+    hsluv_pixels out;
+    int i;
+
+    for(i = 0; i < 256; i++) {
+        rgb8[3 * i] = (unsigned char) i;
+        rgb8[3 * i + 1] = (unsigned char) (255 - i);
+        rgb8[3 * i + 2] = (unsigned char) (i * 7);
+        rgb16[3 * i] = (unsigned short) (i * 257);
+        rgb16[3 * i + 1] = (unsigned short) (i * 101);
+        rgb16[3 * i + 2] = (unsigned short) (65535 - i * 13);
+    }
+
+    memset(&in, 0, sizeof(in));
+    memset(&out, 0, sizeof(out));
+
+    /* 8-bit RGB to HSLuv and back */
+    in.data = rgb8;
+    in.type = HSLUV_UINT8;
+    out.data = hsl;
+    out.type = HSLUV_FLOAT64;
+    rgb2hsluv_pixels(&in, &out, 256);
+    for(i = 0; i < 256; i++) {
+        double h, s, l;
+
+        rgb2hsluv(rgb8[3 * i] / 255.0, rgb8[3 * i + 1] / 255.0, rgb8[3 * i + 2] / 255.0, &h, &s, &l);
+        TEST_CHECK_(ABS(h - hsl[3 * i]) < MAX_DIFF  &&  ABS(s - hsl[3 * i + 1]) < MAX_DIFF  &&
+                    ABS(l - hsl[3 * i + 2]) < MAX_DIFF,
+                    "RGB8 (%d, %d, %d): Batch result differs.", rgb8[3 * i], rgb8[3 * i + 1], rgb8[3 * i + 2]);
+    }
+    memset(rgb8, 0, sizeof(rgb8));
+    in.data = hsl;
+    in.type = HSLUV_FLOAT64;
+    out.data = rgb8;
+    out.type = HSLUV_UINT8;
+    hsluv2rgb_pixels(&in, &out, 256);
+    for(i = 0; i < 256; i++) {
+        TEST_CHECK_(rgb8[3 * i] == i  &&  rgb8[3 * i + 1] == 255 - i  &&  rgb8[3 * i + 2] == ((i * 7) & 0xFF),
+                    "RGB8 (%d, %d, %d): Round trip differs.", i, 255 - i, (i * 7) & 0xFF);
+    }
+
+    /* 16-bit RGB to HPLuv and back, through 16-bit HPLuv rounded to integers */
+    in.data = rgb16;
+    in.type = HSLUV_UINT16;
+    out.data = hsl16;
+    out.type = HSLUV_UINT16;
+    rgb2hpluv_pixels(&in, &out, 256);
+    for(i = 0; i < 256; i++) {
+        double h, s, l;
+
+        rgb2hpluv(rgb16[3 * i] / 65535.0, rgb16[3 * i + 1] / 65535.0, rgb16[3 * i + 2] / 65535.0, &h, &s, &l);
+        TEST_CHECK_(ABS(h - hsl16[3 * i]) <= 0.5  &&  ABS(s - hsl16[3 * i + 1]) <= 0.5  &&
+                    ABS(l - hsl16[3 * i + 2]) <= 0.5,
+                    "RGB16 (%d, %d, %d): Batch result differs.", rgb16[3 * i], rgb16[3 * i + 1], rgb16[3 * i + 2]);
+    }
+    in.data = hsl16;
+    in.type = HSLUV_UINT16;
+    out.data = rgb16;
+    hpluv2rgb_pixels(&in, &out, 256);
+    for(i = 0; i < 256; i++) {
+        double r, g, b;
+
+        hpluv2rgb(hsl16[3 * i], hsl16[3 * i + 1], hsl16[3 * i + 2], &r, &g, &b);
+        r = r < 0.0 ? 0.0 : (r > 1.0 ? 1.0 : r);
+        g = g < 0.0 ? 0.0 : (g > 1.0 ? 1.0 : g);
+        b = b < 0.0 ? 0.0 : (b > 1.0 ? 1.0 : b);
+        TEST_CHECK_(ABS(r * 65535.0 - rgb16[3 * i]) <= 0.5  &&  ABS(g * 65535.0 - rgb16[3 * i + 1]) <= 0.5  &&
+                    ABS(b * 65535.0 - rgb16[3 * i + 2]) <= 0.5,
+                    "HPLuv16 (%d, %d, %d): Batch result differs.", hsl16[3 * i], hsl16[3 * i + 1], hsl16[3 * i + 2]);
+    }
+}
+
+static void
+test_batch_layout(void)
+{
+    unsigned char bgra[4 * 256];
+    unsigned char argb[4 * 256];
+    double hsla[4 * 256];
+    float bgr[3 * 256];
+    hsluv_pixels in;
+    hsluv_pixels out;
+    int i;
+
+    for(i = 0; i < 256; i++) {
+        bgra[4 * i] = (unsigned char) (i * 3);
+        bgra[4 * i + 1] = (unsigned char) (255 - i);
+        bgra[4 * i + 2] = (unsigned char) (i * 7);
+        bgra[4 * i + 3] = (unsigned char) i;
+    }
+    memset(&in, 0, sizeof(in));
+    memset(&out, 0, sizeof(out));
+
+    /* Straight BGRA to HSLuv with alpha, then to ARGB */
+    in.data = bgra;
+    in.type = HSLUV_UINT8;
+    in.layout = HSLUV_BGRA;
+    out.data = hsla;
+    out.type = HSLUV_FLOAT64;
+    out.layout = HSLUV_RGBA;
+    rgb2hsluv_pixels(&in, &out, 256);
+    for(i = 0; i < 256; i++) {
+        double h, s, l;
+
+        rgb2hsluv(bgra[4 * i + 2] / 255.0, bgra[4 * i + 1] / 255.0, bgra[4 * i] / 255.0, &h, &s, &l);
+        TEST_CHECK_(ABS(h - hsla[4 * i]) < MAX_DIFF  &&  ABS(s - hsla[4 * i + 1]) < MAX_DIFF  &&
+                    ABS(l - hsla[4 * i + 2]) < MAX_DIFF  &&  ABS(i / 255.0 - hsla[4 * i + 3]) < MAX_DIFF,
+                    "BGRA (%d, %d, %d, %d): Batch result differs.", bgra[4 * i], bgra[4 * i + 1], bgra[4 * i + 2], i);
+    }
+    in.data = hsla;
+    in.type = HSLUV_FLOAT64;
+    in.layout = HSLUV_RGBA;
+    out.data = argb;
+    out.type = HSLUV_UINT8;
+    out.layout = HSLUV_ARGB;
+    hsluv2rgb_pixels(&in, &out, 256);
+    for(i = 0; i < 256; i++) {
+        TEST_CHECK_(argb[4 * i] == bgra[4 * i + 3]  &&  argb[4 * i + 1] == bgra[4 * i + 2]  &&
+                    argb[4 * i + 2] == bgra[4 * i + 1]  &&  argb[4 * i + 3] == bgra[4 * i],
+                    "BGRA (%d, %d, %d, %d): Round trip differs.", bgra[4 * i], bgra[4 * i + 1], bgra[4 * i + 2], i);
+    }
+
+    /* Premultiplied: the color is divided by alpha, and multiplied back */
+    for(i = 0; i < 256; i++) {
+        hsla[4 * i] = i * 1.4;
+        hsla[4 * i + 1] = 80.0;
+        hsla[4 * i + 2] = 60.0;
+        hsla[4 * i + 3] = i / 255.0;
+    }
+    in.data = hsla;
+    out.data = hsla;
+    out.type = HSLUV_FLOAT64;
+    out.layout = HSLUV_RGBA | HSLUV_PREMULTIPLIED;
+    hsluv2rgb_pixels(&in, &out, 256);
+    for(i = 0; i < 256; i++) {
+        double r, g, b;
+        double alpha = i / 255.0;
+
+        hsluv2rgb(i * 1.4, 80.0, 60.0, &r, &g, &b);
+        TEST_CHECK_(ABS(r * alpha - hsla[4 * i]) < MAX_DIFF  &&  ABS(g * alpha - hsla[4 * i + 1]) < MAX_DIFF  &&
+                    ABS(b * alpha - hsla[4 * i + 2]) < MAX_DIFF  &&  hsla[4 * i + 3] == alpha,
+                    "HSLuv (%f, 80, 60, %f): Premultiplied result differs.", i * 1.4, alpha);
+    }
+    in.layout = HSLUV_RGBA | HSLUV_PREMULTIPLIED;
+    out.layout = HSLUV_RGBA;
+    rgb2hsluv_pixels(&in, &out, 256);
+    for(i = 1; i < 256; i++) {
+        TEST_CHECK_(ABS(i * 1.4 - hsla[4 * i]) < 0.000001  &&  ABS(80.0 - hsla[4 * i + 1]) < 0.000001  &&
+                    ABS(60.0 - hsla[4 * i + 2]) < 0.000001,
+                    "HSLuv (%f, 80, 60, %f): Premultiplied round trip differs.", i * 1.4, i / 255.0);
+    }
+    TEST_CHECK(hsla[0] == 0.0  &&  hsla[1] == 0.0  &&  hsla[2] == 0.0);
+
+    /* No alpha in the input: HSLuv to BGR float */
+    for(i = 0; i < 256; i++) {
+        hsla[3 * i] = i * 1.4;
+        hsla[3 * i + 1] = 100.0;
+        hsla[3 * i + 2] = 50.0;
+    }
+    in.layout = HSLUV_RGB;
+    out.data = bgr;
+    out.type = HSLUV_FLOAT32;
+    out.layout = HSLUV_BGR;
+    hsluv2rgb_pixels(&in, &out, 256);
+    for(i = 0; i < 256; i++) {
+        double r, g, b;
+
+        hsluv2rgb(i * 1.4, 100.0, 50.0, &r, &g, &b);
+        TEST_CHECK_(ABS(r - bgr[3 * i + 2]) < 0.000001  &&  ABS(g - bgr[3 * i + 1]) < 0.000001  &&
+                    ABS(b - bgr[3 * i]) < 0.000001,
+                    "HSLuv (%f, 100, 50): BGR result differs.", i * 1.4);
+    }
+}
+
+static void
+test_batch_planar(void)
+{
+    unsigned short planes[3][100];
+    unsigned short packed[3 * 100];
+    float hsl_planes[3][100];
+    float hsl_packed[3 * 100];
+    unsigned short back[3][100];
+    hsluv_pixels in;
+    hsluv_pixels out;
+    int i;
+
+    for(i = 0; i < 100; i++) {
+        planes[0][i] = packed[3 * i] = (unsigned short) (i * 655);
+        planes[1][i] = packed[3 * i + 1] = (unsigned short) (65535 - i * 300);
+        planes[2][i] = packed[3 * i + 2] = (unsigned short) (i * i * 6);
+    }
+    memset(&in, 0, sizeof(in));
+    memset(&out, 0, sizeof(out));
+
+    /* Planar 16-bit RGB to planar float HSLuv, against packed */
+    in.data = packed;
+    in.type = HSLUV_UINT16;
+    out.data = hsl_packed;
+    out.type = HSLUV_FLOAT32;
+    rgb2hsluv_pixels(&in, &out, 100);
+    in.data = planes;
+    in.pixel_stride = sizeof(planes[0][0]);
+    in.channel_stride = sizeof(planes[0]);
+    out.data = hsl_planes;
+    out.pixel_stride = sizeof(hsl_planes[0][0]);
+    out.channel_stride = sizeof(hsl_planes[0]);
+    rgb2hsluv_pixels(&in, &out, 100);
+    for(i = 0; i < 100; i++) {
+        TEST_CHECK_(hsl_planes[0][i] == hsl_packed[3 * i]  &&  hsl_planes[1][i] == hsl_packed[3 * i + 1]  &&
+                    hsl_planes[2][i] == hsl_packed[3 * i + 2],
+                    "RGB16 (%d, %d, %d): Planar result differs.", packed[3 * i], packed[3 * i + 1], packed[3 * i + 2]);
+    }
+
+    /* And back, in reverse order: planes of blue, green, red */
+    in.data = hsl_planes;
+    in.type = HSLUV_FLOAT32;
+    in.pixel_stride = sizeof(hsl_planes[0][0]);
+    in.channel_stride = sizeof(hsl_planes[0]);
+    out.data = back;
+    out.type = HSLUV_UINT16;
+    out.layout = HSLUV_BGR;
+    out.pixel_stride = sizeof(back[0][0]);
+    out.channel_stride = sizeof(back[0]);
+    hsluv2rgb_pixels(&in, &out, 100);
+    for(i = 0; i < 100; i++) {
+        TEST_CHECK_(ABS(back[2][i] - planes[0][i]) <= 2  &&  ABS(back[1][i] - planes[1][i]) <= 2  &&
+                    ABS(back[0][i] - planes[2][i]) <= 2,
+                    "RGB16 (%d, %d, %d): Planar round trip differs.", planes[0][i], planes[1][i], planes[2][i]);
+    }
+}
+
+static void
+test_batch_lightness(void)
+{
+    unsigned char rgb8[4 * 256];
+    double rgb[3 * 256];
+    double l[256];
+    float lf[2 * 256];
+    hsluv_pixels in;
+    hsluv_pixels out;
+    int i;
+
+    for(i = 0; i < 256; i++) {
+        rgb8[4 * i] = rgb8[4 * i + 3] = (unsigned char) i;
+        rgb8[4 * i + 1] = (unsigned char) (255 - i);
+        rgb8[4 * i + 2] = (unsigned char) (i * 37);
+        rgb[3 * i] = i / 255.0;
+        rgb[3 * i + 1] = (255 - i) / 255.0;
+        rgb[3 * i + 2] = (unsigned char) (i * 37) / 255.0;
+    }
+    memset(&in, 0, sizeof(in));
+    memset(&out, 0, sizeof(out));
+
+    /* Doubles, against the single-pixel conversion */
+    in.data = rgb;
+    out.data = l;
+    rgb2lightness_pixels(&in, &out, 256);
+    for(i = 0; i < 256; i++) {
+        double h, s, ref;
+
+        rgb2hsluv(rgb[3 * i], rgb[3 * i + 1], rgb[3 * i + 2], &h, &s, &ref);
+        TEST_CHECK_(ABS(l[i] - ref) < 0.00000001,
+                    "RGB (%g, %g, %g): L %g, expected %g.", rgb[3 * i], rgb[3 * i + 1], rgb[3 * i + 2], l[i], ref);
+    }
+
+    /* 8-bit RGBA through the table, into every other float: alpha ignored */
+    in.data = rgb8;
+    in.type = HSLUV_UINT8;
+    in.layout = HSLUV_RGBA;
+    out.data = lf;
+    out.type = HSLUV_FLOAT32;
+    out.pixel_stride = 2 * sizeof(float);
+    rgb2lightness_pixels(&in, &out, 256);
+    for(i = 0; i < 256; i++) {
+        TEST_CHECK_(ABS(lf[2 * i] - l[i]) < 0.0001,
+                    "RGB8 (%d, %d, %d): L %g, expected %g.", rgb8[4 * i], rgb8[4 * i + 1], rgb8[4 * i + 2], lf[2 * i], l[i]);
+    }
+
+    /* Premultiplied, which must not go through the table */
+    in.layout = HSLUV_RGBA | HSLUV_PREMULTIPLIED;
+    for(i = 0; i < 256; i++)
+        rgb8[4 * i + 3] = 255;
+    rgb2lightness_pixels(&in, &out, 256);
+    for(i = 0; i < 256; i++) {
+        TEST_CHECK_(ABS(lf[2 * i] - l[i]) < 0.0001,
+                    "RGB8 (%d, %d, %d), opaque: L %g, expected %g.", rgb8[4 * i], rgb8[4 * i + 1], rgb8[4 * i + 2], lf[2 * i], l[i]);
+    }
+}
+
+static void
+test_batch_select(void)
+{
+    static const int selects[] = {
+        HSLUV_SELECT_H, HSLUV_SELECT_S, HSLUV_SELECT_L, HSLUV_SELECT_H | HSLUV_SELECT_S,
+        HSLUV_SELECT_H | HSLUV_SELECT_L, HSLUV_SELECT_S | HSLUV_SELECT_L,
+        HSLUV_SELECT_H | HSLUV_SELECT_S | HSLUV_SELECT_L
+    };
+    unsigned char rgba[4 * 100];
+    float full[3 * 100];
+    float part[3 * 100];
+    hsluv_pixels in;
+    hsluv_pixels out;
+    int hpluv, j, i, k;
+
+    for(i = 0; i < 100; i++) {
+        rgba[4 * i] = (unsigned char) (i * 2);
+        rgba[4 * i + 1] = (unsigned char) (255 - i);
+        rgba[4 * i + 2] = (unsigned char) (i * i);
+        rgba[4 * i + 3] = (unsigned char) (i < 50 ? i : 255);
+    }
+    /* A gray block too */
+    for(i = 64; i < 100; i++)
+        rgba[4 * i + 1] = rgba[4 * i + 2] = rgba[4 * i];
+    memset(&in, 0, sizeof(in));
+    memset(&out, 0, sizeof(out));
+    in.data = rgba;
+    in.type = HSLUV_UINT8;
+    in.layout = HSLUV_RGBA;
+    out.type = HSLUV_FLOAT32;
+
+    /* Each selection packs the same components as the full conversion gives,
+     * whatever the layout it is or'ed onto */
+    for(hpluv = 0; hpluv < 2; hpluv++) {
+        out.data = full;
+        out.layout = HSLUV_RGB;
+        (hpluv ? rgb2hpluv_pixels : rgb2hsluv_pixels)(&in, &out, 100);
+        for(j = 0; j < (int) (sizeof(selects) / sizeof(selects[0])); j++) {
+            int count = (selects[j] & HSLUV_SELECT_H ? 1 : 0) + (selects[j] & HSLUV_SELECT_S ? 1 : 0) +
+                        (selects[j] & HSLUV_SELECT_L ? 1 : 0);
+
+            out.data = part;
+            out.layout = HSLUV_BGRA | selects[j];
+            (hpluv ? rgb2hpluv_pixels : rgb2hsluv_pixels)(&in, &out, 100);
+            for(i = 0; i < 100; i++) {
+                int n = 0;
+
+                for(k = 0; k < 3; k++) {
+                    if(!(selects[j] & (HSLUV_SELECT_H << k)))
+                        continue;
+                    TEST_CHECK_(ABS(part[count * i + n] - full[3 * i + k]) < 0.0001,
+                                "RGB8 (%d, %d, %d), selection %x: Component %d is %g, expected %g.",
+                                rgba[4 * i], rgba[4 * i + 1], rgba[4 * i + 2], selects[j], k,
+                                part[count * i + n], full[3 * i + k]);
+                    n++;
+                }
+            }
+        }
+    }
+}
+
+static void
+test_batch_stages(void)
+{
+    double rgb[3 * 100];
+    double tmp[3 * 100];
+    hsluv_pixels px;
+    int hpluv, i;
+
+    for(i = 0; i < 100; i++) {
+        rgb[3 * i] = (i % 10) / 9.0;
+        rgb[3 * i + 1] = (i / 10) / 9.0;
+        rgb[3 * i + 2] = ((i * 7) % 10) / 9.0;
+    }
+    memset(&px, 0, sizeof(px));
+    px.data = tmp;
+
+    /* White is the D65 white point in XYZ, and has L = 100 and no chroma */
+    tmp[0] = tmp[1] = tmp[2] = 1.0;
+    rgb2xyz_pixels(&px, &px, 1);
+    TEST_CHECK_(ABS(tmp[0] - 0.95045592705167) < 0.00000001  &&  ABS(tmp[1] - 1.0) < 0.00000001  &&
+                ABS(tmp[2] - 1.08905775075988) < 0.00000001,
+                "White: XYZ (%g, %g, %g).", tmp[0], tmp[1], tmp[2]);
+    xyz2luv_pixels(&px, &px, 1);
+    luv2lch_pixels(&px, &px, 1);
+    TEST_CHECK_(ABS(tmp[0] - 100.0) < 0.00000001  &&  tmp[1] < 0.00000001  &&  tmp[2] == 0.0,
+                "White: LCh (%g, %g, %g).", tmp[0], tmp[1], tmp[2]);
+
+    /* The stages one by one make up the whole conversion, both ways */
+    for(hpluv = 0; hpluv < 2; hpluv++) {
+        memcpy(tmp, rgb, sizeof(rgb));
+        rgb2xyz_pixels(&px, &px, 100);
+        xyz2luv_pixels(&px, &px, 100);
+        luv2lch_pixels(&px, &px, 100);
+        (hpluv ? lch2hpluv_pixels : lch2hsluv_pixels)(&px, &px, 100);
+        for(i = 0; i < 100; i++) {
+            double h, s, l;
+
+            (hpluv ? rgb2hpluv : rgb2hsluv)(rgb[3 * i], rgb[3 * i + 1], rgb[3 * i + 2], &h, &s, &l);
+            TEST_CHECK_(ABS(tmp[3 * i] - h) < 0.0000001  &&  ABS(tmp[3 * i + 1] - s) < 0.0000001  &&
+                        ABS(tmp[3 * i + 2] - l) < 0.0000001,
+                        "RGB (%g, %g, %g): Stages give (%g, %g, %g), expected (%g, %g, %g).",
+                        rgb[3 * i], rgb[3 * i + 1], rgb[3 * i + 2], tmp[3 * i], tmp[3 * i + 1], tmp[3 * i + 2], h, s, l);
+        }
+
+        (hpluv ? hpluv2lch_pixels : hsluv2lch_pixels)(&px, &px, 100);
+        lch2luv_pixels(&px, &px, 100);
+        luv2xyz_pixels(&px, &px, 100);
+        xyz2rgb_pixels(&px, &px, 100);
+        for(i = 0; i < 300; i++) {
+            TEST_CHECK_(ABS(tmp[i] - rgb[i]) < 0.0000001,
+                        "RGB (%g, %g, %g): Round trip through the stages gives %g.",
+                        rgb[i - i % 3], rgb[i - i % 3 + 1], rgb[i - i % 3 + 2], tmp[i]);
+        }
+    }
+}
+
+static void
+test_batch_hsluv2hpluv(void)
+{
+    double hsl[3 * 120];
+    double direct[3 * 120];
+    double staged[3 * 120];
+    hsluv_pixels in;
+    hsluv_pixels out;
+    int hpluv, i;
+
+    for(i = 0; i < 120; i++) {
+        hsl[3 * i] = i * 3.0;
+        hsl[3 * i + 1] = (i % 11) * 10.0;
+        hsl[3 * i + 2] = (i % 12) * 100.0 / 11.0;
+    }
+    memset(&in, 0, sizeof(in));
+    memset(&out, 0, sizeof(out));
+    in.data = hsl;
+
+    /* Against the stages through LCh, and against the conversions through RGB */
+    for(hpluv = 0; hpluv < 2; hpluv++) {
+        out.data = direct;
+        (hpluv ? hpluv2hsluv_pixels : hsluv2hpluv_pixels)(&in, &out, 120);
+        out.data = staged;
+        (hpluv ? hpluv2lch_pixels : hsluv2lch_pixels)(&in, &out, 120);
+        (hpluv ? lch2hsluv_pixels : lch2hpluv_pixels)(&out, &out, 120);
+        for(i = 0; i < 120; i++) {
+            double r, g, b, h, s, l;
+
+            (hpluv ? hpluv2rgb : hsluv2rgb)(hsl[3 * i], hsl[3 * i + 1], hsl[3 * i + 2], &r, &g, &b);
+            (hpluv ? rgb2hsluv : rgb2hpluv)(r, g, b, &h, &s, &l);
+            TEST_CHECK_(direct[3 * i] == staged[3 * i]  &&  direct[3 * i + 1] == staged[3 * i + 1]  &&
+                        direct[3 * i + 2] == staged[3 * i + 2],
+                        "(%g, %g, %g): Direct conversion gives (%g, %g, %g), stages (%g, %g, %g).",
+                        hsl[3 * i], hsl[3 * i + 1], hsl[3 * i + 2], direct[3 * i], direct[3 * i + 1], direct[3 * i + 2],
+                        staged[3 * i], staged[3 * i + 1], staged[3 * i + 2]);
+            if(s > 0.001  &&  s < 100.0) {
+                TEST_CHECK_(ABS(direct[3 * i] - h) < 0.000001  &&  ABS(direct[3 * i + 1] - s) < 0.000001  &&
+                            ABS(direct[3 * i + 2] - l) < 0.000001,
+                            "(%g, %g, %g): Direct conversion gives (%g, %g, %g), through RGB (%g, %g, %g).",
+                            hsl[3 * i], hsl[3 * i + 1], hsl[3 * i + 2], direct[3 * i], direct[3 * i + 1], direct[3 * i + 2],
+                            h, s, l);
+            }
+        }
+    }
+
+    /* Whole blocks of negative, tiny and zero saturations, of which only the
+     * zeros are grays */
+    for(hpluv = 0; hpluv < 6; hpluv++) {
+        for(i = 0; i < 64; i++) {
+            hsl[3 * i] = i * 5.0;
+            hsl[3 * i + 1] = hpluv / 2 == 0 ? -10.0 * (i % 5 + 1) : hpluv / 2 == 1 ? 0.000000001 * (i % 5 + 1) : 0.0;
+            hsl[3 * i + 2] = 20.0 + (i % 7) * 10.0;
+        }
+        out.data = direct;
+        (hpluv % 2 ? hpluv2hsluv_pixels : hsluv2hpluv_pixels)(&in, &out, 64);
+        out.data = staged;
+        (hpluv % 2 ? hpluv2lch_pixels : hsluv2lch_pixels)(&in, &out, 64);
+        (hpluv % 2 ? lch2hsluv_pixels : lch2hpluv_pixels)(&out, &out, 64);
+        for(i = 0; i < 3 * 64; i++) {
+            TEST_CHECK_(direct[i] == staged[i], "(%g, %g, %g): Direct conversion gives %g, stages %g.",
+                        hsl[i / 3 * 3], hsl[i / 3 * 3 + 1], hsl[i / 3 * 3 + 2], direct[i], staged[i]);
+        }
+    }
+}
+
 
 TEST_LIST = {
     { "hsluv2rgb", test_hsluv2rgb },
     { "rgb2hsluv", test_rgb2hsluv },
     { "hpluv2rgb", test_hpluv2rgb },
     { "rgb2hpluv", test_rgb2hpluv },
+    { "bounds_cache", test_bounds_cache },
+    { "safe_chroma_table", test_safe_chroma_table },
+    { "float", test_float },
+    { "batch", test_batch },
+    { "batch_isa", test_batch_isa },
+    { "batch_float", test_batch_float },
+    { "batch_integer", test_batch_integer },
+    { "batch_layout", test_batch_layout },
+    { "batch_planar", test_batch_planar },
+    { "batch_lightness", test_batch_lightness },
+    { "batch_select", test_batch_select },
+    { "batch_stages", test_batch_stages },
+    { "batch_hsluv2hpluv", test_batch_hsluv2hpluv },
     { NULL, NULL }
 };